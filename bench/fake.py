@@ -0,0 +1,203 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import random
+import threading
+from time import time, sleep
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    WebDriverException
+)
+from src.pool import Session
+
+
+class FakeWebDriver(object):
+    """An in-process stand-in for a WebDriver, for measuring the harness
+    itself. Elements appear a fixed delay after each page load, every call
+    takes a fixed latency, and calls fail at a fixed rate; failures are
+    drawn from a seeded generator, so runs are repeatable."""
+    def __init__(self, appear_delay=0.0, latency=0.0, failure_rate=0.0,
+                 seed=0, async_scripts=True):
+        self.appear_delay = appear_delay
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.async_scripts = async_scripts
+        self.loaded = time()
+        self.current_url = "about:blank"
+        self.window_handles = ["main"]
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.command_executor = FakeExecutor(self)
+
+    def call(self, command, fallible=False):
+        """Make a WebDriver request through the command executor"""
+        self.command_executor.execute(command, {"fallible": fallible})
+
+    def request(self, fallible=False):
+        """Simulate a WebDriver request"""
+        with self.lock:
+            self.requests += 1
+            fail = fallible and self.random.random() < self.failure_rate
+        if self.latency:
+            sleep(self.latency)
+        if fail:
+            raise WebDriverException("simulated failure")
+
+    def get(self, url):
+        self.call("get")
+        self.current_url = url
+        self.loaded = time()
+
+    def find_element(self, by, target):
+        self.call("find_element", True)
+        if time() < self.loaded + self.appear_delay:
+            raise NoSuchElementException(target)
+        return FakeElement(self)
+
+    def find_elements(self, by, target):
+        self.call("find_elements")
+        if time() < self.loaded + self.appear_delay:
+            return []
+        return [FakeElement(self)]
+
+    def find_elements_by_tag_name(self, name):
+        return self.find_elements("tag name", name)
+
+    def execute_script(self, script, *args):
+        self.call("execute_script")
+        if "navigationStart" in script:
+            # page metrics: the document loaded when the last page opened
+            return {"origin": self.loaded, "path": "/", "ttfb": 5,
+                    "dom_content_loaded": 20, "load": 30, "first_paint": 25,
+                    "first_contentful_paint": 25, "resources": 0,
+                    "resource_bytes": 0, "slowest_resource": 0}
+        if "readyState" in script:
+            return ["complete", 0, 60000, self.current_url]
+        return None
+
+    def execute_async_script(self, script, *args):
+        """Wait for the element in the 'browser': one request, resolving
+        when the element appears or after the script's timeout"""
+        self.call("execute_async_script")
+        if not self.async_scripts:
+            raise WebDriverException("asynchronous scripts are unsupported")
+        timeout = args[-1] / 1000.0
+        remaining = self.loaded + self.appear_delay - time()
+        # fused actions resolve with null when done, or with the index of
+        # the action that timed out
+        fused = "var steps" in script
+        if remaining > timeout:
+            sleep(timeout)
+            return 0 if fused else None
+        if remaining > 0:
+            sleep(remaining)
+        return None if fused else FakeElement(self)
+
+    def set_script_timeout(self, seconds):
+        self.call("set_script_timeout")
+
+    def set_window_size(self, width, height):
+        self.call("set_window_size")
+
+    def switch_to_default_content(self):
+        self.call("switch_to_default_content")
+
+    def switch_to_frame(self, frame):
+        self.call("switch_to_frame")
+
+    def switch_to_window(self, handle):
+        self.call("switch_to_window")
+
+    def delete_all_cookies(self):
+        self.call("delete_all_cookies")
+
+    def get_cookies(self):
+        self.call("get_cookies")
+        return []
+
+    def add_cookie(self, cookie):
+        self.call("add_cookie")
+
+    def close(self):
+        self.call("close")
+
+    def quit(self):
+        pass
+
+
+class FakeExecutor(object):
+    """The command executor of a FakeWebDriver, through which every request
+    passes, as with Selenium's webdrivers (so the Profiler can time them)"""
+    def __init__(self, webdriver):
+        self.webdriver = webdriver
+
+    def execute(self, command, params):
+        self.webdriver.request(params.get("fallible", False))
+
+
+class FakeElement(object):
+    """An element of a FakeWebDriver page"""
+    tag_name = "input"
+    text = ""
+
+    def __init__(self, webdriver):
+        self.webdriver = webdriver
+
+    def click(self):
+        self.webdriver.call("click", True)
+
+    def clear(self):
+        self.webdriver.call("clear", True)
+
+    def send_keys(self, value):
+        self.webdriver.call("send_keys", True)
+
+    def get_attribute(self, name):
+        self.webdriver.call("get_attribute")
+        return ""
+
+    def is_displayed(self):
+        self.webdriver.call("is_displayed")
+        return True
+
+    def is_enabled(self):
+        self.webdriver.call("is_enabled")
+        return True
+
+
+class FakeBackend(object):
+    """A session pool backend that launches FakeWebDrivers"""
+    def __init__(self, **options):
+        self.options = options
+        self.launched = 0
+        self.lock = threading.Lock()
+
+    def launch(self):
+        with self.lock:
+            self.launched += 1
+            seed = self.launched
+        options = dict(self.options)
+        options.setdefault("seed", seed)
+        return Session(FakeWebDriver(**options))
+
+    def retire(self, session):
+        pass
+
+    def finished(self, session, seconds):
+        pass
@@ -0,0 +1,365 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import sys
+import json
+import socket
+import shutil
+import argparse
+import subprocess
+import platform
+import tempfile
+from copy import deepcopy
+from time import time, sleep
+from src import settings
+from src.driver import Driver
+from src.logger import LogWriter, LogBuffer
+from src.page import Page
+from src.stats import Stats
+from src.store import Store
+from fake import FakeWebDriver, FakeBackend
+from synthetic import generate
+
+
+class BenchDriver(Driver):
+    """A Driver whose browser sessions are FakeWebDrivers"""
+    def __init__(self, suite, fake_options, **kwargs):
+        self.fake_options = fake_options
+        super(BenchDriver, self).__init__(suite, **kwargs)
+
+    def backend(self, nodes):
+        return FakeBackend(**self.fake_options)
+
+
+class Quiet(object):
+    """Silence the harness' console output"""
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+
+    def __exit__(self, *args):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def store(**kwargs):
+    """Return the arguments run.py would give the Driver"""
+    args = {
+        "base": "http://bench.invalid",
+        "tier": "qa",
+        "debug": False,
+        "xml": None,
+        "cache": False,
+        "wait_mode": "ready",
+        "processes": 1,
+        "grid": None,
+        "wire": False,
+        "failed_first": False,
+        "profile": False
+    }
+    args.update(kwargs)
+    return args
+
+
+def bench_load(directory, args):
+    """Time loading (and compiling) thousands of suite files"""
+    suites = generate(os.path.join(directory, "load"), suites=args.suites,
+                      ui_maps=args.ui_maps, seed=args.seed)
+    results = {"suites": args.suites, "ui_maps": args.ui_maps}
+    for cache in (False, True):
+        start_time = time()
+        with Quiet():
+            driver = Driver(suites, **store(cache=cache))
+        seconds = time() - start_time
+        results["cold" if not cache else "cache write"] = seconds
+    start_time = time()
+    with Quiet():
+        Driver(suites, **store(cache=True))
+    results["cache read"] = time() - start_time
+    results["suites per second"] = args.suites / results["cold"]
+    results["suites loaded"] = len(driver.suites)
+    return results
+
+
+def bench_dispatch(directory, args):
+    """Measure actions per second of the Page dispatch loop against a
+    webdriver with no latency"""
+    suites = generate(os.path.join(directory, "dispatch"), suites=1,
+                      ui_maps=args.ui_maps, suite_length=args.ui_maps,
+                      seed=args.seed)
+    with Quiet():
+        driver = Driver(suites, **store())
+    ui_maps = sorted(driver.compiler.ui_maps.items())
+    writer = LogWriter(os.path.join(directory, "dispatch.jsonl"))
+    writer.start()
+    log = LogBuffer(writer)
+    stats = Stats()
+    webdriver = FakeWebDriver(seed=args.seed)
+    actions = 0
+    start_time = time()
+    for i in range(args.repeat):
+        for ui_map, compiled in ui_maps:
+            page = Page("dispatch", ui_map, compiled, webdriver,
+                        Store(driver.store), log, stats)
+            page.test()
+            actions += len(compiled)
+    seconds = time() - start_time
+    log.flush()
+    writer.close()
+    return {
+        "actions": actions,
+        "seconds": seconds,
+        "actions per second": actions / seconds,
+        "webdriver calls per action": float(webdriver.requests) / actions
+    }
+
+
+def bench_waits(directory, args):
+    """Count the round trips of element waits when elements appear after a
+    delay, waiting in the browser and by polling"""
+    results = {"appear delay": args.appear_delay, "waits": args.waits}
+    for mode, async_scripts in (("in browser", True), ("polling", False)):
+        webdriver = FakeWebDriver(appear_delay=args.appear_delay,
+                                  seed=args.seed, async_scripts=async_scripts)
+        stats = Stats()
+        page = Page("waits", "waits", (), webdriver, Store(store()), None,
+                    stats)
+        start_time = time()
+        for i in range(args.waits):
+            webdriver.get("/waits")
+            page.wait_for_element("id", "target-%d" % i)
+        seconds = time() - start_time
+        results[mode] = {
+            "round trips per wait":
+                float(stats.get("element wait round trips")) / args.waits,
+            "webdriver calls per wait": float(webdriver.requests) / args.waits,
+            "seconds per wait": seconds / args.waits
+        }
+    return results
+
+
+def bench_threads(directory, args):
+    """Measure suites per second against thread count, with per-call latency
+    and failures"""
+    suites = generate(os.path.join(directory, "threads"),
+                      suites=args.thread_suites, ui_maps=args.ui_maps,
+                      seed=args.seed)
+    fake_options = {
+        "appear_delay": args.appear_delay,
+        "latency": args.latency,
+        "failure_rate": args.failure_rate
+    }
+    results = {"suites": args.thread_suites, "latency": args.latency,
+               "failure rate": args.failure_rate, "threads": []}
+    for thread_count in args.threads:
+        # each run starts without history
+        if os.path.exists(settings.history_filename):
+            os.remove(settings.history_filename)
+        settings.thread_count = thread_count
+        with Quiet():
+            driver = BenchDriver(suites, fake_options, **store())
+            start_time = time()
+            driver.run()
+            seconds = time() - start_time
+        results["threads"].append({
+            "threads": thread_count,
+            "seconds": seconds,
+            "suites per second": len(driver.results) / seconds,
+            "passed": len([r for r in driver.results if r.passed]),
+            "failed": len([r for r in driver.results if not r.passed])
+        })
+    return results
+
+
+def start_stub(slots, latency):
+    """Start a stand-in WebDriver server in its own process, so its CPU time
+    is not the harness', and return (process, url)"""
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.devnull, "w") as devnull:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "bench.stub", "--port", str(port),
+             "--slots", str(slots), "--latency", str(latency)],
+            cwd=root, stdout=devnull)
+    for i in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), 1).close()
+            break
+        except socket.error:
+            sleep(0.05)
+    return process, "http://127.0.0.1:%d" % port
+
+
+def bench_wire(directory, args):
+    """Compare the Selenium client with the built-in keep-alive client
+    against a stand-in WebDriver server, at each session count (one thread
+    per session): suites per second, and the harness' CPU time per suite
+    and per second of each session"""
+    suites = generate(os.path.join(directory, "wire"),
+                      suites=args.thread_suites, ui_maps=args.ui_maps,
+                      seed=args.seed)
+    process, url = start_stub(max(args.threads), args.latency)
+    grid = os.path.join(directory, "wire.grid")
+    results = {"suites": args.thread_suites, "latency": args.latency,
+               "selenium": [], "wire": []}
+    try:
+        for sessions in args.threads:
+            with open(grid, "w") as f:
+                f.write("%s|%d\n" % (url, sessions))
+            for name, wire in (("selenium", False), ("wire", True)):
+                if os.path.exists(settings.history_filename):
+                    os.remove(settings.history_filename)
+                with Quiet():
+                    driver = Driver(suites, **store(grid=grid, wire=wire))
+                    start_time = time()
+                    start_cpu = sum(os.times()[:2])
+                    driver.run()
+                    cpu = sum(os.times()[:2]) - start_cpu
+                    seconds = time() - start_time
+                count = len(driver.results) or 1
+                results[name].append({
+                    "sessions": sessions,
+                    "seconds": seconds,
+                    "suites per second": len(driver.results) / seconds,
+                    "cpu seconds per suite": cpu / count,
+                    "cpu seconds per session second":
+                        cpu / (sessions * seconds),
+                    "passed": len([r for r in driver.results if r.passed])
+                })
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def bench_store(directory, args):
+    """Time starting a suite's variables from a store holding fixture
+    data: a deep copy of the whole store, against a layered Store. Each
+    suite sets a variable, runs an exec action, or reads a fixture (which
+    a layer copies on first read)"""
+    base = store()
+    base["account"] = "user0"
+    base["fixtures"] = dict(
+        ("user%d" % i, {"id": i, "name": "User %d" % i})
+        for i in range(args.fixtures))
+    code = compile("user = account.upper()", "<exec>", "exec")
+
+    def run_copy(variables, code):
+        exec code in variables
+
+    results = {"fixtures": args.fixtures}
+    for name, start, execute in (("deep copy", deepcopy, run_copy),
+                                 ("layered", Store, Store.execute)):
+        results[name] = {}
+        for case in ("set", "exec", "read"):
+            start_time = time()
+            for i in range(args.repeat):
+                variables = start(base)
+                if case == "set":
+                    variables["user"] = "user%d" % i
+                elif case == "exec":
+                    execute(variables, code)
+                else:
+                    variables["user"] = variables["fixtures"]["user%d" % i]
+            results[name]["seconds per suite (%s)" % case] = \
+                (time() - start_time) / args.repeat
+    return results
+
+
+benchmarks = [
+    ("load", bench_load),
+    ("dispatch", bench_dispatch),
+    ("waits", bench_waits),
+    ("threads", bench_threads),
+    ("wire", bench_wire),
+    ("store", bench_store),
+]
+
+
+def main():
+    """Run the benchmarks, printing the results as JSON"""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the harness against a fake WebDriver.')
+    parser.add_argument('--only', default=None,
+                        help='comma-separated benchmarks to run (%s)' %
+                        ", ".join(name for name, bench in benchmarks))
+    parser.add_argument('--output', default=None,
+                        help='write the results to a file')
+    parser.add_argument('--suites', type=int, default=2000,
+                        help='suite files to load')
+    parser.add_argument('--ui-maps', type=int, default=200,
+                        help='UI maps in each synthetic tree')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='passes over the UI maps when dispatching')
+    parser.add_argument('--waits', type=int, default=20,
+                        help='element waits to time')
+    parser.add_argument('--appear-delay', type=float, default=0.05,
+                        help='seconds before elements appear after a load')
+    parser.add_argument('--latency', type=float, default=0.001,
+                        help='seconds per WebDriver call')
+    parser.add_argument('--failure-rate', type=float, default=0.01,
+                        help='fraction of WebDriver calls that fail')
+    parser.add_argument('--threads', default="1,2,4,8,16",
+                        help='comma-separated thread counts')
+    parser.add_argument('--thread-suites', type=int, default=100,
+                        help='suites run at each thread count')
+    parser.add_argument('--fixtures', type=int, default=10000,
+                        help='fixture records in the store')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    args.threads = [int(n) for n in args.threads.split(",")]
+    only = args.only.split(",") if args.only else None
+
+    # no delays between actions: measure the harness, not the settings
+    settings.action_delay = 0
+    settings.page_delay = 0
+    settings.ready_quiet_period = 0
+    settings.attempt_delay = 0.01
+
+    directory = tempfile.mkdtemp(prefix="bench-")
+    cwd = os.getcwd()
+    # the harness writes its log and history to the working directory
+    os.chdir(directory)
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "benchmarks": {}
+    }
+    try:
+        for name, bench in benchmarks:
+            if only is None or name in only:
+                print >> sys.stderr, "Running %s benchmark..." % name
+                results["benchmarks"][name] = bench(directory, args)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+    output = json.dumps(results, indent=1, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print output
+
+
+if __name__ == "__main__":
+    main()
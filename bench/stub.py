@@ -0,0 +1,245 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import re
+import json
+import uuid
+import argparse
+import threading
+from time import sleep
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+# the W3C element reference key
+element_key = "element-6066-11e4-a52e-4f735466cecf"
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """A stand-in WebDriver (W3C) HTTP server for exercising the harness
+    without browsers, e.g. as a grid node. Every element exists and every
+    command succeeds after an optional latency; scripts return values that
+    let the harness' readiness and element waits succeed immediately.
+    Sessions beyond the slot count are refused, and the server can refuse
+    every new session to simulate an unhealthy node."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, slots=1, latency=0.0, refuse=False):
+        HTTPServer.__init__(self, address, StubHandler)
+        self.slots = slots
+        self.latency = latency  # seconds per command
+        self.refuse = refuse  # refuse every new session
+        self.sessions = {}  # session id: current URL
+        self.commands = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://%s:%d" % self.server_address
+
+    def start(self):
+        """Serve requests in a background thread"""
+        t = threading.Thread(target=self.serve_forever)
+        t.daemon = True
+        t.start()
+        return self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Handles WebDriver commands for the StubServer"""
+    protocol_version = "HTTP/1.1"  # keep connections alive
+    wbufsize = -1  # send each response in one piece
+
+    # (method, path pattern, handler name)
+    routes = [
+        ("POST", r"/session$", "new_session"),
+        ("DELETE", r"/session/([^/]+)$", "delete_session"),
+        ("POST", r"/session/([^/]+)/url$", "navigate"),
+        ("GET", r"/session/([^/]+)/url$", "current_url"),
+        ("POST", r"/session/([^/]+)/elements?$", "find_element"),
+        ("POST", r"/session/([^/]+)/element/[^/]+/elements?$",
+         "find_element"),
+        ("GET", r"/session/([^/]+)/element/[^/]+/text$", "element_text"),
+        ("GET", r"/session/([^/]+)/element/[^/]+/name$", "element_name"),
+        ("GET", r"/session/([^/]+)/element/[^/]+/(displayed|enabled)$",
+         "element_state"),
+        ("GET", r"/session/([^/]+)/cookie$", "cookies"),
+        ("POST", r"/session/([^/]+)/execute/(sync|async)$", "execute"),
+        ("GET", r"/session/([^/]+)/window/handles$", "window_handles"),
+        ("GET", r"/session/([^/]+)/window$", "window_handle"),
+        ("GET", r"/session/([^/]+)/source$", "source"),
+        ("GET", r"/session/([^/]+)/title$", "title"),
+        ("GET", r"/session/([^/]+)/screenshot$", "screenshot"),
+        ("GET", r"/status$", "status"),
+    ]
+
+    def log_message(self, format, *args):
+        pass  # quiet
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def dispatch(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else ""
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            params = {}
+        path = self.path.split("?")[0]
+        if path.startswith("/wd/hub"):
+            path = path[len("/wd/hub"):]
+        with self.server.lock:
+            self.server.commands += 1
+        if self.server.latency:
+            sleep(self.server.latency)
+        for route_method, pattern, name in self.routes:
+            match = re.match(pattern, path)
+            if route_method == method and match:
+                groups = match.groups()
+                if groups and name not in ("new_session", "status") and \
+                        groups[0] not in self.server.sessions:
+                    return self.error(404, "invalid session id", groups[0])
+                return getattr(self, name)(params, *groups)
+        # any other command on a valid session succeeds with no value
+        match = re.match(r"/session/([^/]+)", path)
+        if match and match.group(1) not in self.server.sessions:
+            return self.error(404, "invalid session id", match.group(1))
+        self.reply(None)
+
+    def reply(self, value, code=200):
+        body = json.dumps({"value": value})
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def error(self, code, error, message):
+        self.reply({"error": error, "message": message, "stacktrace": ""},
+                   code)
+
+    """Commands"""
+
+    def status(self, params):
+        with self.server.lock:
+            free = self.server.slots - len(self.server.sessions)
+        self.reply({"ready": free > 0, "message": "%d free slots" % free})
+
+    def new_session(self, params):
+        with self.server.lock:
+            full = len(self.server.sessions) >= self.server.slots
+            if not self.server.refuse and not full:
+                session_id = uuid.uuid4().hex
+                self.server.sessions[session_id] = "about:blank"
+        if self.server.refuse or full:
+            return self.error(500, "session not created", "no free slots")
+        capabilities = params.get("desiredCapabilities") or {}
+        self.reply({"sessionId": session_id, "capabilities": capabilities})
+
+    def delete_session(self, params, session_id):
+        with self.server.lock:
+            self.server.sessions.pop(session_id, None)
+        self.reply(None)
+
+    def navigate(self, params, session_id):
+        self.server.sessions[session_id] = params.get("url")
+        self.reply(None)
+
+    def current_url(self, params, session_id):
+        self.reply(self.server.sessions[session_id])
+
+    def find_element(self, params, session_id):
+        element = {element_key: uuid.uuid4().hex}
+        if self.path.endswith("elements"):
+            self.reply([element])
+        else:
+            self.reply(element)
+
+    def element_text(self, params, session_id):
+        self.reply("")
+
+    def element_name(self, params, session_id):
+        self.reply("div")
+
+    def element_state(self, params, session_id, state):
+        self.reply(True)
+
+    def cookies(self, params, session_id):
+        self.reply([])
+
+    def execute(self, params, session_id, mode):
+        script = params.get("script", "")
+        if "readyState" in script:
+            value = ["complete", 0, 60000, "about:blank"]
+        elif mode == "async":
+            value = {element_key: uuid.uuid4().hex}
+        else:
+            value = None
+        self.reply(value)
+
+    def window_handles(self, params, session_id):
+        self.reply(["main"])
+
+    def window_handle(self, params, session_id):
+        self.reply("main")
+
+    def source(self, params, session_id):
+        self.reply("<html><body></body></html>")
+
+    def title(self, params, session_id):
+        self.reply("")
+
+    def screenshot(self, params, session_id):
+        # a 1x1 PNG
+        self.reply(
+            "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk"
+            "YPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==")
+
+
+def main():
+    """Run a stand-in WebDriver server from the command line"""
+    parser = argparse.ArgumentParser(
+        description='Run a stand-in WebDriver server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4444)
+    parser.add_argument('--slots', type=int, default=4,
+                        help='maximum concurrent sessions')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds per command')
+    parser.add_argument('--refuse', action='store_true',
+                        help='refuse every new session')
+    args = parser.parse_args()
+    server = StubServer((args.host, args.port), args.slots, args.latency,
+                        args.refuse)
+    print "Stand-in WebDriver listening on", server.url
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
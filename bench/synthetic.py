@@ -0,0 +1,69 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import random
+
+# (command, parameter template) for the actions of synthetic UI maps; %(n)d
+# is replaced with a number unique within the UI map
+actions = [
+    ("click", "id|button-%(n)d"),
+    ("type", "id|field-%(n)d|value %(n)d"),
+    ("clear_type", "css|#input-%(n)d|value %(n)d"),
+    ("verify_text", "xpath|//div[@id='text-%(n)d']|"),
+    ("store_text", "id|label-%(n)d|var%(n)d"),
+    ("log", "step %(n)d"),
+    ("exec", "total = %(n)d * 2"),
+]
+
+
+def ui_map_source(name, length, rng):
+    """Return the source of a synthetic UI map: open a page, then perform
+    random actions"""
+    lines = ["# %s" % name, "open|/%s" % name]
+    for n in range(length - 1):
+        command, params = rng.choice(actions)
+        lines.append("%s|%s" % (command, params % {"n": n}))
+    return "\n".join(lines) + "\n"
+
+
+def generate(directory, suites=100, ui_maps=50, areas=5, ui_map_length=10,
+             suite_length=5, seed=0):
+    """Write a synthetic tree of suites and UI maps: ui-maps/area<i>/page<j>
+    and suites/suite<k>, each suite running a random sequence of UI maps.
+    Returns the suites directory."""
+    rng = random.Random(seed)
+    ui_map_directory = os.path.join(directory, "ui-maps")
+    suites_directory = os.path.join(directory, "suites")
+    names = []
+    for i in range(ui_maps):
+        name = "area%d/page%d" % (i % areas, i)
+        filename = os.path.join(ui_map_directory, name)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, "w") as f:
+            f.write(ui_map_source(name, ui_map_length, rng))
+        names.append(name)
+    if not os.path.isdir(suites_directory):
+        os.makedirs(suites_directory)
+    for k in range(suites):
+        with open(os.path.join(suites_directory, "suite%d" % k), "w") as f:
+            f.write("# synthetic suite %d\n" % k)
+            for j in range(suite_length):
+                f.write(rng.choice(names) + "\n")
+    return suites_directory
@@ -0,0 +1,184 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import re
+import random
+import argparse
+import threading
+from time import sleep
+from urllib import quote
+from urlparse import urlparse, parse_qs
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+page = """<!DOCTYPE html>
+<html><head><title>%(title)s</title></head>
+<body><h1 id="title">%(title)s</h1>
+<div id="cart-count">Cart: %(cart)d items</div>
+%(body)s
+</body></html>"""
+
+
+class WebApp(ThreadingMixIn, HTTPServer):
+    """A stand-in web application (a tiny shop) for demonstrating load
+    tests, e.g. with headless browsers. Each response is delayed by a
+    latency, plus random jitter. Carts are kept per cart cookie."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, items=50):
+        HTTPServer.__init__(self, address, WebAppHandler)
+        self.latency = latency  # seconds per response
+        self.jitter = jitter  # up to this many more seconds per response
+        self.items = items
+        self.carts = {}  # cart id: items
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://%s:%d" % self.server_address
+
+    def start(self):
+        """Serve requests in a background thread"""
+        t = threading.Thread(target=self.serve_forever)
+        t.daemon = True
+        t.start()
+        return self
+
+
+class WebAppHandler(BaseHTTPRequestHandler):
+    """Handles requests for the WebApp"""
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+
+    # (method, path pattern, handler name)
+    routes = [
+        ("GET", r"/$", "home"),
+        ("GET", r"/search$", "search"),
+        ("GET", r"/item/(\d+)$", "item"),
+        ("POST", r"/cart$", "add_to_cart"),
+        ("GET", r"/cart$", "cart"),
+    ]
+
+    def log_message(self, format, *args):
+        pass  # quiet
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.form = parse_qs(self.rfile.read(length)) if length else {}
+        url = urlparse(self.path)
+        self.query = parse_qs(url.query)
+        with self.server.lock:
+            self.server.requests += 1
+        delay = self.server.latency + random.random() * self.server.jitter
+        if delay:
+            sleep(delay)
+        for route_method, pattern, name in self.routes:
+            match = re.match(pattern, url.path)
+            if route_method == method and match:
+                return getattr(self, name)(*match.groups())
+        self.reply("Not Found", "<p>No such page.</p>", 404)
+
+    def cart_id(self):
+        """Return the cart cookie's value, if any"""
+        match = re.search(r"cart=(\w+)", self.headers.get("Cookie") or "")
+        return match.group(1) if match else None
+
+    def reply(self, title, body, code=200, headers=()):
+        with self.server.lock:
+            cart = len(self.server.carts.get(self.cart_id(), []))
+        html = page % {"title": title, "cart": cart, "body": body}
+        self.send_response(code)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(html)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(html)
+        self.wfile.flush()
+
+    """Pages"""
+
+    def home(self):
+        self.reply("Shop", """<form id="search" action="/search">
+<input id="q" name="q"><button id="go" type="submit">Search</button>
+</form>""")
+
+    def search(self):
+        q = self.query.get("q", [""])[0]
+        links = "".join(
+            '<li><a id="item-%d" href="/item/%d">Item %d</a></li>' % (n, n, n)
+            for n in range(1, self.server.items + 1)
+            if q in "item %d" % n)
+        self.reply("Results for %s" % q.replace("<", "&lt;"),
+                   '<ul id="results">%s</ul>' % links)
+
+    def item(self, number):
+        self.reply("Item %s" % number, """<form method="post" action="/cart">
+<input type="hidden" name="item" value="%s">
+<button id="add" type="submit">Add to cart</button>
+</form>""" % number)
+
+    def add_to_cart(self):
+        cart_id = self.cart_id() or "%016x" % random.getrandbits(64)
+        with self.server.lock:
+            self.server.carts.setdefault(cart_id, []).extend(
+                self.form.get("item", []))
+        # redirect, so reloading the cart does not add the item again
+        self.send_response(303)
+        self.send_header("Location", "/cart")
+        self.send_header("Set-Cookie", "cart=%s; Path=/" % quote(cart_id))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def cart(self):
+        with self.server.lock:
+            items = list(self.server.carts.get(self.cart_id(), []))
+        self.reply("Cart", '<ul id="items">%s</ul>' % "".join(
+            "<li>Item %s</li>" % item for item in items))
+
+
+def main():
+    """Run a stand-in web application from the command line"""
+    parser = argparse.ArgumentParser(
+        description='Run a stand-in web application.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds per response')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='up to this many more seconds per response')
+    args = parser.parse_args()
+    server = WebApp((args.host, args.port), args.latency, args.jitter)
+    print "Stand-in web application listening on", server.url
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import os
 import sys
 import argparse
 from src.driver import Driver
+from src import settings
 
 
 def main():
@@ -30,9 +31,135 @@ def main():
         '-x', '--xml',
         default=None,
         help='XML input file')
+    parser.add_argument(
+        '--stream',
+        action="store_true",
+        help='start running suites while the rest are loaded')
+    parser.add_argument(
+        '-c', '--cache',
+        action="store_true",
+        help='cache compiled UI maps on disk')
+    parser.add_argument(
+        '-w', '--wait-mode',
+        choices=['ready', 'fixed'],
+        default=settings.wait_mode,
+        help='wait for page readiness or sleep between actions')
+    parser.add_argument(
+        '-p', '--processes',
+        type=int,
+        default=1,
+        help='number of worker processes')
+    parser.add_argument(
+        '-g', '--grid',
+        default=None,
+        help='grid file of remote WebDriver nodes')
+    parser.add_argument(
+        '--headless',
+        action="store_true",
+        help='run local browsers without a display')
+    parser.add_argument(
+        '--autoscale',
+        action="store_true",
+        help='adapt the number of test threads to the host while running')
+    parser.add_argument(
+        '--wire',
+        action="store_true",
+        help='with --grid, use the built-in keep-alive WebDriver client')
+    parser.add_argument(
+        '--hard-timeouts',
+        action="store_true",
+        help='wait the full wait timeout instead of learned timeouts')
+    parser.add_argument(
+        '-f', '--failed-first',
+        action="store_true",
+        help='run suites that failed last time first')
+    checkpoint = parser.add_mutually_exclusive_group()
+    checkpoint.add_argument(
+        '--resume',
+        action="store_true",
+        help='run the suites an interrupted run did not finish')
+    checkpoint.add_argument(
+        '--rerun-failed',
+        action="store_true",
+        help='run the suites that failed in the last run')
+    checkpoint.add_argument(
+        '-i', '--incremental',
+        action="store_true",
+        help='run only new, changed and failed suites')
+    parser.add_argument(
+        '--sample',
+        type=float,
+        default=0,
+        help='with --incremental, seconds of unchanged suites to run too')
+    parser.add_argument(
+        '--explain',
+        action="store_true",
+        help='list why each suite would run or be skipped, then exit')
+    parser.add_argument(
+        '--profile',
+        action="store_true",
+        help='report where the time goes')
+    parser.add_argument(
+        '--artifacts',
+        action="store_true",
+        help='save a screenshot, the page source and console of failures')
+    parser.add_argument(
+        '--metrics',
+        action="store_true",
+        help='record page performance metrics and flag regressions')
+    parser.add_argument(
+        '--snapshots',
+        action="store_true",
+        help='run UI maps that suites start with once, restoring snapshots')
+    parser.add_argument(
+        '--fuse',
+        action="store_true",
+        help='run consecutive form actions as a single script')
+    parser.add_argument(
+        '--load',
+        type=int,
+        default=None,
+        metavar='USERS',
+        help='load test: run the suites in a loop as USERS virtual users')
+    parser.add_argument(
+        '--ramp-up',
+        type=float,
+        default=0,
+        help='with --load, seconds over which the users start')
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=settings.load_duration,
+        help='with --load, seconds the load test runs')
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=None,
+        help='with --load, pages per second to pace all users to')
 
     # get a dictionary of arguments
     args = vars(parser.parse_args())
+    if args['wire'] and not args['grid']:
+        parser.error("--wire requires --grid")
+    if args['load'] is not None:
+        if args['load'] < 1:
+            parser.error("--load requires at least 1 user")
+        for option in ('stream', 'incremental', 'explain', 'resume',
+                       'rerun_failed', 'snapshots', 'metrics',
+                       'autoscale', 'artifacts'):
+            if args[option]:
+                parser.error("--load cannot be used with --%s" %
+                             option.replace("_", "-"))
+        if args['processes'] > 1:
+            parser.error("--load cannot be used with --processes")
+    if args['autoscale'] and args['processes'] > 1:
+        parser.error("--autoscale cannot be used with --processes")
+    if args['stream']:
+        for option in ('incremental', 'explain', 'snapshots'):
+            if args[option]:
+                parser.error("--stream cannot be used with --%s" % option)
+        if args['processes'] > 1:
+            parser.error("--stream cannot be used with --processes")
 
     # if a base URL is not specified, scan for it
     if args['base'] is None:
@@ -0,0 +1,184 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import gzip
+import json
+import Queue
+import base64
+import hashlib
+import threading
+from time import time
+from StringIO import StringIO
+from logger import LogBuffer
+import settings
+
+
+def grab(func):
+    """Return func(), or None if the browser cannot provide it"""
+    try:
+        return func()
+    except Exception:
+        return None
+
+
+def compress(data):
+    """Return data compressed with gzip"""
+    buf = StringIO()
+    f = gzip.GzipFile(fileobj=buf, mode="wb", mtime=0)
+    f.write(data)
+    f.close()
+    return buf.getvalue()
+
+
+class ArtifactWriter(threading.Thread):
+    """The ArtifactWriter stores what a failed suite left in its browser: a
+    screenshot, the page source, the URL and the browser console. The
+    failing thread only grabs them from the browser; decoding, compression
+    and disk writes happen here, fed by a bounded queue. A failure that
+    finds the queue full is not captured, rather than holding up its
+    thread. Files are named by the SHA-1 of their content, so the same
+    screenshot or page source is stored once however many suites fail on
+    it; when the directory grows past settings.artifact_budget megabytes,
+    the least recently written files are evicted. Each capture is logged
+    with the failing UI map and line, linking to its files."""
+    def __init__(self, directory, writer, stats):
+        super(ArtifactWriter, self).__init__()
+        self.daemon = True
+        self.directory = directory
+        self.q = Queue.Queue(settings.artifact_queue_size)
+        self.log = LogBuffer(writer)
+        self.stats = stats
+        self.lock = threading.Lock()
+        self.captures = {}  # (ui_map, line): failures captured this run
+        self.files = {}  # path: (last written, bytes)
+        for path, dirs, names in os.walk(directory):
+            for name in names:
+                filename = os.path.join(path, name)
+                self.files[filename] = (os.path.getmtime(filename),
+                                        os.path.getsize(filename))
+        self.size = sum(size for written, size in self.files.values())
+
+    def capture(self, webdriver, suite, ui_map, line):
+        """Grab a failed suite's artifacts from its browser and queue them
+        to be written. Only the first settings.artifact_captures failures
+        at each UI map line are captured. Returns False if the failure is
+        not captured."""
+        with self.lock:
+            count = self.captures.get((ui_map, line), 0)
+            self.captures[(ui_map, line)] = count + 1
+        if count >= settings.artifact_captures:
+            self.stats.add("artifacts skipped")
+            return False
+        item = (suite, ui_map, line,
+                grab(lambda: webdriver.current_url),
+                grab(lambda: webdriver.get_screenshot_as_base64()),
+                grab(lambda: webdriver.page_source),
+                grab(lambda: webdriver.get_log("browser")))
+        try:
+            self.q.put_nowait(item)
+        except Queue.Full:
+            self.stats.add("artifacts dropped")
+            return False
+        self.stats.add("artifacts captured")
+        return True
+
+    def run(self):
+        while True:
+            item = self.q.get()
+            if item is None:
+                break
+            try:
+                self.write(*item)
+            except (IOError, OSError, TypeError, ValueError), e:
+                # e.g. the disk is full or the screenshot is corrupt
+                self.stats.add("artifact write errors")
+                self.log.message(item[0], "Cannot write artifacts: %s" % e)
+        self.log.flush()
+
+    def close(self):
+        """Write any queued artifacts"""
+        self.q.put(None)
+        self.join()
+
+    def write(self, suite, ui_map, line, url, screenshot, source, console):
+        """Store a failure's artifacts and log links to them"""
+        files = {}
+        if screenshot:
+            files["screenshot"] = self.store(
+                base64.b64decode(screenshot), ".png", False)
+        if source:
+            files["source"] = self.store(
+                source.encode("utf-8"), ".html.gz", True)
+        if console:
+            files["console"] = self.store(
+                json.dumps(console, indent=1), ".json.gz", True)
+        self.log.artifact(suite, ui_map, line, url, files)
+        self.log.flush()
+
+    def store(self, data, extension, gzipped):
+        """Store data under the digest of its content, unless it is already
+        stored, returning its path"""
+        digest = hashlib.sha1(data).hexdigest()
+        path = os.path.join(self.directory, digest[:2], digest[2:] + extension)
+        if path in self.files or os.path.exists(path):
+            # already stored: keep it from eviction
+            os.utime(path, None)
+            self.stats.add("artifact files deduplicated")
+            self.size -= self.files.get(path, (0, 0))[1]
+            self.files[path] = (time(), os.path.getsize(path))
+            self.size += self.files[path][1]
+            return path
+        if gzipped:
+            data = compress(data)
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:
+            if not os.path.isdir(os.path.dirname(path)):
+                raise
+        # other processes may write the same file: write it, then rename it
+        temporary = "%s.%d.tmp" % (path, os.getpid())
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.rename(temporary, path)
+        self.stats.add("artifact files written")
+        self.stats.add("artifact bytes written", len(data))
+        self.files[path] = (time(), len(data))
+        self.size += len(data)
+        self.evict(path)
+        return path
+
+    def evict(self, keep):
+        """Remove the least recently written files until the directory fits
+        its budget, keeping the file just written"""
+        budget = settings.artifact_budget * 1024 * 1024
+        if self.size <= budget:
+            return
+        for path in sorted(self.files, key=lambda path: self.files[path][0]):
+            if self.size <= budget:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                # e.g. evicted by another process
+                pass
+            self.size -= self.files.pop(path)[1]
+            self.stats.add("artifact files evicted")
@@ -0,0 +1,211 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import json
+import threading
+import multiprocessing
+from time import time
+from suite import lock
+import settings
+
+# the run statistics the Autoscaler watches, sampled at each decision
+watched = ["actions", "action seconds", "readiness timeouts",
+           "sessions crashed"]
+
+
+def cpu_times():
+    """Return the host's (busy, total) CPU time from /proc/stat, or None
+    where it is unavailable"""
+    try:
+        with open("/proc/stat") as f:
+            values = [float(value) for value in f.readline().split()[1:]]
+    except (IOError, ValueError):
+        return None
+    # idle and I/O wait time are not busy
+    return sum(values) - sum(values[3:5]), sum(values)
+
+
+def memory_available():
+    """Return the fraction of the host's memory available from
+    /proc/meminfo, or None where it is unavailable"""
+    info = {}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                name, value = line.split(":", 1)
+                info[name] = float(value.split()[0])
+        return info["MemAvailable"] / info["MemTotal"]
+    except (IOError, ValueError, KeyError, IndexError, ZeroDivisionError):
+        return None
+
+
+class Autoscaler(object):
+    """The Autoscaler adjusts the number of Suite threads (and browser
+    sessions) while a run is going. The run starts with a few threads;
+    every settings.autoscale_interval seconds, one is added while the
+    host's CPU use, its available memory and the mean action latency stay
+    healthy and every thread is busy. When any of them degrades, or
+    browsers time out or crash, a quarter of the threads are drained: each
+    finishes its suite and exits. Every decision is kept in a timeline."""
+    def __init__(self, stats, minimum, maximum):
+        self.stats = stats
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.target = minimum  # threads wanted
+        self.running = 0  # threads taking suites
+        self.peak = minimum
+        self.lock = threading.Lock()
+        self.start_time = time()
+        self.checked = self.start_time
+        self.cpu = cpu_times()
+        self.counters = dict((name, stats.get(name)) for name in watched)
+        self.best_latency = None  # lowest mean action latency seen
+        self.timeline = []  # one entry per decision
+
+    def enter(self):
+        """Count a thread that has started taking suites"""
+        with self.lock:
+            self.running += 1
+
+    def leave(self):
+        """Count a thread that has run out of suites"""
+        with self.lock:
+            self.running -= 1
+
+    def drain(self):
+        """Check, between suites, whether the calling thread should exit to
+        bring the thread count down to the target. The thread no longer
+        counts as running if so."""
+        with self.lock:
+            if self.running > self.target:
+                self.running -= 1
+                return True
+            return False
+
+    def cpu_usage(self):
+        """Return the fraction of CPU time the host was busy since the
+        last decision, or its load average per core where /proc/stat is
+        unavailable"""
+        cpu = cpu_times()
+        if cpu is None:
+            try:
+                return os.getloadavg()[0] / multiprocessing.cpu_count()
+            except (OSError, AttributeError, NotImplementedError):
+                return None
+        busy, total = cpu[0] - self.cpu[0], cpu[1] - self.cpu[1]
+        self.cpu = cpu
+        return busy / total if total else None
+
+    def check(self):
+        """Make a decision if one is due, returning the number of threads
+        to add"""
+        now = time()
+        if now - self.checked < settings.autoscale_interval:
+            return 0
+        self.checked = now
+        cpu = self.cpu_usage()
+        memory = memory_available()
+        counters = dict((name, self.stats.get(name)) for name in watched)
+        delta = dict((name, counters[name] - self.counters[name])
+                     for name in watched)
+        self.counters = counters
+        latency = None
+        if delta["actions"]:
+            latency = delta["action seconds"] / delta["actions"]
+            self.best_latency = min(self.best_latency or latency, latency)
+        # reasons to back off
+        reasons = []
+        if cpu is not None and cpu > settings.autoscale_max_cpu:
+            reasons.append("CPU %.0f%%" % (100 * cpu))
+        if memory is not None and memory < settings.autoscale_min_memory:
+            reasons.append("memory %.0f%% available" % (100 * memory))
+        if latency is not None and latency > \
+                self.best_latency * settings.autoscale_latency_factor:
+            reasons.append("action latency %.3fs (best %.3fs)" % (
+                latency, self.best_latency))
+        failures = delta["readiness timeouts"] + delta["sessions crashed"]
+        if failures:
+            reasons.append("%d browser timeout%s or crash%s" % (
+                failures, "" if failures == 1 else "s",
+                "" if failures == 1 else "es"))
+        with self.lock:
+            before = self.target
+            if reasons:
+                self.target = max(self.minimum,
+                                  self.target - max(self.target / 4, 1))
+            elif latency is not None and self.running == self.target:
+                # every thread is busy and the host is healthy
+                self.target = min(self.target + 1, self.maximum)
+            after = self.target
+            running = self.running
+        self.peak = max(self.peak, after)
+        entry = {
+            "seconds": round(now - self.start_time, 1),
+            "threads": after,
+            "running": running,
+            "cpu": cpu,
+            "memory": memory,
+            "latency": latency,
+            "reasons": reasons
+        }
+        self.timeline.append(entry)
+        if after != before:
+            with lock:
+                print "Autoscaling:", self.describe(entry, before)
+        return max(after - before, 0)
+
+    def describe(self, entry, before):
+        """Describe a decision that changed the thread count"""
+        line = "%.0fs: %d -> %d threads" % (
+            entry["seconds"], before, entry["threads"])
+        if entry["reasons"]:
+            return line + " (%s)" % ", ".join(entry["reasons"])
+        return line + " (healthy)"
+
+    def report(self):
+        """Return the report lines: the thread counts reached, the mean
+        number of threads running, and each change"""
+        lines = []
+        changes = []
+        threads = self.minimum
+        for entry in self.timeline:
+            if entry["threads"] != threads:
+                changes.append(self.describe(entry, threads))
+                threads = entry["threads"]
+        running = [entry["running"] for entry in self.timeline]
+        lines.append(
+            "autoscaled between %d and %d threads (peak %d, mean %.1f "
+            "running); %d change%s" % (
+                self.minimum, self.maximum, self.peak,
+                float(sum(running)) / len(running) if running else
+                self.minimum, len(changes),
+                "" if len(changes) == 1 else "s"))
+        lines.extend("  " + change for change in changes)
+        return lines
+
+    def save(self, filename):
+        """Write the limits and the timeline of decisions"""
+        with open(filename, "w") as f:
+            json.dump({
+                "minimum": self.minimum,
+                "maximum": self.maximum,
+                "peak": self.peak,
+                "timeline": self.timeline
+            }, f, indent=1)
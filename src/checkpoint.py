@@ -0,0 +1,129 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import json
+from time import time
+
+
+class Checkpoint(object):
+    """The Checkpoint is a journal of the current run: the suites it was
+    started with, then the outcome of each suite as it finishes. Each record
+    is appended with a single write, so records from threads and worker
+    processes never interleave, and synced to disk, so the journal survives
+    a crash or reboot. A record torn by a crash is ignored. The journal only
+    holds one run; starting a new run replaces it atomically. A run whose
+    suites are loaded while it runs adds each suite as it is loaded."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.run = None  # the journaled run
+        self.names = []  # suites the run was started with
+        self.suites = {}  # suite: record of its latest outcome in the run
+        self.fd = None
+        self.read()
+
+    def read(self):
+        """Read the journaled run, if any"""
+        try:
+            with open(self.filename, "r") as f:
+                lines = f.readlines()
+        except IOError:
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # torn by a crash mid-write
+                continue
+            if record["type"] == "run":
+                self.run = record["run"]
+                self.names = record["suites"]
+                self.suites = {}
+            elif record["type"] == "added" and record["run"] == self.run:
+                self.names.append(record["suite"])
+            elif record["type"] == "suite" and record["run"] == self.run \
+                    and record.get("row") is None:
+                # (a data suite's rows are journaled, but it only finishes
+                # with the record of the whole suite)
+                self.suites[record["suite"]] = record
+
+    def pending(self):
+        """Return the suites of the journaled run that have not finished"""
+        return [name for name in self.names if name not in self.suites]
+
+    def failed(self):
+        """Return the suites that failed in the journaled run"""
+        return [name for name in self.names
+                if name in self.suites and not self.suites[name]["passed"]]
+
+    def start(self, names):
+        """Start journaling a new run of suites"""
+        self.run = "%.6f" % time()
+        self.names = list(names)
+        self.suites = {}
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "w") as f:
+            f.write(json.dumps(
+                {"type": "run", "run": self.run, "suites": self.names}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp_filename, self.filename)
+        self.open()
+
+    def resume(self):
+        """Continue journaling the journaled run"""
+        self.open()
+        # end any torn record, so the next record starts on its own line
+        if os.fstat(self.fd).st_size:
+            with open(self.filename, "rb") as f:
+                f.seek(-1, 2)
+                torn = f.read(1) != "\n"
+            if torn:
+                os.write(self.fd, "\n")
+
+    def open(self):
+        self.fd = os.open(
+            self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+
+    def add(self, name):
+        """Journal a suite added to the run"""
+        self.names.append(name)
+        os.write(self.fd, json.dumps(
+            {"type": "added", "run": self.run, "suite": name}) + "\n")
+        os.fsync(self.fd)
+
+    def record(self, result):
+        """Journal a suite's Result, or the Result of a row of a data
+        suite"""
+        os.write(self.fd, json.dumps({
+            "type": "suite",
+            "run": self.run,
+            "suite": result.name,
+            "passed": result.passed,
+            "seconds": round(result.seconds, 3),
+            "ui_map": result.ui_map,
+            "line": result.line,
+            "row": result.row
+        }) + "\n")
+        os.fsync(self.fd)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
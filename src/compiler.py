@@ -0,0 +1,314 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import sys
+import marshal
+import hashlib
+import threading
+from collections import namedtuple
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from page import Page
+import settings
+
+
+# a compiled action: the Page method to call, its converted parameters,
+# whether it may cause navigation, and where it came from (line numbers start
+# at 1)
+Action = namedtuple('Action', [
+    'command', 'function', 'params', 'navigates', 'line_number', 'source'])
+
+by_map = {
+    "xpath": By.XPATH,
+    "id": By.ID,
+    "css": By.CSS_SELECTOR
+}
+
+key_map = {
+    "down": Keys.DOWN,
+    "up": Keys.UP,
+    "left": Keys.LEFT,
+    "right": Keys.RIGHT,
+    "return": Keys.RETURN,
+    "page_down": Keys.PAGE_DOWN,
+    "page_up": Keys.PAGE_UP
+}
+
+
+class CompileError(ValueError):
+    """Raised when a UI map contains an invalid action"""
+    def __init__(self, filename, line_number, message):
+        ValueError.__init__(
+            self, "%s, line %d: %s" % (filename, line_number, message))
+
+
+"""Parameter converters"""
+
+
+def text(value):
+    """A plain string parameter"""
+    return value
+
+
+def by(value):
+    """A By method, e.g. id, css or xpath"""
+    if value not in by_map:
+        raise ValueError("unknown By method: %s" % value)
+    return by_map[value]
+
+
+def keys(value):
+    """A comma-separated list of special keys, mapped to a key string"""
+    try:
+        return ''.join([key_map[key] for key in value.split(',')])
+    except KeyError:
+        raise ValueError("unknown key mapping: %s" % value)
+
+
+def integer(value):
+    """An integer, e.g. a window dimension"""
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("invalid integer: %s" % value)
+
+
+def number(value):
+    """A floating point number, e.g. a delay in milliseconds"""
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError("invalid number: %s" % value)
+
+
+def wait_mode(value):
+    """A wait mode: ready or fixed"""
+    if value not in ("ready", "fixed"):
+        raise ValueError("unknown wait mode: %s" % value)
+    return value
+
+
+def frame(value):
+    """A frame name or number"""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+commands = {
+    # command: (function, parameter converters)
+    "action_new": (Page.action_new, ()),
+    "action_move_to_element": (Page.action_move_to_element, (by, text)),
+    "action_click": (Page.action_click, ()),
+    "action_keys": (Page.action_keys, (keys,)),
+    "action_perform": (Page.action_perform, ()),
+    "base_url": (Page.set_base_url, (text,)),
+    "clear": (Page.clear, (by, text)),
+    "clear_type": (Page.clear_type, (by, text, text)),
+    "click": (Page.click, (by, text)),
+    "click_all": (Page.click_all, (by, text)),
+    "delay": (Page.delay, (number,)),
+    "exec": (Page.execute, (text,)),
+    "find_frame": (Page.find_frame, (by, text)),
+    "keys": (Page.keys, (by, text, keys)),
+    "log": (Page.log_message, (text,)),
+    "log_var": (Page.log_var, (text,)),
+    "open": (Page.open_url, (text,)),
+    "random_ssn": (Page.random_ssn, (text,)),
+    "select": (Page.select, (by, text, text)),
+    "select_by_value": (Page.select_by_value, (by, text, text)),
+    "set_window_size": (Page.set_window_size, (integer, integer)),
+    "store_attribute": (Page.store_attribute, (by, text, text, text)),
+    "store_text": (Page.store_text, (by, text, text)),
+    "switch_to_default": (Page.switch_to_default, ()),
+    "switch_to_frame": (Page.switch_to_frame, (frame,)),
+    "type": (Page.send_keys, (by, text, text)),
+    "type_var": (Page.send_var, (by, text, text)),
+    "verify_text": (Page.verify_text, (by, text, text)),
+    "wait_mode": (Page.set_wait_mode, (wait_mode,))
+}
+
+# actions that may load a new page or fire requests; in the ready wait mode,
+# only these actions wait for the page to settle
+navigation_commands = set([
+    "action_perform",
+    "click",
+    "click_all",
+    "keys",
+    "open"
+])
+
+# actions that may be fused into a single script with --fuse: the script
+# selects options and dispatches input and change events, as the page's own
+# scripts would. Typing is never fused, since setting a field's value is not
+# the same as typing into it.
+fusable_commands = set([
+    "select",
+    "select_by_value",
+    "verify_text"
+])
+
+
+class Compiler(object):
+    """The Compiler parses and validates each UI map exactly once, producing
+    an immutable tuple of Actions that is shared by every suite and thread.
+    Compiled UI maps may optionally be cached on disk, keyed by each file's
+    modification time and content hash. When fusing, each run of fusable
+    actions is linked into a single action."""
+    def __init__(self, cache_filename=None, fuse=False):
+        self.ui_maps = {}
+        self.digests = {}  # ui_map: SHA-1 of its source
+        self.fuse = fuse
+        self.lock = threading.Lock()
+        self.cache_filename = cache_filename
+        self.cache = {}
+        self.cache_dirty = False
+        if cache_filename:
+            self.load_cache()
+
+    def load(self, ui_map):
+        """Return the compiled actions for a UI map, compiling it if needed"""
+        with self.lock:
+            if ui_map not in self.ui_maps:
+                self.ui_maps[ui_map] = self.load_ui_map(ui_map)
+            return self.ui_maps[ui_map]
+
+    def load_ui_map(self, ui_map):
+        """Load a UI map from the cache, or compile it from its file. Raises
+        IOError or OSError if the file cannot be read."""
+        filename = os.path.join(settings.ui_map_directory, ui_map)
+        mtime = os.path.getmtime(filename)
+        cached = self.cache.get(ui_map)
+        if cached and cached[0] == mtime:
+            # unchanged since the last run: skip reading entirely
+            self.digests[ui_map] = cached[1]
+            return self.link(cached[2])
+        with open(filename, "r") as f:
+            source = f.read()
+        digest = hashlib.sha1(source).hexdigest()
+        self.digests[ui_map] = digest
+        if cached and cached[1] == digest:
+            # touched, but not modified
+            instructions = cached[2]
+        else:
+            instructions = self.compile(ui_map, source)
+        if self.cache_filename:
+            self.cache[ui_map] = (mtime, digest, instructions)
+            self.cache_dirty = True
+        return self.link(instructions)
+
+    def compile(self, ui_map, source):
+        """Parse and validate UI map source, returning a tuple of
+        (command, params, line number, source line) instructions"""
+        instructions = []
+        line_number = 0
+        for line in source.splitlines():
+            line_number += 1
+            line = line.strip()
+            if not len(line) or line[0] == "#":
+                # ignore blank lines and comments
+                continue
+            try:
+                cmd, params = self.compile_action(ui_map, line, line_number)
+            except ValueError, e:
+                raise CompileError(ui_map, line_number, e)
+            instructions.append((cmd, params, line_number, line))
+        return tuple(instructions)
+
+    def compile_action(self, ui_map, line, line_number):
+        """Compile a single action line into a (command, params) pair. The
+        final parameter may contain the delimiter, e.g. exec|a = b | c"""
+        cmd, delimiter, rest = line.partition(settings.delimeter)
+        if cmd not in commands:
+            raise ValueError("unknown action: %s" % cmd)
+        converters = commands[cmd][1]
+        if not len(converters):
+            if delimiter:
+                raise ValueError("%s takes no parameters" % cmd)
+            return (cmd, ())
+        params = rest.split(settings.delimeter, len(converters) - 1) \
+            if delimiter else []
+        if len(params) != len(converters):
+            raise ValueError("%s takes %d parameter%s, got %d" % (
+                cmd, len(converters),
+                "" if len(converters) == 1 else "s", len(params)))
+        params = [convert(param) for convert, param in zip(converters, params)]
+        if cmd == "exec":
+            try:
+                params[0] = compile(
+                    params[0], "%s:%d" % (ui_map, line_number), "exec")
+            except SyntaxError, e:
+                raise ValueError("invalid Python code: %s" % e)
+        return (cmd, tuple(params))
+
+    def link(self, instructions):
+        """Resolve compiled instructions into Actions"""
+        actions = tuple(
+            Action(cmd, commands[cmd][0], params,
+                   cmd in navigation_commands, line_number, line)
+            for cmd, params, line_number, line in instructions)
+        if self.fuse:
+            actions = self.fuse_actions(actions)
+        return actions
+
+    def fuse_actions(self, actions):
+        """Replace each run of two or more fusable actions with a fused
+        action, whose parameter is the run"""
+        fused = []
+        run = []
+        for action in actions + (None,):
+            if action is not None and action.command in fusable_commands:
+                run.append(action)
+                continue
+            if len(run) > 1:
+                fused.append(Action(
+                    "fused", Page.fused, (tuple(run),), False,
+                    run[0].line_number, "fused: lines %d-%d" % (
+                        run[0].line_number, run[-1].line_number)))
+            else:
+                fused.extend(run)
+            run = []
+            if action is not None:
+                fused.append(action)
+        return tuple(fused)
+
+    def load_cache(self):
+        """Load the on-disk cache, discarding it if it is unreadable or was
+        written by a different Python version"""
+        try:
+            with open(self.cache_filename, "rb") as f:
+                version, cache = marshal.load(f)
+            if version == sys.version:
+                self.cache = cache
+        except (IOError, EOFError, ValueError, TypeError):
+            pass
+
+    def save_cache(self):
+        """Write the on-disk cache if anything was compiled"""
+        if not self.cache_filename or not self.cache_dirty:
+            return
+        temp_filename = self.cache_filename + ".tmp"
+        try:
+            with open(temp_filename, "wb") as f:
+                marshal.dump((sys.version, self.cache), f)
+            os.rename(temp_filename, self.cache_filename)
+            self.cache_dirty = False
+        except (IOError, OSError), e:
+            print "Cannot write UI map cache:", e
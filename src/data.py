@@ -0,0 +1,117 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import csv
+import json
+import hashlib
+from itertools import islice
+from collections import namedtuple
+
+# a run of consecutive rows of a data file: the first row's number (rows are
+# numbered from 1) and file offset, and the number of rows
+Chunk = namedtuple('Chunk', ['filename', 'first', 'offset', 'count'])
+
+
+class DataError(ValueError):
+    """Raised when a data file contains an invalid row"""
+    def __init__(self, filename, row, message):
+        ValueError.__init__(self, "%s, row %d: %s" % (filename, row, message))
+
+
+def rows(filename, offset=0):
+    """Yield (offset, values) for each row of a CSV (with a header row) or
+    JSON Lines data file, starting at a row's offset. Values map column
+    names to values. Rows are read one at a time. Raises ValueError for
+    an invalid row."""
+    with open(filename, "rb") as f:
+        if filename.lower().endswith(".csv"):
+            # read line by line, so the file offset of each row is known
+            reader = csv.reader(iter(f.readline, ""))
+            try:
+                header = reader.next()
+            except StopIteration:
+                return
+            except csv.Error, e:
+                raise ValueError("invalid header: %s" % e)
+            if offset:
+                f.seek(offset)
+            while True:
+                start = f.tell()
+                try:
+                    values = reader.next()
+                except StopIteration:
+                    return
+                except csv.Error, e:
+                    raise ValueError(e)
+                if values:
+                    yield start, dict(zip(header, values))
+        else:
+            f.seek(offset)
+            for line in iter(f.readline, ""):
+                start = f.tell() - len(line)
+                if not line.strip():
+                    continue
+                values = json.loads(line)
+                if not isinstance(values, dict):
+                    raise ValueError("not a JSON object")
+                yield start, values
+
+
+def chunks(filename, size):
+    """Yield the Chunks of up to size rows that make up a data file,
+    checking every row. Raises DataError for an invalid row."""
+    chunk = None
+    number = 0
+    try:
+        for offset, values in rows(filename):
+            number += 1
+            if chunk is None:
+                chunk = Chunk(filename, number, offset, 0)
+            chunk = chunk._replace(count=chunk.count + 1)
+            if chunk.count == size:
+                yield chunk
+                chunk = None
+    except ValueError, e:
+        raise DataError(filename, number + 1, e)
+    if chunk is not None:
+        yield chunk
+
+
+def read_chunk(chunk):
+    """Yield (number, offset, values) for each row of a Chunk"""
+    for number, (offset, values) in enumerate(
+            islice(rows(chunk.filename, chunk.offset), chunk.count),
+            chunk.first):
+        yield number, offset, values
+
+
+def after(chunk):
+    """Return the Chunk of the rows after a chunk's first row, if any"""
+    for number, offset, values in islice(read_chunk(chunk), 1, 2):
+        return Chunk(chunk.filename, number, offset, chunk.count - 1)
+    return None
+
+
+def digest(filename):
+    """Return the SHA-1 of a data file"""
+    sha1 = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(65536), ""):
+            sha1.update(block)
+    return sha1.hexdigest()
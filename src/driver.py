@@ -19,13 +19,131 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import sys
 import os
 import time
+import hashlib
+import math
+import heapq
+import collections
 import datetime
 import Queue
-from bs4 import BeautifulSoup
-from suite import Suite
+import threading
+import multiprocessing
+from xml.etree import cElementTree as ElementTree
+from suite import Suite, Result, label, lock as print_lock
+from pool import SessionPool
+from grid import Node, LocalBackend, GridBackend
+from history import History, makespan, lower_bound
+from checkpoint import Checkpoint
+from snapshot import Snapshots, shared_prefixes, name as snapshot_name
+from logger import LogWriter, LogBuffer
+from profiler import Profiler
+from metrics import Metrics, MetricsStore
+from autoscale import Autoscaler
+from timeouts import Timeouts
+from artifacts import ArtifactWriter
+from load import LoadTest
+from compiler import Compiler, CompileError
+from stats import Stats
+import data
 import settings
 
 
+class TaskQueue(object):
+    """Adapts a multiprocessing queue of suite names (with the data Chunk to
+    run, if any) to the queue interface used by Suite threads. Suites
+    requeued after a browser crash stay within the worker process."""
+    def __init__(self, tasks, suites):
+        self.tasks = tasks
+        self.suites = suites
+        self.requeued = Queue.Queue()
+
+    def get_nowait(self):
+        try:
+            return self.requeued.get_nowait()
+        except Queue.Empty:
+            pass
+        task = self.tasks.get()
+        if task is None:
+            raise Queue.Empty
+        name, chunk = task
+        return (name, self.suites[name], chunk)
+
+    def put(self, suite):
+        self.requeued.put(suite)
+
+
+class StreamQueue(object):
+    """A priority queue of suites fed by the streaming loader, with the
+    queue interface used by Suite threads. Threads wait for suites while
+    loading continues, and the loader waits while the queue is full."""
+    def __init__(self, size):
+        self.size = size
+        self.heap = []  # (priority, insertion order, suite)
+        self.count = 0
+        self.loading = True
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def add(self, priority, suite):
+        """Queue a loaded suite, returning False if the run has stopped"""
+        with self.condition:
+            while len(self.heap) >= self.size and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                return False
+            self.push(priority, suite)
+            return True
+
+    def push(self, priority, suite):
+        heapq.heappush(self.heap, (priority, self.count, suite))
+        self.count += 1
+        self.condition.notify_all()
+
+    def get_nowait(self):
+        """Return the next suite, waiting for the loader if needed. Raises
+        Queue.Empty once loading has finished and the queue is empty."""
+        with self.condition:
+            while not self.heap:
+                if not self.loading:
+                    raise Queue.Empty
+                self.condition.wait()
+            suite = heapq.heappop(self.heap)[2]
+            self.condition.notify_all()
+            return suite
+
+    def put(self, suite):
+        """Requeue a suite behind the others"""
+        with self.condition:
+            self.push((True, float("inf")), suite)
+
+    def finish(self):
+        """Mark the end of loading"""
+        with self.condition:
+            self.loading = False
+            self.condition.notify_all()
+
+    def close(self):
+        """Stop the loader, once the threads have exited"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+def xml_keys(filename):
+    """Yield the issue keys of a JIRA filter export as they are parsed. Each
+    element is discarded once parsed, so only the open elements are kept in
+    memory."""
+    path = []  # open elements
+    for event, element in ElementTree.iterparse(filename, ("start", "end")):
+        if event == "start":
+            path.append(element)
+            continue
+        path.pop()
+        if element.tag.rsplit("}", 1)[-1] == "key":
+            yield element.text or ""
+        if path:
+            path[-1].remove(element)
+
+
 class Driver(object):
     """The Driver loads the specified test suites and each suite's UI maps.
     Test suites are launched concurrently. Results are printed to the the
@@ -39,25 +157,55 @@ class Driver(object):
         for k, v in kwargs.items():
             self.store[k] = v
 
-        # initialize log and test suites
-        self.log_data = {}
+        # initialize statistics, results and test suites
+        self.stats = Stats()
+        self.results = []
+        self.results_lock = threading.Lock()
+        self.profiler = Profiler() if self.store.get('profile') else None
+        self.metrics = Metrics() if self.store.get('metrics') else None
+        self.regressions = []  # page metric regressions, after a run
+        self.scaler = None  # the Autoscaler, with --autoscale
+        self.timeouts = None  # learned Timeouts, unless --hard-timeouts
+        if not self.store.get('hard_timeouts'):
+            self.timeouts = Timeouts(settings.history_filename)
         self.suites = {}
+        self.suite_digests = {}  # suite: SHA-1 of its UI map list
+        self.data_files = {}  # data suite: its data file
+        self.chunks = {}  # data suite: the Chunks of its data file
+        self.rows = {}  # data suite: the Results of its rows, after a run
+        self.prefixes = None  # suite: shared prefix, with --snapshots
 
         # check if `suite' is a directory
         if os.path.isdir(suite):
             settings.suites_directory = suite
             self.locate_ui_map_directory(settings.suites_directory)
+            self.init_compiler()
             if self.store['xml']:
                 # check if it is an XML file (JIRA filter output)
-                self.load_test_suites_from_xml(self.store['xml'])
+                suite_files = xml_keys(self.store['xml'])
             else:
-                # load all test suites contained within the directory
-                self.load_all_test_suites()
+                # all test suites contained within the directory
+                suite_files = os.listdir(settings.suites_directory)
+            self.suite_files = (
+                os.path.join(settings.suites_directory, fn)
+                for fn in suite_files)
         else:
-            # otherwise, load the specified suite file
+            # otherwise, the specified suite file
             settings.suites_directory = os.path.split(suite)[0]
             self.locate_ui_map_directory(settings.suites_directory)
-            self.load_test_suite(suite)
+            self.init_compiler()
+            self.suite_files = [suite]
+
+        # when streaming, suites are loaded as the run starts
+        if not self.store.get('stream'):
+            self.load_test_suites(self.suite_files)
+            # write any newly compiled UI maps to the cache
+            self.compiler.save_cache()
+
+        # remote WebDriver nodes, if any
+        self.nodes = None
+        if self.store.get('grid'):
+            self.nodes = self.load_grid(self.store['grid'])
 
     def run(self):
         """Run test suites concurrently and record statistics"""
@@ -66,42 +214,511 @@ class Driver(object):
         self.init_log()
         start_time = time.time()
 
-        # create a queue of test suites to be run
-        q = Queue.Queue()
-        for suite in self.suites.items():
-            q.put(suite)
+        if self.store.get('load'):
+            self.run_load()
+            return
 
-        # spin up a few threads to process the test suites
-        threads = []
-        if settings.thread_count < q.qsize():
-            thread_count = settings.thread_count
+        history = History(settings.history_filename)
+        if self.store.get('stream'):
+            inputs = self.run_stream(history, start_time)
         else:
-            thread_count = q.qsize()
-        print "Launching %d test thread%s..." % \
+            inputs = self.run_loaded(history)
+            if inputs is None:
+                return
+
+        # save durations and outcomes for the next run
+        self.aggregate_rows()
+        history.record(self.results, inputs)
+        if self.metrics is not None:
+            self.record_metrics()
+        if self.timeouts is not None:
+            self.timeouts.save()
+        self.checkpoint.close()
+        self.writer.close()
+
+        # print log and stats
+        elapsed_time = time.time() - start_time
+        self.print_log(elapsed_time)
+
+    def run_loaded(self, history):
+        """Run the loaded test suites, returning the digests of their
+        inputs, or None if there is nothing to run"""
+        # order suites longest first, using the durations of previous runs
+        names = history.order(
+            self.suites.keys(), self.store.get('failed_first'))
+        inputs = dict((name, self.suite_inputs(name)) for name in names)
+        if self.store.get('incremental') or self.store.get('explain'):
+            names = self.select_suites(history, names, inputs)
+            if self.store.get('explain'):
+                return None
+        names = self.checkpoint_suites(names)
+        if not names:
+            print "No suites to run"
+            self.checkpoint.close()
+            return None
+        durations = [history.estimate(name) for name in names]
+        if self.store.get('snapshots'):
+            # the rows of a data suite do not share their state
+            self.prefixes = shared_prefixes(dict(
+                (name, self.suites[name]) for name in names
+                if name not in self.data_files))
+        tasks = [(name, chunk) for name in names
+                 for chunk in self.suite_chunks(name)]
+
+        process_count = self.store.get('processes') or 1
+        if process_count > 1 and len(tasks) > 1:
+            # worker processes send log records to this process' writer
+            self.writer = LogWriter(
+                settings.log_records_filename,
+                multiprocessing.Queue(settings.log_queue_size))
+            self.writer.start()
+            self.thread_count = self.run_processes(
+                tasks, process_count, durations)
+        else:
+            self.writer = LogWriter(settings.log_records_filename)
+            self.writer.start()
+            # create a queue of test suites to be run
+            q = Queue.Queue()
+            for name, chunk in tasks:
+                q.put((name, self.suites[name], chunk))
+
+            # spin up a few threads to process the test suites
+            self.thread_count = min(self.capacity(self.nodes), q.qsize())
+            thread_count = self.launch_count(self.thread_count)
+            print "Launching %d test thread%s..." % \
+                (thread_count, self.pluralize(thread_count))
+            self.print_estimate(durations, self.thread_count)
+            self.run_threads(q, thread_count, self.nodes)
+        return inputs
+
+    def run_stream(self, history, start_time):
+        """Run test suites as they are loaded. A loader thread feeds the
+        Suite threads through a StreamQueue while their browsers launch;
+        of the suites loaded so far, the longest runs first. Returns the
+        digests of the loaded suites' inputs."""
+        selected, journal = self.checkpoint_stream()
+        self.writer = LogWriter(settings.log_records_filename)
+        self.writer.start()
+        q = StreamQueue(settings.stream_queue_size)
+        inputs = {}
+        loader = threading.Thread(
+            target=self.load_stream,
+            args=(q, history, selected, journal, inputs, start_time))
+        loader.daemon = True
+        loader.start()
+
+        self.thread_count = self.capacity(self.nodes)
+        thread_count = self.launch_count(self.thread_count)
+        print "Launching %d test thread%s while loading suites..." % \
             (thread_count, self.pluralize(thread_count))
+        self.run_threads(q, thread_count, self.nodes)
+        q.close()
+        loader.join()
+        return inputs
+
+    def load_stream(self, q, history, selected, journal, inputs,
+                    start_time):
+        """Load suites into a StreamQueue as they are found, dropping
+        duplicates. Suites that cannot be loaded are reported and skipped."""
+        log = LogBuffer(self.writer)
+        failed_first = self.store.get('failed_first')
+        seen = set()
+        try:
+            for filename in self.suite_files:
+                if filename in seen:
+                    self.stats.add("duplicate suites")
+                    continue
+                seen.add(filename)
+                if os.path.isdir(filename) or not selected(filename):
+                    continue
+                try:
+                    self.read_test_suite(filename)
+                except (IOError, OSError, CompileError, data.DataError), e:
+                    self.stats.add("suite load errors")
+                    log.message(filename, "X Suite not loaded: %s" % e)
+                    log.flush()
+                    with print_lock:
+                        print "Error loading suite %s: %s" % (filename, e)
+                    continue
+                inputs[filename] = self.suite_inputs(filename)
+                if journal:
+                    self.checkpoint.add(filename)
+                if not self.stats.get("suites loaded"):
+                    self.stats.add("first suite seconds",
+                                   time.time() - start_time)
+                self.stats.add("suites loaded")
+                priority = (failed_first and not history.failed(filename),
+                            -history.estimate(filename))
+                for chunk in self.suite_chunks(filename):
+                    if not q.add(priority,
+                                 (filename, self.suites[filename], chunk)):
+                        return
+        except (IOError, SyntaxError), e:
+            # the XML file cannot be read: run the suites found so far
+            with print_lock:
+                print "Error reading XML file", self.store['xml']
+                print e
+        finally:
+            self.stats.add("load seconds", time.time() - start_time)
+            q.finish()
+            self.compiler.save_cache()
+
+    def run_load(self):
+        """Replay the suites as a load test, printing and saving its
+        report"""
+        data_files = dict(
+            (name, (filename, sum(chunk.count for chunk in self.chunks[name])))
+            for name, filename in self.data_files.items())
+        test = LoadTest(
+            sorted(self.suites.items()), self.store, self.stats,
+            self.backend(self.nodes), self.store['load'],
+            self.store.get('duration') or settings.load_duration,
+            self.store.get('ramp_up') or 0, self.store.get('rate'),
+            data_files)
+        test.run()
+        f = open(settings.log_filename, "a")
+        print
+        for message in test.report():
+            print message
+            f.write(message + "\n")
+        f.write("-" * 80 + "\n")
+        f.close()
+        test.save(settings.load_filename)
+        print "load test results saved to", settings.load_filename
+
+    def record_metrics(self):
+        """Save the run's page metrics and compare them with their
+        baselines"""
+        store = MetricsStore(settings.metrics_filename)
+        samples = self.metrics.data()
+        run = store.record(samples)
+        self.regressions = store.regressions(samples, run)
+        store.close()
+
+    def suite_inputs(self, name):
+        """Return the digests of everything a suite's outcome depends on:
+        the suite file, its UI maps, its data file, the base URL and the
+        tier"""
+        inputs = {
+            "suite": self.suite_digests[name],
+            "base url": self.store['base'],
+            "tier": self.store['tier']
+        }
+        for ui_map, actions in self.suites[name]:
+            inputs["ui map %s" % ui_map] = self.compiler.digests[ui_map]
+        if name in self.data_files:
+            inputs["data"] = data.digest(self.data_files[name])
+        return inputs
+
+    def suite_chunks(self, name):
+        """Return the data Chunks to queue for a suite: None, for a suite
+        without a data file"""
+        return self.chunks.get(name, [None])
+
+    def aggregate_rows(self):
+        """Replace the row Results of each data suite with one Result for
+        the suite, journaling it; a data suite interrupted before all of its
+        rows ran is left out. The row Results are kept for the summary."""
+        results = []
+        self.rows = {}
+        for result in self.results:
+            if result.row is None:
+                results.append(result)
+            else:
+                self.rows.setdefault(result.name, []).append(result)
+        for name, rows in sorted(self.rows.items()):
+            rows.sort(key=lambda result: result.row)
+            if len(rows) < sum(chunk.count for chunk in self.chunks[name]):
+                continue
+            failed = [result for result in rows if not result.passed]
+            result = Result(name, not failed,
+                            sum(result.seconds for result in rows),
+                            failed[0].ui_map if failed else None,
+                            failed[0].line if failed else None, None)
+            results.append(result)
+            self.checkpoint.record(result)
+        self.results = results
+
+    def select_suites(self, history, names, inputs):
+        """Select the suites an incremental run needs, listing why each suite
+        was selected or skipped if explaining"""
+        selection = history.select(
+            names, inputs, self.store.get('sample') or 0)
+        if self.store.get('explain'):
+            for name, selected, reason in selection:
+                print "%s %s (%s)" % (
+                    "run " if selected else "skip", name, reason)
+        selected = [name for name, selected, reason in selection if selected]
+        print "Selected %d of %d suite%s" % (
+            len(selected), len(names), self.pluralize(len(names)))
+        return selected
+
+    def checkpoint_suites(self, names):
+        """Start a checkpoint journal for this run, or resume the journaled
+        run, returning the suites to run"""
+        self.checkpoint = Checkpoint(settings.checkpoint_filename)
+        if self.store.get('resume'):
+            if self.checkpoint.run is not None:
+                pending = set(self.checkpoint.pending())
+                finished = len(self.checkpoint.names) - len(pending)
+                print "Resuming the last run: %d of %d suite%s finished" % (
+                    finished, len(self.checkpoint.names),
+                    self.pluralize(len(self.checkpoint.names)))
+                self.checkpoint.resume()
+                return [name for name in names if name in pending]
+            print "No run to resume; starting a new run"
+        elif self.store.get('rerun_failed'):
+            failed = set(self.checkpoint.failed())
+            print "Rerunning %d failed suite%s of the last run" % (
+                len(failed), self.pluralize(len(failed)))
+            names = [name for name in names if name in failed]
+        self.checkpoint.start(names)
+        return names
+
+    def checkpoint_stream(self):
+        """Start a checkpoint journal for a streamed run, or resume the
+        journaled run. Returns a function that selects the suites to run as
+        they are loaded, and whether to journal them."""
+        self.checkpoint = Checkpoint(settings.checkpoint_filename)
+        if self.store.get('resume'):
+            if self.checkpoint.run is not None:
+                pending = set(self.checkpoint.pending())
+                finished = len(self.checkpoint.names) - len(pending)
+                print "Resuming the last run: %d of %d suite%s finished" % (
+                    finished, len(self.checkpoint.names),
+                    self.pluralize(len(self.checkpoint.names)))
+                self.checkpoint.resume()
+                return (lambda name: name in pending), False
+            print "No run to resume; starting a new run"
+        selected = lambda name: True
+        if self.store.get('rerun_failed'):
+            failed = set(self.checkpoint.failed())
+            print "Rerunning %d failed suite%s of the last run" % (
+                len(failed), self.pluralize(len(failed)))
+            selected = lambda name: name in failed
+        self.checkpoint.start([])
+        return selected, True
+
+    def print_estimate(self, durations, thread_count):
+        """Print the estimated finish time, based on previous runs"""
+        if not any(durations):
+            return
+        seconds = makespan(durations, thread_count)
+        finish = datetime.datetime.now() + datetime.timedelta(seconds=seconds)
+        print "Estimated finish: %s (%d minute%s)" % (
+            finish.strftime("%H:%M:%S"), seconds / 60,
+            self.pluralize(seconds / 60))
+
+    def record(self, result):
+        """Records a suite's Result, journaling it in the checkpoint"""
+        with self.results_lock:
+            self.results.append(result)
+        self.checkpoint.record(result)
+
+    def capacity(self, nodes):
+        """Return the number of browsers that may run at once: the grid's
+        slots, or the thread count (or the autoscaling limit) when running
+        browsers locally"""
+        if nodes is None:
+            if self.store.get('autoscale'):
+                return settings.autoscale_max_threads
+            return settings.thread_count
+        return sum(node.slots for node in nodes)
+
+    def launch_count(self, limit):
+        """Return the number of threads to launch, given the most that may
+        run. With --autoscale, few threads are launched, and an Autoscaler
+        adds more up to the limit while the host stays healthy."""
+        if not self.store.get('autoscale'):
+            return limit
+        self.scaler = Autoscaler(
+            self.stats, min(settings.autoscale_min_threads, limit), limit)
+        print "Autoscaling between %d and %d test threads" % (
+            self.scaler.minimum, self.scaler.maximum)
+        return self.scaler.minimum
+
+    def run_threads(self, q, thread_count, nodes):
+        """Process a queue of test suites with a number of Suite threads,
+        launching browsers locally or on grid nodes"""
+        # warm up a browser session for each thread
+        pool = SessionPool(thread_count, self.stats, self.backend(nodes))
+        pool.start()
+        snapshots = None
+        if self.prefixes is not None:
+            snapshots = Snapshots(self.prefixes, self.stats)
+        artifacts = None
+        if self.store.get('artifacts'):
+            artifacts = ArtifactWriter(
+                settings.artifact_directory, self.writer, self.stats)
+            artifacts.start()
+        threads = []
         for i in range(thread_count):
-            t = Suite(q, self.store, self.log)
-            t.start()
-            threads.append(t)
+            threads.append(self.start_thread(q, pool, snapshots, artifacts))
 
-        # wait for the threads to finish
+        # wait for the threads to finish (joining with a timeout, so that
+        # CTL-C is received), adding threads as the autoscaler decides
         while len(threads):
             try:
-                threads[0].join()
-                threads.pop(0)
+                threads[0].join(1)
+                if not threads[0].is_alive():
+                    threads.pop(0)
+                if self.scaler is not None and not pool.stopping.is_set():
+                    for i in range(self.scaler.check()):
+                        pool.grow()
+                        threads.append(
+                            self.start_thread(q, pool, snapshots, artifacts))
             except KeyboardInterrupt:
-                pass
+                pool.stopping.set()
+        if not pool.stopping.is_set():
+            # every thread gave up (no browser could be launched): fail the
+            # suites they left, rather than finish as if they had run
+            self.fail_unrun(q.requeued if isinstance(q, TaskQueue) else q)
+        pool.close()
+        if artifacts is not None:
+            artifacts.close()
+        if self.scaler is not None:
+            self.thread_count = self.scaler.peak
 
-        # print log and stats
-        elapsed_time = time.time() - start_time
-        self.print_log(elapsed_time)
+    def fail_unrun(self, q):
+        """Fail the suites (and the rows of data chunks) left in a queue"""
+        log = LogBuffer(self.writer)
+        while True:
+            try:
+                name, suite, chunk = q.get_nowait()
+            except Queue.Empty:
+                break
+            rows = [None] if chunk is None else \
+                [number for number, offset, values in data.read_chunk(chunk)]
+            for row in rows:
+                self.stats.add("suites not run")
+                log.message(label(name, row),
+                            "X Suite Not Run: no browser could be launched")
+                log.suite(label(name, row), "failed", 0.0)
+                self.record(Result(name, False, 0.0, None, None, row))
+        log.flush()
+
+    def start_thread(self, q, pool, snapshots, artifacts):
+        """Start a Suite thread"""
+        t = Suite(q, self.store, self.writer, self.record, self.stats, pool,
+                  self.profiler, snapshots, self.metrics, self.scaler,
+                  self.timeouts, artifacts)
+        if self.scaler is not None:
+            self.scaler.enter()
+        t.start()
+        return t
+
+    def backend(self, nodes):
+        """Return the backend that launches browser sessions"""
+        if nodes is None:
+            return LocalBackend(self.store.get('headless'))
+        return GridBackend(nodes, self.stats, self.store.get('wire'))
 
-    def log(self, key, value):
-        """Logs a value to a given key (suite name)"""
-        if not key in self.log_data:
-            self.log_data[key] = []
-        value = "%s: %s" % (datetime.datetime.now(), value)
-        self.log_data[key].append(value)
+    def run_processes(self, tasks, process_count, durations):
+        """Shard test suites (and the data Chunks of data suites) across
+        worker processes, each running its own Suite threads and browsers.
+        Workers are forked, so they share the compiled suites and only suite
+        names and Chunks are sent to them. Workers stream log records to
+        this process' LogWriter, and return their results and statistics
+        when they finish. Returns the total number of threads."""
+        process_count = min(process_count, len(tasks))
+        per_process = int(math.ceil(float(len(tasks)) / process_count))
+        # each worker gets an equal share of the grid's slots
+        shares = []
+        for i in range(process_count):
+            nodes = None
+            if self.nodes is not None:
+                nodes = [node.share(i, process_count) for node in self.nodes]
+                nodes = [node for node in nodes if node.slots]
+            thread_count = min(self.capacity(nodes), per_process)
+            if thread_count:
+                shares.append((nodes, thread_count))
+        thread_count = sum(count for nodes, count in shares)
+        print "Launching %d process%s with %d test thread%s..." % (
+            len(shares), "" if len(shares) == 1 else "es",
+            thread_count, self.pluralize(thread_count))
+        self.print_estimate(durations, thread_count)
+        total_threads = thread_count
+
+        # tasks are fed as the workers take them, so that none are left in
+        # the queue to send after CTL-C; then one stop marker for each thread
+        task_queue = multiprocessing.Queue(2 * thread_count)
+        results = multiprocessing.Queue()
+        pending = collections.deque(tasks)
+        pending.extend([None] * thread_count)
+        workers = []
+        for nodes, thread_count in shares:
+            p = multiprocessing.Process(
+                target=self.run_worker,
+                args=(task_queue, results, thread_count, nodes))
+            p.start()
+            workers.append(p)
+
+        # collect results; on CTL-C, the workers shut down their own threads
+        remaining = len(workers)
+        interrupted = False
+        while remaining:
+            try:
+                self.feed(task_queue, pending)
+                counters, suite_results, profile, samples, waits = \
+                    results.get(True, 0.1 if pending else 1)
+                self.stats.merge(counters)
+                if profile is not None:
+                    self.profiler.merge(profile)
+                if samples is not None:
+                    self.metrics.merge(samples)
+                if waits is not None:
+                    self.timeouts.merge(waits)
+                self.results.extend(suite_results)
+                remaining -= 1
+            except Queue.Empty:
+                if not any(p.is_alive() for p in workers):
+                    print "%d worker process%s exited without results" % \
+                        (remaining, "" if remaining == 1 else "es")
+                    break
+            except KeyboardInterrupt:
+                # send only the stop markers, for threads waiting for a task
+                interrupted = True
+                pending.clear()
+                pending.extend([None] * total_threads)
+                task_queue.cancel_join_thread()
+        for p in workers:
+            p.join()
+        if not interrupted:
+            # tasks left when every worker's threads gave up
+            left = Queue.Queue()
+            while True:
+                try:
+                    task = pending.popleft() if pending else \
+                        task_queue.get(True, 0.1)
+                except Queue.Empty:
+                    break
+                if task is not None:
+                    left.put((task[0], self.suites[task[0]], task[1]))
+            self.fail_unrun(left)
+        return total_threads
+
+    def feed(self, task_queue, pending):
+        """Move pending tasks to a worker queue until it is full"""
+        try:
+            while pending:
+                task_queue.put_nowait(pending[0])
+                pending.popleft()
+        except Queue.Full:
+            pass
+
+    def run_worker(self, tasks, results, thread_count, nodes):
+        """Run Suite threads in a worker process"""
+        self.stats = Stats()
+        self.results = []
+        if self.profiler is not None:
+            self.profiler = Profiler()
+        if self.metrics is not None:
+            self.metrics = Metrics()
+        self.run_threads(TaskQueue(tasks, self.suites), thread_count, nodes)
+        results.put((self.stats.counters, self.results,
+                     self.profiler and self.profiler.data(),
+                     self.metrics and self.metrics.data(),
+                     self.timeouts and self.timeouts.data()))
 
     def init_log(self):
         """Initialize the log file"""
@@ -111,11 +728,12 @@ class Driver(object):
         f.close()
 
     def print_log(self, elapsed_time):
-        """Print the log to stdout and the log file"""
+        """Print the log, rendered from this run's log records, to stdout
+        and the log file"""
         f = open(settings.log_filename, "a")
         print
         f.write("\n")
-        for suite, messages in self.log_data.items():
+        for suite, messages in self.writer.render(self.store['debug']):
             print suite
             f.write(suite + "\n")
             for message in messages:
@@ -128,57 +746,302 @@ class Driver(object):
             minutes, self.pluralize(minutes),
             seconds, self.pluralize(seconds))
         print message
-        f.write("%s\n%s\n" % (message, "-" * 80))
+        f.write(message + "\n")
+        for message in self.summarize_stats(elapsed_time):
+            print message
+            f.write(message + "\n")
+        if self.profiler is not None:
+            for message in self.profiler.report(self.stats):
+                print message
+                f.write(message + "\n")
+            self.profiler.save(settings.profile_filename, self.stats)
+            print "profile saved to", settings.profile_filename
+        if self.scaler is not None:
+            self.scaler.save(settings.autoscale_filename)
+            print "autoscaling timeline saved to", settings.autoscale_filename
+        f.write("-" * 80 + "\n")
         f.close()
 
+    def summarize_stats(self, elapsed_time):
+        """Return a list of summary lines for the run statistics"""
+        waited = self.stats.get("wait seconds")
+        fixed = self.stats.get("fixed delay seconds")
+        summary = [
+            "waited %.1f seconds between actions; fixed delays: %.1f "
+            "seconds (%.1f seconds saved)" % (waited, fixed, fixed - waited)
+        ]
+        if self.store.get('stream'):
+            loaded = self.stats.get("suites loaded")
+            summary.append(
+                "loaded %d suite%s in %.1f seconds (first after %.1f "
+                "seconds); %d duplicate%s dropped, %d not loaded" % (
+                    loaded, self.pluralize(loaded),
+                    self.stats.get("load seconds"),
+                    self.stats.get("first suite seconds"),
+                    self.stats.get("duplicate suites"),
+                    self.pluralize(self.stats.get("duplicate suites")),
+                    self.stats.get("suite load errors")))
+        waits = self.stats.get("element waits")
+        if waits:
+            round_trips = self.stats.get("element wait round trips")
+            summary.append(
+                "%d element wait%s: %d webdriver round trip%s (%.1f per wait)"
+                % (waits, self.pluralize(waits), round_trips,
+                   self.pluralize(round_trips), float(round_trips) / waits))
+        searches = self.stats.get("frame searches")
+        hits = self.stats.get("frame cache hits")
+        if searches or hits:
+            summary.append(
+                "%d frame lookup%s: %d cached, %d searched (%d round trip%s), "
+                "%d stale path%s discarded" % (
+                    searches + hits, self.pluralize(searches + hits), hits,
+                    searches, self.stats.get("frame search round trips"),
+                    self.pluralize(
+                        self.stats.get("frame search round trips")),
+                    self.stats.get("frame cache invalidations"),
+                    self.pluralize(
+                        self.stats.get("frame cache invalidations"))))
+        fused = self.stats.get("fused actions")
+        if fused:
+            summary.append("%d action%s fused into %d script%s" % (
+                fused, self.pluralize(fused), self.stats.get("fused scripts"),
+                self.pluralize(self.stats.get("fused scripts"))))
+        launched = self.stats.get("sessions launched")
+        if launched:
+            hits = self.stats.get("session pool hits")
+            leases = hits + self.stats.get("session pool misses")
+            summary.append(
+                "%d browser session%s launched (%.1f seconds average); "
+                "pool hit rate %d%% of %d lease%s; %d recycled, %d crashed, "
+                "%d suite%s requeued" % (
+                    launched, self.pluralize(launched),
+                    self.stats.get("session launch seconds") / launched,
+                    100 * hits / max(leases, 1), leases,
+                    self.pluralize(leases),
+                    self.stats.get("sessions recycled"),
+                    self.stats.get("sessions crashed"),
+                    self.stats.get("suites requeued"),
+                    self.pluralize(self.stats.get("suites requeued"))))
+        failures = self.stats.get("session launch failures")
+        if failures:
+            summary.append("%d browser launch%s failed" % (
+                failures, "" if failures == 1 else "es"))
+        rows = [result for results in self.rows.values() for result in results]
+        if rows:
+            summary.append("%d data row%s run (%.1f per second)" % (
+                len(rows), self.pluralize(len(rows)),
+                len(rows) / max(elapsed_time, 0.001)))
+        for name, results in sorted(self.rows.items()):
+            summary.append(self.summarize_data(name, results))
+        if self.results or rows:
+            # the rows of a data suite are scheduled separately
+            durations = [result.seconds for result in self.results
+                         if result.name not in self.rows]
+            durations.extend(result.seconds for result in rows)
+            bound = lower_bound(durations, self.thread_count)
+            summary.append(
+                "makespan %.1f seconds; lower bound %.1f seconds with %d "
+                "thread%s (%.0f%% above)" % (
+                    elapsed_time, bound, self.thread_count,
+                    self.pluralize(self.thread_count),
+                    100 * (elapsed_time - bound) / max(bound, 0.001)))
+        for node in self.nodes or []:
+            summary.append(self.summarize_node(node))
+        for prefix in sorted(set((self.prefixes or {}).values())):
+            summary.append(self.summarize_snapshot(prefix))
+        not_run = self.stats.get("suites not run")
+        if not_run:
+            summary.append(
+                "%d suite%s not run: no browser could be launched" % (
+                    not_run, self.pluralize(not_run)))
+        timeouts = self.stats.get("readiness timeouts")
+        if timeouts:
+            fallbacks = self.stats.get("readiness fallbacks")
+            summary.append(
+                "page readiness timed out %d time%s; %d later visit%s to "
+                "those pages used the fixed delay" % (
+                    timeouts, self.pluralize(timeouts),
+                    fallbacks, self.pluralize(fallbacks)))
+        captured = self.stats.get("artifacts captured")
+        if captured or self.stats.get("artifacts skipped") or \
+                self.stats.get("artifacts dropped"):
+            summary.append(
+                "%d failure%s captured to %s (%d file%s written, %.1f MB; %d "
+                "deduplicated, %d evicted); %d not captured (%d repeated, %d "
+                "with the writer behind)" % (
+                    captured, self.pluralize(captured),
+                    settings.artifact_directory,
+                    self.stats.get("artifact files written"),
+                    self.pluralize(self.stats.get("artifact files written")),
+                    self.stats.get("artifact bytes written") / 1048576.0,
+                    self.stats.get("artifact files deduplicated"),
+                    self.stats.get("artifact files evicted"),
+                    self.stats.get("artifacts skipped") +
+                    self.stats.get("artifacts dropped"),
+                    self.stats.get("artifacts skipped"),
+                    self.stats.get("artifacts dropped")))
+        learned = self.stats.get("learned timeouts")
+        hard = self.stats.get("hard timeouts")
+        fast = self.stats.get("error states") + self.stats.get("sessions lost")
+        if learned or hard or fast:
+            summary.append(
+                "%d wait%s timed out (%d at a learned timeout, %d at the hard "
+                "timeout); %d failed fast (%d on error pages, %d on lost "
+                "sessions)" % (
+                    learned + hard, self.pluralize(learned + hard), learned,
+                    hard, fast, self.stats.get("error states"),
+                    self.stats.get("sessions lost")))
+        if self.metrics is not None:
+            summary.extend(self.summarize_metrics())
+        if self.scaler is not None:
+            summary.extend(self.scaler.report())
+        return summary
+
+    def summarize_metrics(self):
+        """Return summary lines for the page metrics: the navigations
+        measured, then each metric slower than its baseline"""
+        samples = self.metrics.data()
+        pages = set((suite, ui_map, path)
+                    for suite, ui_map, path, values in samples)
+        lines = ["%d navigation%s measured on %d page%s; %d regression%s "
+                 "(saved to %s)" % (
+                     len(samples), self.pluralize(len(samples)), len(pages),
+                     self.pluralize(len(pages)), len(self.regressions),
+                     self.pluralize(len(self.regressions)),
+                     settings.metrics_filename)]
+        for (suite, ui_map, path), name, current, baseline in \
+                self.regressions:
+            lines.append(
+                "X %s: %s %s: %s %.0f ms, baseline %.0f ms (%+.0f%%)" % (
+                    suite, ui_map, path, name, current, baseline,
+                    100 * (current - baseline) / max(baseline, 1)))
+        return lines
+
+    def summarize_data(self, name, rows):
+        """Return a summary line for the rows of a data suite"""
+        failed = [str(result.row) for result in rows if not result.passed]
+        total = sum(chunk.count for chunk in self.chunks[name])
+        line = "data suite %s: %d of %d row%s passed (%.1f seconds per " \
+            "row)" % (name, len(rows) - len(failed), total,
+                      self.pluralize(total),
+                      sum(result.seconds for result in rows) / len(rows))
+        if failed:
+            line += "; failed rows: %s" % ", ".join(
+                failed[:settings.data_failed_rows])
+            if len(failed) > settings.data_failed_rows:
+                line += " and %d more" % (
+                    len(failed) - settings.data_failed_rows)
+        return line
+
+    def summarize_snapshot(self, prefix):
+        """Return a summary line for a shared prefix's snapshots"""
+        stat = lambda name: self.stats.get(
+            "snapshot %s %s" % (snapshot_name(prefix), name))
+        return "snapshot %s: taken %d time%s, restored %d time%s (%.1f " \
+            "seconds saved), %d invalidated, %d expired" % (
+                snapshot_name(prefix), stat("taken"),
+                self.pluralize(stat("taken")), stat("restores"),
+                self.pluralize(stat("restores")), stat("seconds saved"),
+                stat("invalidated"), stat("expired"))
+
+    def summarize_node(self, node):
+        """Return a summary line for a grid node's throughput and latency"""
+        stat = lambda name: self.stats.get("node %s %s" % (node.url, name))
+        sessions = stat("sessions")
+        suites = stat("suites")
+        drained = ""
+        if stat("drained"):
+            drained = ", drained %d time%s (restored %d time%s)" % (
+                stat("drained"), self.pluralize(stat("drained")),
+                stat("restored"), self.pluralize(stat("restored")))
+        return "node %s: %d suite%s (%.1f seconds average), %d session%s " \
+            "(%.1f seconds to launch), %d failed launch%s%s" % (
+                node.url, suites, self.pluralize(suites),
+                stat("suite seconds") / max(suites, 1),
+                sessions, self.pluralize(sessions),
+                stat("launch seconds") / max(sessions, 1),
+                stat("launch failures"),
+                "" if stat("launch failures") == 1 else "es", drained)
+
     def pluralize(self, n):
         return "" if int(n) == 1 else "s"
 
-    def load_all_test_suites(self):
-        """Load all test suites in the suites directory"""
-        suite_files = os.listdir(settings.suites_directory)
-        self.load_test_suite_files(suite_files)
+    def init_compiler(self):
+        """Create the UI map compiler once the UI map directory is known"""
+        cache_filename = None
+        if self.store.get('cache'):
+            cache_filename = os.path.join(
+                settings.ui_map_directory, settings.ui_map_cache_filename)
+        self.compiler = Compiler(cache_filename, self.store.get('fuse'))
 
-    def load_test_suite_files(self, suite_files):
-        """Loads a list of test suite files"""
-        for fn in suite_files:
-            filename = os.path.join(settings.suites_directory, fn)
-            self.load_test_suite(filename)
+    def load_test_suites(self, filenames):
+        """Loads a series of test suite files"""
+        try:
+            for filename in filenames:
+                self.load_test_suite(filename)
+        except (IOError, SyntaxError), e:
+            print "Error reading XML file", self.store['xml']
+            print e
+            sys.exit(1)
 
     def load_test_suite(self, filename):
-        """Load a single test suite"""
+        """Load a single test suite, exiting if it cannot be loaded"""
+        try:
+            self.read_test_suite(filename)
+        except (IOError, OSError), e:
+            print "Error opening file", e.filename
+            print e
+            sys.exit(1)
+        except CompileError, e:
+            print "Error compiling UI map"
+            print e
+            sys.exit(1)
+        except data.DataError, e:
+            print "Error reading data file"
+            print e
+            sys.exit(1)
+
+    def read_test_suite(self, filename):
+        """Read a single test suite, with its compiled UI maps (shared by
+        every suite that references them). Raises IOError, OSError or
+        CompileError if it cannot be loaded, or DataError if its data file
+        is invalid."""
         if not os.path.isdir(filename):
+            lines = self.read_file(filename)
             suite = []
-            for line, number in self.load_file(filename):
-                suite.append(self.load_ui_map(line))
-            self.suites[filename] = suite
-
-    def load_test_suites_from_xml(self, suite):
-        """Load a series of test suites from an XML file"""
-        with open(suite, "r") as f:
-            xml = BeautifulSoup(f.read(), "xml")
-        keys = [key.text for key in xml.find_all('key')]
-        self.load_test_suite_files(keys)
-
-    def load_ui_map(self, ui_map):
-        """Load a UI Map"""
-        filename = os.path.join(settings.ui_map_directory, ui_map)
-        actions = []
-        for line, number in self.load_file(filename):
-            action = line.split(settings.delimeter)
-            actions.append((action, number))
-        return (ui_map, actions)
+            for line, number in lines:
+                cmd, delimiter, rest = line.partition(settings.delimeter)
+                if cmd == "data" and delimiter:
+                    # a data suite: run the suite for each row of the file
+                    self.data_files[filename] = os.path.join(
+                        os.path.dirname(filename), rest)
+                else:
+                    suite.append((line, self.compiler.load(line)))
+            if filename in self.data_files:
+                chunks = list(data.chunks(self.data_files[filename],
+                                          settings.data_chunk_size))
+                if not chunks:
+                    raise data.DataError(
+                        self.data_files[filename], 1, "no rows")
+                self.chunks[filename] = chunks
+            self.suites[filename] = tuple(suite)
+            self.suite_digests[filename] = hashlib.sha1(
+                "\n".join(line for line, number in lines)).hexdigest()
 
     def load_file(self, filename):
-        """Loads a file, ignoring blank lines and comments, returning an array
-        of stripped lines"""
+        """Loads a file, exiting if it cannot be read"""
         try:
-            with open(filename, "r") as f:
-                lines = f.readlines()
+            return self.read_file(filename)
         except IOError, e:
             print "Error opening file", filename
             print e
             sys.exit(1)
+
+    def read_file(self, filename):
+        """Reads a file, ignoring blank lines and comments, returning an array
+        of stripped lines"""
+        with open(filename, "r") as f:
+            lines = f.readlines()
         line_number = 0
         result = []
         for line in lines:
@@ -189,6 +1052,21 @@ class Driver(object):
             line_number += 1
         return result
 
+    def load_grid(self, filename):
+        """Load remote WebDriver nodes from a grid file"""
+        nodes = []
+        for line, number in self.load_file(filename):
+            try:
+                nodes.append(Node.parse(line))
+            except ValueError, e:
+                print "Error in grid file %s, line %d" % (filename, number + 1)
+                print e
+                sys.exit(1)
+        if not nodes:
+            print "No nodes in grid file", filename
+            sys.exit(1)
+        return nodes
+
     def locate_ui_map_directory(self, path):
         """Traverse up path until UI map directory is found"""
         while path:
@@ -0,0 +1,206 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import httplib
+import json
+import socket
+import threading
+import urllib2
+from time import sleep, time
+from selenium import webdriver as selenium_webdriver
+from selenium.webdriver.firefox.options import Options
+from selenium.common.exceptions import WebDriverException
+from pool import Session
+from wire import WireWebDriver, ConnectionPool
+import settings
+
+
+class Node(object):
+    """A remote WebDriver endpoint with a number of browser slots"""
+    def __init__(self, url, slots, capabilities):
+        self.url = url
+        self.slots = slots
+        self.capabilities = capabilities
+        self.active = 0  # sessions currently open
+        self.failures = 0  # consecutive failed session creations
+        self.retry_time = 0  # no session is created before this time
+        self.drained = False
+        self.probe_time = 0  # when a drained node's health is next probed
+
+    def share(self, index, count):
+        """Return a copy of the node with one worker process' share of its
+        slots"""
+        slots = self.slots / count + (1 if index < self.slots % count else 0)
+        return Node(self.url, slots, self.capabilities)
+
+    def healthy(self):
+        """Probe the node's status endpoint, returning whether it answers
+        and does not report that it is unready"""
+        try:
+            response = urllib2.urlopen(self.url.rstrip("/") + "/status",
+                                       timeout=settings.node_probe_timeout)
+            status = json.loads(response.read())
+        except (urllib2.URLError, httplib.HTTPException, socket.error,
+                ValueError):
+            return False
+        value = status.get("value") if isinstance(status, dict) else None
+        return not isinstance(value, dict) or value.get("ready") is not False
+
+    @classmethod
+    def parse(cls, line):
+        """Parse a grid file line: url|slots|key=value,key=value"""
+        fields = line.split(settings.delimeter)
+        if len(fields) < 2:
+            raise ValueError("expected url|slots[|capabilities]: %s" % line)
+        capabilities = dict(settings.grid_capabilities)
+        if len(fields) > 2 and fields[2]:
+            for capability in fields[2].split(","):
+                key, sep, value = capability.partition("=")
+                if not sep:
+                    raise ValueError("invalid capability: %s" % capability)
+                capabilities[key.strip()] = value.strip()
+        return cls(fields[0], int(fields[1]), capabilities)
+
+
+class LocalBackend(object):
+    """Launches browsers on this host, optionally headless"""
+    def __init__(self, headless=False):
+        self.headless = headless
+
+    def launch(self):
+        options = Options()
+        if self.headless:
+            options.add_argument("-headless")
+        return Session(selenium_webdriver.Firefox(options=options))
+
+    def retire(self, session):
+        pass
+
+    def finished(self, session, seconds):
+        pass
+
+
+class GridBackend(object):
+    """Launches browsers on remote WebDriver nodes. Each new session goes to
+    the healthy node with the most free slots. A node whose session creation
+    fails is not tried again for a delay, doubling with each consecutive
+    failure, and one that fails repeatedly is drained: it receives no new
+    sessions until a probe of its status, made by a launch at most once
+    per probe interval, finds it healthy again. Sessions use
+    the Selenium client, or the wire client (see wire.py), which shares
+    keep-alive connections to each node."""
+    def __init__(self, nodes, stats, wire=False):
+        self.nodes = nodes
+        self.stats = stats
+        self.wire = wire
+        self.pools = {}  # node URL: ConnectionPool, for the wire client
+        self.lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return sum(node.slots for node in self.nodes)
+
+    def launch(self):
+        """Create a session on the best available node, waiting for a node
+        whose last session creation failed if no other has a free slot"""
+        self.probe()
+        while True:
+            now = time()
+            with self.lock:
+                nodes = [node for node in self.nodes
+                         if not node.drained and node.active < node.slots]
+                if not nodes:
+                    raise WebDriverException("no grid node has a free slot")
+                ready = [node for node in nodes if node.retry_time <= now]
+                if ready:
+                    node = max(ready,
+                               key=lambda node: node.slots - node.active)
+                    node.active += 1
+                else:
+                    delay = min(node.retry_time for node in nodes) - now
+            if not ready:
+                sleep(delay)
+                continue
+            start_time = time()
+            try:
+                if self.wire:
+                    with self.lock:
+                        pool = self.pools.setdefault(
+                            node.url, ConnectionPool(node.url))
+                    webdriver = WireWebDriver(
+                        node.url, dict(node.capabilities), pool)
+                else:
+                    webdriver = selenium_webdriver.Remote(
+                        command_executor=node.url,
+                        desired_capabilities=dict(node.capabilities))
+            except Exception, e:
+                self.failed(node, e)
+                continue
+            node.failures = 0
+            self.stats.add("node %s sessions" % node.url)
+            self.stats.add("node %s launch seconds" % node.url,
+                           time() - start_time)
+            session = Session(webdriver)
+            session.node = node
+            return session
+
+    def failed(self, node, error):
+        """Record a failed session creation, draining the node if needed"""
+        self.stats.add("node %s launch failures" % node.url)
+        with self.lock:
+            node.active -= 1
+            node.failures += 1
+            node.retry_time = time() + \
+                settings.node_retry_delay * 2 ** (node.failures - 1)
+            drain = not node.drained and \
+                node.failures >= settings.node_max_failures
+            if drain:
+                node.drained = True
+                node.probe_time = time() + settings.node_probe_interval
+        if drain:
+            self.stats.add("node %s drained" % node.url)
+            print "Draining grid node %s: %s" % (node.url, error)
+
+    def probe(self):
+        """Probe the drained nodes whose probe interval has passed, returning
+        the healthy ones to service"""
+        now = time()
+        with self.lock:
+            nodes = [node for node in self.nodes
+                     if node.drained and node.probe_time <= now]
+            for node in nodes:
+                node.probe_time = now + settings.node_probe_interval
+        for node in nodes:
+            if not node.healthy():
+                continue
+            with self.lock:
+                node.drained = False
+                node.failures = 0
+                node.retry_time = 0
+            self.stats.add("node %s restored" % node.url)
+            print "Restoring grid node %s" % node.url
+
+    def retire(self, session):
+        """Free the slot of a session that has quit"""
+        with self.lock:
+            session.node.active -= 1
+
+    def finished(self, session, seconds):
+        """Record a suite run on a node"""
+        self.stats.add("node %s suites" % session.node.url)
+        self.stats.add("node %s suite seconds" % session.node.url, seconds)
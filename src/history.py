@@ -0,0 +1,145 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import heapq
+import sqlite3
+from time import time
+
+
+class History(object):
+    """History keeps each suite's typical duration, last outcome and the
+    digests of its inputs in a SQLite database. It uses them to order the
+    next run longest suite first, and to select the suites an incremental
+    run needs."""
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS suites ("
+            "name TEXT PRIMARY KEY, "
+            "duration REAL, "  # seconds, smoothed across runs
+            "passed INTEGER, "  # outcome of the last run
+            "runs INTEGER, "
+            "updated REAL, "
+            "inputs TEXT)")  # JSON digests of the last run's inputs
+        columns = [row[1] for row in self.connection.execute(
+            "PRAGMA table_info(suites)")]
+        if "inputs" not in columns:
+            # created by an earlier version
+            self.connection.execute(
+                "ALTER TABLE suites ADD COLUMN inputs TEXT")
+        self.suites = {}
+        for name, duration, passed, updated, inputs in self.connection.execute(
+                "SELECT name, duration, passed, updated, inputs FROM suites"):
+            self.suites[name] = (duration, passed, updated,
+                                 json.loads(inputs) if inputs else None)
+
+    def estimate(self, name):
+        """Estimate a suite's duration; suites without history are assumed
+        to take the average duration"""
+        if name in self.suites:
+            return self.suites[name][0]
+        if not self.suites:
+            return 0.0
+        return sum(suite[0] for suite in self.suites.values()) / \
+            len(self.suites)
+
+    def failed(self, name):
+        """Check whether a suite failed on its last run"""
+        return name in self.suites and not self.suites[name][1]
+
+    def order(self, names, failed_first=False):
+        """Order suites longest first, optionally putting suites that failed
+        last time ahead of the rest"""
+        return sorted(names, key=lambda name: (
+            failed_first and not self.failed(name), -self.estimate(name)))
+
+    def select(self, names, inputs, budget=0):
+        """Select the suites an incremental run needs: new suites, suites
+        whose inputs changed and suites that failed last time. Unchanged
+        suites are sampled, least recently run first, while their estimated
+        durations fit in a budget of seconds. Returns (name, selected,
+        reason) for each suite, in order."""
+        reasons = {}
+        unchanged = []
+        for name in names:
+            if name not in self.suites:
+                reasons[name] = (True, "new suite")
+                continue
+            last_inputs = self.suites[name][3]
+            if last_inputs is None:
+                reasons[name] = (True, "no recorded inputs")
+                continue
+            changed = sorted(
+                key for key in set(last_inputs) | set(inputs[name])
+                if last_inputs.get(key) != inputs[name].get(key))
+            if changed:
+                reasons[name] = (True, "changed: %s" % ", ".join(changed))
+            elif not self.suites[name][1]:
+                reasons[name] = (True, "failed last time")
+            else:
+                unchanged.append(name)
+        unchanged.sort(key=lambda name: self.suites[name][2])
+        spent = 0.0
+        for name in unchanged:
+            if spent + self.estimate(name) <= budget:
+                spent += self.estimate(name)
+                reasons[name] = (True, "unchanged, sampled")
+            else:
+                reasons[name] = (False, "unchanged, passed last time")
+        return [(name,) + reasons[name] for name in names]
+
+    def record(self, results, inputs):
+        """Save the results of a run, with the digests of each suite's
+        inputs"""
+        now = time()
+        for result in results:
+            if result.name in self.suites:
+                # smooth out run-to-run noise
+                duration = (self.suites[result.name][0] + result.seconds) / 2
+            else:
+                duration = result.seconds
+            self.suites[result.name] = (
+                duration, result.passed, now, inputs[result.name])
+            self.connection.execute(
+                "INSERT OR IGNORE INTO suites (name, runs) VALUES (?, 0)",
+                (result.name,))
+            self.connection.execute(
+                "UPDATE suites SET duration = ?, passed = ?, "
+                "runs = runs + 1, updated = ?, inputs = ? WHERE name = ?",
+                (duration, result.passed, now,
+                 json.dumps(inputs[result.name], sort_keys=True),
+                 result.name))
+        self.connection.commit()
+
+
+def makespan(durations, workers):
+    """Return the makespan of assigning durations, in order, to whichever of
+    a number of workers is free first"""
+    finish_times = [0.0] * max(workers, 1)
+    for duration in durations:
+        heapq.heapreplace(finish_times, finish_times[0] + duration)
+    return max(finish_times)
+
+
+def lower_bound(durations, workers):
+    """Return the shortest possible makespan: no schedule can beat the
+    longest suite or a perfect split of the total work"""
+    if not durations:
+        return 0.0
+    return max(max(durations), sum(durations) / max(workers, 1))
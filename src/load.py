@@ -0,0 +1,365 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import json
+import threading
+from time import time, sleep
+from itertools import islice
+from page import Page
+from store import Store
+from pool import SessionPool
+from suite import connection_errors
+from profiler import percentile
+import data
+import settings
+
+
+class Recorder(object):
+    """The Recorder collects the response times of a load test's pages (UI
+    maps) and actions, overall and in windows of the report interval for
+    the time series. It stands in for a LogBuffer (see UserLog)."""
+    def __init__(self, interval):
+        self.lock = threading.Lock()
+        self.interval = interval
+        self.start = time()
+        self.windows = {}  # index: {"pages": [seconds], "errors", "users"}
+        self.pages = {}  # ui_map: [seconds]
+        self.errors = {}  # ui_map: pages that failed
+        self.actions = {}  # "ui_map, line n: source": [seconds]
+        self.iterations = 0
+        self.failures = 0  # iterations with a failed page
+        self.users = 0  # active virtual users
+
+    def window(self):
+        """Return the current window of the time series"""
+        index = int((time() - self.start) / self.interval)
+        window = self.windows.setdefault(
+            index, {"pages": [], "errors": 0, "users": 0})
+        window["users"] = max(window["users"], self.users)
+        return window
+
+    def enter(self):
+        with self.lock:
+            self.users += 1
+            self.window()
+
+    def leave(self):
+        with self.lock:
+            self.users -= 1
+
+    def page(self, ui_map, seconds, failed=False):
+        """Record a page's response time, or its failure"""
+        with self.lock:
+            window = self.window()
+            if failed:
+                window["errors"] += 1
+                self.errors[ui_map] = self.errors.get(ui_map, 0) + 1
+            else:
+                window["pages"].append(seconds)
+                self.pages.setdefault(ui_map, []).append(seconds)
+
+    def action(self, ui_map, action, seconds):
+        """Record an action's response time"""
+        key = "%s, line %d: %s" % (ui_map, action.line_number, action.source)
+        with self.lock:
+            self.actions.setdefault(key, []).append(seconds)
+
+    def iteration(self, passed):
+        """Record a complete run of a suite"""
+        with self.lock:
+            self.iterations += 1
+            if not passed:
+                self.failures += 1
+
+    def series(self, index):
+        """Return the time series entry for a window"""
+        with self.lock:
+            window = self.windows.get(
+                index, {"pages": [], "errors": 0, "users": self.users})
+            samples = sorted(window["pages"])
+            return {
+                "seconds": (index + 1) * self.interval,
+                "users": window["users"],
+                "pages per second": len(samples) / float(self.interval),
+                "errors": window["errors"],
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "p99": percentile(samples, 99)
+            }
+
+
+class UserLog(object):
+    """Stands in for a LogBuffer in a virtual user's Pages: instead of
+    logging actions, it records their response times, and adds up the
+    response time of the current page (excluding the delays between
+    actions)"""
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.seconds = 0.0  # response time of the current page
+
+    def message(self, suite, message):
+        pass
+
+    def action(self, suite, ui_map, action, outcome, duration, error=None):
+        self.seconds += duration
+        if outcome == "passed":
+            self.recorder.action(ui_map, action, duration)
+
+
+class Pacer(object):
+    """Paces the pages of all virtual users to a target rate. Each page is
+    given the next free slot; users that fall behind do not catch up in a
+    burst."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next = None  # time of the next free slot
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Wait for the next slot"""
+        with self.lock:
+            now = time()
+            slot = max(self.next or now, now)
+            self.next = slot + self.interval
+        if slot > now:
+            sleep(slot - now)
+
+
+class VirtualUser(threading.Thread):
+    """A VirtualUser runs the load test's suites in turn, from its start
+    time until the end of the test, leasing a browser session for each
+    suite. Data suites take the user's next row of their data file."""
+    def __init__(self, number, test, start_time):
+        super(VirtualUser, self).__init__()
+        self.daemon = True
+        self.number = number
+        self.test = test
+        self.start_time = start_time
+        self.log = UserLog(test.recorder)
+        self.rows = {}  # data suite: iterator over its rows
+
+    def run(self):
+        test = self.test
+        pool = test.pool
+        pool.stopping.wait(max(self.start_time - time(), 0))
+        test.recorder.enter()
+        # users start on different suites
+        iteration = self.number
+        try:
+            while time() < test.end_time and not pool.stopping.is_set():
+                try:
+                    session = pool.lease()
+                except Exception, e:
+                    print "Cannot launch browser:", e
+                    break
+                if session is None:
+                    break
+                name, suite = test.suites[iteration % len(test.suites)]
+                iteration += 1
+                try:
+                    connected = self.run_suite(session.webdriver, name, suite)
+                except BaseException:
+                    # never leave the browser running
+                    pool.retire(session)
+                    raise
+                if connected:
+                    pool.release(session)
+                elif pool.stopping.is_set():
+                    pool.retire(session)
+                else:
+                    pool.discard(session)
+        except Exception, e:
+            print "Exception:", e
+        finally:
+            test.recorder.leave()
+
+    def run_suite(self, webdriver, name, suite):
+        """Run a suite once, recording the response time of each page.
+        Returns False if the browser connection was lost."""
+        test = self.test
+        # each iteration has its own variables, over the test's store
+        store = Store(test.store, self.next_row(name)
+                      if name in test.data_files else None)
+        for ui_map, actions in suite:
+            if time() >= test.end_time or test.pool.stopping.is_set():
+                # an incomplete iteration is not counted
+                return True
+            if test.pacer is not None:
+                test.pacer.wait()
+            page = Page(name, ui_map, actions, webdriver, store, self.log,
+                        test.stats)
+            self.log.seconds = 0.0
+            try:
+                page.test()
+            except connection_errors:
+                test.recorder.page(ui_map, None, True)
+                return False
+            except Exception:
+                # a WebDriverException, or an error in exec code
+                test.recorder.page(ui_map, None, True)
+                test.recorder.iteration(False)
+                return True
+            test.recorder.page(ui_map, self.log.seconds)
+        test.recorder.iteration(True)
+        return True
+
+    def next_row(self, name):
+        """Return this user's next row of a data suite's data file. Each
+        user starts at a different row, and starts over after the last."""
+        filename, count = self.test.data_files[name]
+        if name not in self.rows:
+            self.rows[name] = islice(data.rows(filename),
+                                     self.number % count, None)
+        for offset, values in self.rows[name]:
+            return values
+        self.rows[name] = data.rows(filename)
+        return self.rows[name].next()[1]
+
+
+class LoadTest(object):
+    """The LoadTest replays suites as concurrent virtual users: users start
+    one by one over the ramp-up period, and each runs the suites in a loop
+    until the test's duration has passed, optionally paced to a target
+    rate of pages per second. Each user has its own browser session. The
+    time series of throughput and response time is printed as the test
+    runs."""
+    def __init__(self, suites, store, stats, backend, users, duration,
+                 ramp_up=0, rate=None, data_files=None):
+        self.suites = suites  # [(name, compiled suite)]
+        self.store = store
+        self.stats = stats
+        self.backend = backend
+        self.users = users
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.rate = rate
+        self.pacer = Pacer(rate) if rate else None
+        self.data_files = data_files or {}  # suite: (data file, rows)
+        self.recorder = None
+        self.pool = None
+        self.end_time = None
+        self.elapsed = 0.0
+
+    def run(self):
+        """Run the load test, printing the time series"""
+        interval = settings.load_report_interval
+        self.pool = SessionPool(self.users, self.stats, self.backend)
+        self.pool.start()
+        self.recorder = Recorder(interval)
+        start_time = self.recorder.start
+        self.end_time = start_time + self.duration
+        users = []
+        for i in range(self.users):
+            user = VirtualUser(
+                i, self, start_time + self.ramp_up * i / float(self.users))
+            user.start()
+            users.append(user)
+        print "Load test: %d user%s for %d seconds..." % (
+            self.users, "" if self.users == 1 else "s", self.duration)
+
+        index = 0  # the next window to report
+        while any(user.is_alive() for user in users):
+            try:
+                sleep(min(max(
+                    start_time + (index + 1) * interval - time(), 0.01), 0.1))
+                if time() >= start_time + (index + 1) * interval:
+                    print self.live(self.recorder.series(index))
+                    index += 1
+            except KeyboardInterrupt:
+                self.pool.stopping.set()
+        self.elapsed = time() - start_time
+        self.pool.close()
+
+    def live(self, entry):
+        """Format a time series entry"""
+        return "%5ds: %d user%s, %.1f pages/s, p50/p95/p99 %.3f/%.3f/%.3f " \
+            "seconds, %d error%s" % (
+                entry["seconds"], entry["users"],
+                "" if entry["users"] == 1 else "s", entry["pages per second"],
+                entry["p50"], entry["p95"], entry["p99"], entry["errors"],
+                "" if entry["errors"] == 1 else "s")
+
+    def report(self):
+        """Return the summary lines: throughput, response times, and the
+        slowest pages and actions"""
+        recorder = self.recorder
+        samples = sorted(sum(recorder.pages.values(), []))
+        errors = sum(recorder.errors.values())
+        elapsed = max(self.elapsed, 0.001)
+        lines = [
+            "load test: %d user%s (%d seconds ramp-up) for %.0f seconds%s" % (
+                self.users, "" if self.users == 1 else "s", self.ramp_up,
+                self.elapsed, "; target %.1f pages/s" % self.rate
+                if self.rate else ""),
+            "%d iteration%s (%d failed); %d page%s (%d error%s); %.1f "
+            "pages/s" % (
+                recorder.iterations, "" if recorder.iterations == 1 else "s",
+                recorder.failures, len(samples),
+                "" if len(samples) == 1 else "s", errors,
+                "" if errors == 1 else "s", len(samples) / elapsed),
+            "page response time p50/p95/p99: %.3f/%.3f/%.3f seconds" % (
+                percentile(samples, 50), percentile(samples, 95),
+                percentile(samples, 99))
+        ]
+        for title, rows in (("pages", self.ranked(recorder.pages,
+                                                 recorder.errors)),
+                            ("actions", self.ranked(recorder.actions))):
+            if not rows:
+                continue
+            lines.append("slowest %s (count, errors, p50/p95/p99):" % title)
+            for row in rows[:settings.profile_top]:
+                lines.append("  %6d %6d  %.3f/%.3f/%.3f  %s" % (
+                    row["count"], row["errors"], row["p50"], row["p95"],
+                    row["p99"], row["name"]))
+        return lines
+
+    def ranked(self, samples, errors={}):
+        """Return the statistics of each page or action, slowest (by p95)
+        first"""
+        rows = []
+        for name in set(samples) | set(errors):
+            values = sorted(samples.get(name, []))
+            rows.append({
+                "name": name,
+                "count": len(values),
+                "errors": errors.get(name, 0),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99)
+            })
+        rows.sort(key=lambda row: -row["p95"])
+        return rows
+
+    def save(self, filename):
+        """Write the time series and the statistics of every page and
+        action"""
+        windows = int(self.elapsed / self.recorder.interval) + 1
+        output = {
+            "users": self.users,
+            "duration": self.duration,
+            "ramp up": self.ramp_up,
+            "rate": self.rate,
+            "iterations": self.recorder.iterations,
+            "failed iterations": self.recorder.failures,
+            "series": [self.recorder.series(i) for i in range(windows)],
+            "pages": self.ranked(self.recorder.pages, self.recorder.errors),
+            "actions": self.ranked(self.recorder.actions)
+        }
+        with open(filename, "w") as f:
+            json.dump(output, f, indent=1)
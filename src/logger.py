@@ -0,0 +1,187 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import Queue
+import datetime
+import threading
+from time import time
+import settings
+
+
+class LogWriter(threading.Thread):
+    """The LogWriter appends log records to a JSON Lines file as they
+    happen. Records arrive in blocks from each thread's LogBuffer through a
+    bounded queue, so a slow disk holds up the threads instead of filling
+    memory. In worker processes, the queue is a multiprocessing queue and
+    the writer runs in the parent process."""
+    def __init__(self, filename, q=None):
+        super(LogWriter, self).__init__()
+        self.daemon = True
+        self.filename = filename
+        self.q = q or Queue.Queue(settings.log_queue_size)
+        self.f = open(filename, "a")
+        self.f.seek(0, 2)
+        if self.f.tell():
+            with open(filename, "r") as f:
+                f.seek(-1, 2)
+                if f.read(1) != "\n":
+                    # a record torn by a crash: start this run on a new line
+                    self.f.write("\n")
+                    self.f.flush()
+        # where this run's records start
+        self.start_offset = self.f.tell()
+
+    def run(self):
+        while True:
+            block = self.q.get()
+            if block is None:
+                break
+            self.f.write(block)
+            self.f.flush()
+        self.f.close()
+
+    def close(self):
+        """Write any queued blocks and close the file"""
+        self.q.put(None)
+        self.join()
+
+    def render(self, debug=False):
+        """Yield (suite, lines) for the human-readable log, grouping this
+        run's records by suite in the order the suites started. Only the
+        file offsets of each suite's blocks are kept in memory."""
+        order = []
+        blocks = {}  # suite: [(start, end)]
+        with open(self.filename, "r") as f:
+            f.seek(self.start_offset)
+            offset = self.start_offset
+            for line in iter(f.readline, ""):
+                end = offset + len(line)
+                try:
+                    suite = json.loads(line)["suite"]
+                except ValueError:
+                    # torn by a crash mid-write
+                    offset = end
+                    continue
+                if suite not in blocks:
+                    order.append(suite)
+                    blocks[suite] = []
+                if blocks[suite] and blocks[suite][-1][1] == offset:
+                    # continue the suite's current block
+                    blocks[suite][-1] = (blocks[suite][-1][0], end)
+                else:
+                    blocks[suite].append((offset, end))
+                offset = end
+            for suite in order:
+                lines = []
+                for start, end in blocks[suite]:
+                    f.seek(start)
+                    for line in f.read(end - start).splitlines():
+                        line = self.render_record(json.loads(line), debug)
+                        if line is not None:
+                            lines.append(line)
+                yield suite, lines
+
+    def render_record(self, record, debug):
+        """Render a record as a log line, or None if it is not shown"""
+        if record["type"] == "message":
+            return "%s: %s" % (record["time"], record["message"])
+        if record["type"] == "artifact":
+            return "%s: artifacts of %s line %s (%s): %s" % (
+                record["time"], record["ui_map"], record["line"],
+                record["url"], ", ".join(
+                    "%s %s" % (kind, path)
+                    for kind, path in sorted(record["files"].items()))
+                or "none")
+        if record["type"] == "action" and debug:
+            line = "%s: line %d: %s" % (
+                record["time"], record["line"], record["action"])
+            if record["outcome"] != "passed":
+                line += " (%s: %s)" % (record["outcome"], record.get("error"))
+            return line
+        return None
+
+
+class LogBuffer(object):
+    """A LogBuffer collects one thread's log records, handing them to the
+    LogWriter in blocks: at the end of each suite, or when the buffer is
+    full or old"""
+    def __init__(self, writer):
+        self.q = writer.q
+        self.buffer = []
+        self.buffered = None  # time of the oldest buffered record
+
+    def message(self, suite, message):
+        """Logs a message for a suite"""
+        self.add({
+            "type": "message",
+            "suite": suite,
+            "message": "%s" % (message,)
+        })
+
+    def action(self, suite, ui_map, action, outcome, duration, error=None):
+        """Logs the outcome of an action"""
+        record = {
+            "type": "action",
+            "suite": suite,
+            "ui_map": ui_map,
+            "line": action.line_number,
+            "action": action.source,
+            "outcome": outcome,
+            "duration": round(duration, 4)
+        }
+        if error is not None:
+            record["error"] = "%s" % (error,)
+        self.add(record)
+
+    def artifact(self, suite, ui_map, line, url, files):
+        """Logs the files captured from a failed suite's browser"""
+        self.add({
+            "type": "artifact",
+            "suite": suite,
+            "ui_map": ui_map,
+            "line": line,
+            "url": url,
+            "files": files
+        })
+
+    def suite(self, suite, outcome, duration):
+        """Logs the outcome of a suite and flushes the buffer"""
+        self.add({
+            "type": "suite",
+            "suite": suite,
+            "outcome": outcome,
+            "duration": round(duration, 4)
+        })
+        self.flush()
+
+    def add(self, record):
+        record["time"] = str(datetime.datetime.now())
+        self.buffer.append(json.dumps(record) + "\n")
+        if self.buffered is None:
+            self.buffered = time()
+        if len(self.buffer) >= settings.log_buffer_size or \
+                time() - self.buffered >= settings.log_flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Hand buffered records to the writer"""
+        if self.buffer:
+            self.q.put("".join(self.buffer))
+            self.buffer = []
+            self.buffered = None
@@ -0,0 +1,160 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import sqlite3
+import threading
+from time import time
+from selenium.common.exceptions import WebDriverException
+import scripts
+import settings
+
+# the metrics of a navigation, as reported by scripts.page_metrics
+metric_names = ["ttfb", "dom_content_loaded", "load", "first_paint",
+                "first_contentful_paint", "resources", "resource_bytes",
+                "slowest_resource"]
+# the metrics compared with their baselines (milliseconds)
+timing_names = ["ttfb", "dom_content_loaded", "load",
+                "first_contentful_paint"]
+
+
+def median(values):
+    """Return the median of a list of values, or None if it is empty"""
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) / 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+class Metrics(object):
+    """Metrics collects the browser's performance metrics for each document
+    a suite navigates to, with a single script call after each navigating
+    action. Each document is measured once, identified by its navigation's
+    start time. Samples are kept in memory until the run is recorded."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []  # (suite, ui_map, path, [value of each metric])
+        self.documents = {}  # webdriver: start of the last measured document
+
+    def collect(self, webdriver, suite, ui_map):
+        """Measure the current document, if it has not been measured"""
+        try:
+            values = webdriver.execute_script(scripts.page_metrics)
+        except WebDriverException:
+            # metrics are best-effort
+            return
+        if not values or self.documents.get(webdriver) == values["origin"]:
+            return
+        self.documents[webdriver] = values["origin"]
+        with self.lock:
+            self.samples.append((suite, ui_map, values["path"],
+                                 [values.get(name) for name in metric_names]))
+
+    def data(self):
+        """Return the collected samples, e.g. to send from a worker
+        process"""
+        with self.lock:
+            return list(self.samples)
+
+    def merge(self, samples):
+        """Merge samples collected by another Metrics"""
+        with self.lock:
+            self.samples.extend(samples)
+
+
+class MetricsStore(object):
+    """The MetricsStore keeps the performance metrics of every run in a
+    SQLite time series, one row per navigation, keyed by suite, UI map and
+    URL path. Each run's median is compared with a rolling baseline: the
+    median of the same page's previous runs."""
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS navigations ("
+            "run REAL, suite TEXT, ui_map TEXT, path TEXT, %s)" %
+            ", ".join("%s REAL" % name for name in metric_names))
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS navigations_page "
+            "ON navigations (suite, ui_map, path, run)")
+
+    def record(self, samples):
+        """Save a run's samples, returning the run's timestamp"""
+        run = time()
+        self.connection.executemany(
+            "INSERT INTO navigations VALUES (?, ?, ?, ?, %s)" %
+            ", ".join("?" for name in metric_names),
+            [(run, suite, ui_map, path) + tuple(values)
+             for suite, ui_map, path, values in samples])
+        self.connection.commit()
+        return run
+
+    def baseline(self, page, run):
+        """Return the baseline of each timing metric of a page (suite, UI
+        map, path): the median of its previous runs' medians, over the last
+        settings.metrics_baseline_runs runs. Returns None if the page has
+        fewer than settings.metrics_min_runs previous runs."""
+        rows = self.connection.execute(
+            "SELECT run, %s FROM navigations WHERE suite = ? AND ui_map = ? "
+            "AND path = ? AND run < ? AND run IN (SELECT DISTINCT run FROM "
+            "navigations WHERE suite = ? AND ui_map = ? AND path = ? AND "
+            "run < ? ORDER BY run DESC LIMIT ?)" % ", ".join(timing_names),
+            page + (run,) + page + (run, settings.metrics_baseline_runs))
+        runs = {}
+        for row in rows:
+            runs.setdefault(row[0], []).append(row[1:])
+        if len(runs) < settings.metrics_min_runs:
+            return None
+        baseline = {}
+        for i, name in enumerate(timing_names):
+            medians = [median([values[i] for values in run_values
+                               if values[i] is not None])
+                       for run_values in runs.values()]
+            baseline[name] = median([m for m in medians if m is not None])
+        return baseline
+
+    def regressions(self, samples, run):
+        """Compare a run's samples with their baselines, returning (page,
+        metric, median, baseline) for each timing metric that is slower
+        than its baseline by more than settings.metrics_threshold (and by
+        at least settings.metrics_min_slowdown milliseconds)"""
+        pages = {}
+        for suite, ui_map, path, values in samples:
+            pages.setdefault((suite, ui_map, path), []).append(values)
+        regressions = []
+        for page, page_values in sorted(pages.items()):
+            baseline = self.baseline(page, run)
+            if baseline is None:
+                continue
+            for name in timing_names:
+                i = metric_names.index(name)
+                current = median([values[i] for values in page_values
+                                  if values[i] is not None])
+                if current is None or baseline[name] is None:
+                    continue
+                if current > baseline[name] * (
+                        1 + settings.metrics_threshold) and \
+                        current - baseline[name] >= \
+                        settings.metrics_min_slowdown:
+                    regressions.append((page, name, current, baseline[name]))
+        return regressions
+
+    def close(self):
+        self.connection.close()
@@ -16,107 +16,169 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import re
 from random import randint
 from time import time, sleep
-from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select  # , WebDriverWait
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import (
     NoSuchElementException,
+    StaleElementReferenceException,
     TimeoutException,
     WebDriverException
 )
+import scripts
 import settings
 
+# frame paths resolved by find_frame, shared by the suites of a process:
+# (URL pattern, By method, target): [window.frames index]
+frame_paths = {}
+# URL patterns of pages whose readiness has timed out (e.g. pages that never
+# stop changing), which get the fixed delay instead, shared like frame_paths
+unready_pages = set()
+
+# the weaker conditions met by an element that meets each wait condition
+implied_conditions = {
+    "present": ("present",),
+    "visible": ("present", "visible"),
+    "clickable": ("present", "visible", "clickable"),
+    "text": ("present", "visible"),
+    "option_text": ("present",),
+    "option_value": ("present",)
+}
+# conditions on an element's text or options, never cached
+value_conditions = ("text", "option_text", "option_value")
+
+# webdriver error messages meaning that the browser session is gone
+session_errors = ("invalid session id", "no such session", "session deleted",
+                  "not reachable", "browsing context has been discarded",
+                  "without establishing a connection")
+
+
+class ErrorState(WebDriverException):
+    """Raised when a wait finds the page in an error state"""
+
+
+class SessionLost(WebDriverException):
+    """Raised when a wait finds that the browser session is gone"""
+
+
+def url_pattern(url):
+    """Return the pattern of a page's URL: numbers are ignored, and so are
+    the query and fragment"""
+    return re.sub(r"\d+", "*", url.split("#")[0].split("?")[0])
+
 
 class Page(object):
     """The Page class imports a UI Map associated with a particular page and
     runs tests against the page."""
     def __init__(
             self,
-            name,  # name of the page (used for logging)
+            name,  # name of the suite (used for logging)
+            ui_map,  # name of the UI map
             actions,  # actions list
             webdriver,  # the webdriver
-            store,  # a store (dictionary) shared with the suite
-            log  # log message function
+            store,  # the suite's Store (see store.py)
+            log,  # the suite thread's LogBuffer
+            stats,  # run-wide statistics
+            profiler=None,  # the Profiler, when profiling
+            metrics=None,  # the Metrics collector, with --metrics
+            timeouts=None  # learned Timeouts, unless --hard-timeouts
     ):
-        # actions is a list of lists
+        # actions is a tuple of compiled Actions (see compiler.py)
         # each element represents a particular action to take on the page
         # actions are performed sequentially until the list is complete
         self.actions = actions
-        self.by_map = {
-            "xpath": By.XPATH,
-            "id": By.ID,
-            "css": By.CSS_SELECTOR
-        }
-        self.key_map = {
-            "down": Keys.DOWN,
-            "up": Keys.UP,
-            "left": Keys.LEFT,
-            "right": Keys.RIGHT,
-            "return": Keys.RETURN,
-            "page_down": Keys.PAGE_DOWN,
-            "page_up": Keys.PAGE_UP
-        }
         self.webdriver = webdriver
         self.store = store
-        self.log = lambda message: log(name, message)
+        self.log = lambda message: log.message(name, message)
+        self.log_action = lambda action, outcome, duration, error=None: \
+            log.action(name, ui_map, action, outcome, duration, error)
+        self.stats = stats
+        self.ui_map = ui_map
+        self.profiler = profiler
+        self.metrics = metrics
+        self.timeouts = timeouts
+        self.name = name
+        self.action = None  # the action being performed
+        # elements found on the page, reused until the page navigates:
+        # (by, target, frame): (element, verified conditions, round trips)
+        self.elements = {}
+        self.frame = None  # the frame elements are currently found in
+        self.round_trips = 0  # element wait round trips made by the page
+        if profiler is not None:
+            self.instrument()
 
     def test(self):
         """Perform the tests specified by the UI Map for the current page"""
-        commands = {
-            # command: (function, num_parameters)
-            "action_new": (self.action_new, 0),
-            "action_move_to_element": (self.action_move_to_element, 2),
-            "action_click": (self.action_click, 0),
-            "action_keys": (self.action_keys, 1),
-            "action_perform": (self.action_perform, 0),
-            "base_url": (self.set_base_url, 1),
-            "clear": (self.clear, 2),
-            "clear_type": (self.clear_type, 3),
-            "click": (self.click, 2),
-            "click_all": (self.click_all, 2),
-            "delay": (self.delay, 1),
-            "exec": (self.execute, 1),
-            "find_frame": (self.find_frame, 2),
-            "keys": (self.keys, 3),
-            "log": (self.log, 1),
-            "log_var": (self.log_var, 1),
-            "open": (self.open_url, 1),
-            "random_ssn": (self.random_ssn, 2),
-            "select": (self.select, 3),
-            "select_by_value": (self.select_by_value, 3),
-            "set_window_size": (self.set_window_size, 2),
-            "store_attribute": (self.store_attribute, 4),
-            "store_text": (self.store_text, 3),
-            "switch_to_default": (self.switch_to_default, 0),
-            "switch_to_frame": (self.switch_to_frame, 1),
-            "type": (self.send_keys, 3),
-            "type_var": (self.send_var, 3),
-            "verify_text": (self.verify_text, 3)
-        }
         current_action = 1
         length = len(self.actions)
-        for action, line_number in self.actions:
-            if self.store['debug']:
-                self.log(repr(action))
+        for action in self.actions:
+            # execute the command, logging its outcome
+            start_time = time()
+            self.action = action
             try:
-                cmd = action[0]
-                function, num_params = commands[cmd]
-                params = action[1:1 + num_params]
-            except IndexError:
-                raise ValueError("invalid action: %s" % action)
-            except KeyError:
-                raise ValueError("unknown action: %s" % action)
-            # execute the command
-            function(*params)
-            # delay between actions
-            sleep(settings.action_delay)
-            # page delay occurs before executing the last action
+                if self.profiler is None:
+                    action.function(self, *action.params)
+                else:
+                    self.profile_action(action)
+            except Exception, e:
+                # a fused action reports the action within it that failed;
+                # the failed action is attached to the exception
+                e.action = getattr(e, "action", action)
+                self.log_action(e.action, "failed", time() - start_time, e)
+                raise
+            duration = time() - start_time
+            self.stats.add("actions")
+            self.stats.add("action seconds", duration)
+            if action.command == "fused":
+                for step in action.params[0]:
+                    self.log_action(
+                        step, "passed", duration / len(action.params[0]))
+            else:
+                self.log_action(action, "passed", duration)
+            # the fixed delay model: a delay between actions, plus a page
+            # delay before executing the last action
+            delay = settings.action_delay
             current_action += 1
             if current_action == length:
-                sleep(settings.page_delay)
+                delay += settings.page_delay
+            self.stats.add("fixed delay seconds", delay)
+            if action.navigates:
+                # element handles do not survive navigation
+                self.elements.clear()
+            if self.store['wait_mode'] == "fixed":
+                self.sleep(delay)
+                self.stats.add("wait seconds", delay)
+            elif action.navigates:
+                self.wait_until_ready(delay)
+            if action.navigates and self.metrics is not None:
+                self.metrics.collect(self.webdriver, self.name, self.ui_map)
+
+    sleep = staticmethod(sleep)
+
+    def instrument(self):
+        """Attribute the time spent in waits and sleeps for the Profiler,
+        sampling the latency of each selector"""
+        timed = self.profiler.timed
+        selector = lambda by, target, *args: (
+            "selector", "%s=%s" % (by, target))
+        self.sleep = timed("sleep", sleep)
+        self.wait = timed("wait", self.wait)
+        self.wait_until_ready = timed("wait", self.wait_until_ready)
+        self.wait_for_element = timed(
+            "wait", self.wait_for_element, selector, True)
+        self.wait_for_frame = timed(
+            "wait", self.wait_for_frame, selector, True)
+
+    def profile_action(self, action):
+        """Execute an action, sampling its latency; exec actions are
+        attributed to their own category"""
+        category = "exec" if action.command == "exec" else None
+        name = "%s:%d %s" % (self.ui_map, action.line_number, action.source)
+        self.profiler.timed(
+            category, action.function, lambda *args: ("action", name)
+        )(self, *action.params)
 
     """Action Functions"""
 
@@ -134,9 +196,8 @@ class Page(object):
         """Adds a mouse click to the current Action Chain"""
         self.action_chain.click()
 
-    def action_keys(self, value):
+    def action_keys(self, keys):
         """Adds sending keys to the current Action Chain"""
-        keys = self.map_keys(value)
         self.action_chain.send_keys(keys)
 
     def action_perform(self):
@@ -145,8 +206,8 @@ class Page(object):
 
     def clear(self, by, target):
         """Clear an element"""
-        element = self.wait_for_element(by, target)
-        element.clear()
+        self.on_element(
+            by, target, lambda element: element.clear(), "clickable")
 
     def clear_type(self, by, target, value):
         """Clear an element, then send keys"""
@@ -159,7 +220,6 @@ class Page(object):
 
     def click_all(self, by, target):
         """Click on all target elements, ignoring WebDriver exceptions"""
-        by = self.get_by_method(by)
         elements = self.webdriver.find_elements(by, target)
         for element in elements:
             try:
@@ -169,26 +229,71 @@ class Page(object):
 
     def delay(self, n):
         """Delay n milliseconds"""
-        sleep(float(n) / 1000.0)
+        self.sleep(n / 1000.0)
 
-    def execute(self, string):
-        """Execute a string of arbitrary Python code"""
-        exec string in self.store
+    def execute(self, code):
+        """Execute a compiled string of arbitrary Python code, with the store
+        as its variables"""
+        self.store.execute(code)
 
     def find_frame(self, by, target):
         """Find and switch to the frame containing the target element"""
-        by = self.get_by_method(by)
-
-        def find_frame_by_target():
-            if not self.scan_frames(by, target):
-                raise NoSuchElementException
-
-        self.wait(find_frame_by_target,
-                  Exception("Cannot find frame for element: %s" % target))
+        self.wait_for_frame(by, target)
+
+    def fused(self, actions):
+        """Perform a run of fused actions (see compiler.py) with a single
+        script, or one by one if the webdriver cannot run asynchronous
+        scripts. An exception names the failed action in its action
+        attribute."""
+        if getattr(self.webdriver, "harness_async_waits", True):
+            if not hasattr(self.webdriver, "harness_async_waits"):
+                self.webdriver.set_script_timeout(settings.wait_timeout + 5)
+            steps = [[action.command] + list(action.params)
+                     for action in actions]
+            try:
+                failed = self.webdriver.execute_async_script(
+                    scripts.fused_actions, steps,
+                    int(settings.wait_timeout * 1000))
+            except TimeoutException:
+                # the script ran, but outlived its own timeout: waiting again
+                # one by one would take as long
+                self.webdriver.harness_async_waits = True
+                error = WebDriverException("fused actions timed out")
+                error.action = actions[0]
+                raise error
+            except WebDriverException:
+                if not hasattr(self.webdriver, "harness_async_waits"):
+                    self.webdriver.harness_async_waits = False
+                # e.g. the page navigated: perform the actions one by one
+                failed = False
+            else:
+                self.webdriver.harness_async_waits = True
+            if failed is None:
+                self.stats.add("fused scripts")
+                self.stats.add("fused actions", len(actions))
+                return
+            if isinstance(failed, (int, long)) and \
+                    not isinstance(failed, bool) and \
+                    0 <= failed < len(actions):
+                action = actions[failed]
+                by, target, value = action.params
+                error = WebDriverException({
+                    "select": "cannot select option: %s" % value,
+                    "select_by_value": "cannot select value: %s" % value,
+                    "verify_text": "cannot verify text: %s" % value
+                }[action.command])
+                error.action = action
+                raise error
+        for action in actions:
+            self.action = action
+            try:
+                action.function(self, *action.params)
+            except Exception, e:
+                e.action = action
+                raise
 
-    def keys(self, by, target, value):
+    def keys(self, by, target, keys):
         """Send a string of special keys to a target"""
-        keys = self.map_keys(value)
         self.send_keys(by, target, keys)
 
     def log_message(self, string):
@@ -211,18 +316,18 @@ class Page(object):
 
     def select(self, by, target, value):
         """Select an option from a select box"""
-        element = self.wait_for_element(by, target)
-        self.wait(
-            lambda: Select(element).select_by_visible_text(value),
-            "cannot select option: %s" % value
+        self.wait_on_element(
+            by, target,
+            lambda element: Select(element).select_by_visible_text(value),
+            "cannot select option: %s" % value, "option_text", value
         )
 
     def select_by_value(self, by, target, value):
         """Select an option from a select box"""
-        element = self.wait_for_element(by, target)
-        self.wait(
-            lambda: Select(element).select_by_value(value),
-            "cannot select value: %s" % value
+        self.wait_on_element(
+            by, target,
+            lambda element: Select(element).select_by_value(value),
+            "cannot select value: %s" % value, "option_value", value
         )
 
     def set_window_size(self, width, height):
@@ -232,7 +337,11 @@ class Page(object):
     def send_keys(self, by, target, value):
         """Send keys to an element"""
         element = self.wait_for_element_click(by, target)
-        element.send_keys(value)
+        try:
+            element.send_keys(value)
+        except StaleElementReferenceException:
+            self.forget_element(by, target)
+            self.wait_for_element_click(by, target).send_keys(value)
 
     def send_var(self, by, target, var):
         """Send a store variable string to an element"""
@@ -247,89 +356,386 @@ class Page(object):
 
     def store_attribute(self, by, target, attr, var):
         """Stores an elements text"""
-        element = self.wait_for_element(by, target)
-        self.store[var] = element.get_attribute(attr)
+        self.store[var] = self.on_element(
+            by, target, lambda element: element.get_attribute(attr))
 
     def switch_to_default(self):
         """Switch to top frame"""
         self.webdriver.switch_to_default_content()
+        self.frame = None
 
     def switch_to_frame(self, frame):
-        """Switch to a frame"""
-        try:
-            frame = int(frame)
-        except ValueError:
-            pass
+        """Switch to a frame by name or number"""
         self.wait(
             lambda: self.webdriver.switch_to_frame(frame),
             "cannot find frame: %s" % str(frame)
         )
+        self.frame = ("frame", frame)
 
     def store_text(self, by, target, var):
         """Stores an elements text"""
-        element = self.wait_for_element(by, target)
-        self.store[var] = element.text
+        self.store[var] = self.on_element(
+            by, target, lambda element: element.text)
 
     def verify_text(self, by, target, text):
         """Verifies that text is exists within the target"""
-        element = self.wait_for_element(by, target)
-        if text not in element.text:
+        try:
+            self.wait_for_element(by, target, "text", text)
+        except TimeoutException:
             raise WebDriverException("cannot verify text: %s" % text)
 
-    """Helper functions"""
+    def set_wait_mode(self, mode):
+        """Wait for page readiness (ready) or sleep between actions (fixed)
+        for the rest of the suite"""
+        self.store['wait_mode'] = mode
 
-    def get_by_method(self, by):
-        """Verify the By method is available"""
-        if by not in self.by_map:
-            raise ValueError("unknown By method: %s" % by)
-        return self.by_map[by]
+    """Helper functions"""
 
-    def map_keys(self, value):
-        """Splits value by commas, returning a string of mapped Keys"""
-        try:
-            keys = [self.key_map[key] for key in value.split(',')]
-        except KeyError:
-            raise ValueError("unknown key mapping: %s" % value)
-        return ''.join(keys)
-
-    def scan_frames(self, by, target, path_to_current_frame=[]):
-        """Recursively scan frames for an element, returning the element if
-        found, false if not"""
-        try:
-            return self.webdriver.find_element(by, target)
-        except (WebDriverException, NoSuchElementException):
-            pass
-        # switch to current frame
+    def search_frames(self, by, target, path=[]):
+        """Search the frame at a path for an element, returning the path to
+        the frame containing it (and switching to it), or None if not found.
+        Same-origin frames are searched in the browser in one round trip; the
+        search only switches frames to cross into cross-origin frames."""
+        self.switch_to_frame_path(path)
+        self.stats.add("frame search round trips")
+        result = self.webdriver.execute_script(scripts.find_frame, by, target)
+        if result is None:
+            return None
+        found, cross_origin = result
+        if found is not None:
+            for index in found:
+                self.webdriver.switch_to_frame(index)
+            return path + found
+        for child in cross_origin:
+            found = self.search_frames(by, target, path + child)
+            if found is not None:
+                return found
+        return None
+
+    def switch_to_frame_path(self, path):
+        """Switch to the frame at a path of window.frames indexes"""
         self.webdriver.switch_to_default_content()
-        for frame in path_to_current_frame:
-            self.webdriver.switch_to_frame(frame)
-        # get all children frames
-        frames = self.webdriver.find_elements_by_tag_name('iframe')
-        for frame in frames:
-            # scan each child
-            el = self.scan_frames(by, target, path_to_current_frame + [frame])
-            if el:
-                return el
-
-    def wait(self, func, error, timeout=settings.wait_timeout):
-        """Helper function to handle generic webdriver waits"""
-        stop_time = time() + timeout
+        for index in path:
+            self.webdriver.switch_to_frame(index)
+
+    def frame_path_key(self, by, target):
+        """Return the frame path cache key for a selector on the current
+        page"""
+        return (url_pattern(self.webdriver.current_url), by, target)
+
+    def locate_frame(self, by, target):
+        """Switch to the frame containing an element, returning False if it
+        cannot be found. The frame path is cached per page and selector; a
+        cached path that no longer leads to the element is discarded."""
+        key = self.frame_path_key(by, target)
+        path = frame_paths.get(key)
+        if path is not None:
+            try:
+                self.switch_to_frame_path(path)
+                if self.webdriver.find_elements(by, target):
+                    self.stats.add("frame cache hits")
+                    self.frame = tuple(path)
+                    return True
+            except WebDriverException:
+                pass
+            frame_paths.pop(key, None)
+            self.stats.add("frame cache invalidations")
+        self.stats.add("frame searches")
+        path = self.search_frames(by, target)
+        if path is None:
+            return False
+        frame_paths[key] = path
+        self.frame = tuple(path)
+        return True
+
+    def wait_until_ready(self, delay):
+        """Wait until the document has loaded, no XHR or fetch requests are
+        pending and the DOM has stopped changing. Readiness is best-effort:
+        after settings.ready_timeout, the next action proceeds anyway, and
+        later visits to the page (see url_pattern) sleep for the fixed delay
+        instead of waiting for readiness."""
+        start_time = time()
+        stop_time = start_time + settings.ready_timeout
+        quiet_period = settings.ready_quiet_period * 1000
+        page = None
+        while time() < stop_time:
+            try:
+                state, pending, quiet, url = self.webdriver.execute_script(
+                    scripts.page_readiness)
+                page = url_pattern(url)
+                if page in unready_pages:
+                    self.stats.add("readiness fallbacks")
+                    self.sleep(delay)
+                    break
+                if state == "complete" and pending <= 0 and \
+                        quiet >= quiet_period:
+                    break
+            except WebDriverException:
+                # e.g. the page is unloading
+                pass
+            self.sleep(settings.attempt_delay)
+        else:
+            self.stats.add("readiness timeouts")
+            if page is not None:
+                unready_pages.add(page)
+        self.stats.add("wait seconds", time() - start_time)
+
+    def wait(self, func, error, limit=None):
+        """Helper function to handle generic webdriver waits, until a limit
+        (see wait_limit). The wait fails at once if the browser session is
+        gone, or if the page is found in an error state, which is checked
+        every settings.error_check_interval seconds."""
+        limit = limit or self.wait_limit(None)
+        stop_time = time() + limit[0]
+        checked = time()
         while time() < stop_time:
             try:
                 return func()
-            except (WebDriverException, NoSuchElementException):
-                sleep(settings.attempt_delay)
-        raise TimeoutException(error)
+            except (WebDriverException, NoSuchElementException), e:
+                self.check_session(e)
+                if time() - checked >= settings.error_check_interval:
+                    checked = time()
+                    self.check_error_state()
+                self.sleep(settings.attempt_delay)
+        raise self.timed_out(error, limit)
+
+    def wait_limit(self, target):
+        """Return the (seconds, kind, key) limit of a wait for a target by
+        the current action: its learned timeout, if it has one, or else the
+        hard settings.wait_timeout. The key names the wait in the learned
+        Timeouts."""
+        key = None
+        if target is not None and self.action is not None:
+            key = (self.ui_map, self.action.line_number, target)
+            if self.timeouts is not None:
+                seconds = self.timeouts.timeout(key)
+                if seconds is not None:
+                    return seconds, "learned", key
+        return settings.wait_timeout, "hard", key
+
+    def waited(self, limit, start_time):
+        """Record the duration of a successful wait in the learned
+        Timeouts"""
+        if self.timeouts is not None and limit[2] is not None:
+            self.timeouts.record(limit[2], time() - start_time)
+
+    def timed_out(self, error, limit):
+        """Return the exception for a wait that reached its limit, naming
+        the kind of timeout"""
+        seconds, kind, key = limit
+        self.stats.add("%s timeouts" % kind)
+        if kind == "learned":
+            self.timeouts.forget(key)
+        return TimeoutException("%s (%s timeout of %.1f seconds)" % (
+            error, kind, seconds))
+
+    def check_session(self, e):
+        """Raise SessionLost if a webdriver error means that the browser
+        session is gone"""
+        message = (getattr(e, "msg", None) or "").lower()
+        if any(error in message for error in session_errors):
+            self.stats.add("sessions lost")
+            raise SessionLost(e.msg)
+
+    def check_error_state(self):
+        """Raise ErrorState if the page is in an error state: an HTTP error
+        page, or a page showing an error banner"""
+        try:
+            state = self.webdriver.execute_script(
+                scripts.error_state, settings.error_banners,
+                settings.error_titles)
+        except WebDriverException, e:
+            self.check_session(e)
+            return
+        if state:
+            raise self.error_state(state)
+
+    def error_state(self, state):
+        """Return the exception for a page found in an error state"""
+        self.stats.add("error states")
+        return ErrorState("page is in an error state: %s" % state)
+
+    def wait_for_frame(self, by, target):
+        """Wait until a frame contains the target element, switching to it"""
+        def find_frame_by_target():
+            if not self.locate_frame(by, target):
+                raise NoSuchElementException
 
-    def wait_for_element(self, by, target):
-        """Wait for an element to be available"""
-        by = self.get_by_method(by)
-        return self.wait(lambda: self.webdriver.find_element(by, target),
-                         "cannot find element: %s" % target)
+        limit = self.wait_limit(target)
+        start_time = time()
+        self.wait(find_frame_by_target,
+                  Exception("Cannot find frame for element: %s" % target),
+                  limit)
+        self.waited(limit, start_time)
+
+    def wait_for_element(self, by, target, condition="present", value=None):
+        """Wait for an element to be available and meet a condition: present,
+        visible, clickable, text (contains value), option_text or
+        option_value (has an option matching value). An element found
+        earlier on the page is reused if it was found meeting the
+        condition. A text or option condition, which the page may have
+        changed since, is always checked on the live page, using the
+        reused element."""
+        key = (by, target, self.frame)
+        if key in self.elements:
+            element, conditions, round_trips = self.elements[key]
+            if condition in conditions:
+                self.stats.add("element cache hits")
+                self.stats.add("element cache calls saved", round_trips)
+                return element
+            if condition in value_conditions and \
+                    conditions.issuperset(implied_conditions[condition]):
+                if self.wait_for_condition(
+                        element, target, condition, value) is not None:
+                    self.stats.add("element cache hits")
+                    return element
+                self.forget_element(by, target)
+        self.stats.add("element cache misses")
+        round_trips = self.round_trips
+        element = self.resolve_element(by, target, condition, value)
+        conditions = set(implied_conditions[condition])
+        if key in self.elements and self.elements[key][0] == element:
+            conditions.update(self.elements[key][1])
+        self.elements[key] = (
+            element, conditions, self.round_trips - round_trips)
+        return element
+
+    def wait_for_condition(self, element, target, condition, value):
+        """Wait for a found element to meet a text or option condition,
+        returning None if its handle has gone stale"""
+        error = "cannot find element: %s" % target
+        self.stats.add("element waits")
+        limit = self.wait_limit(target)
+        start_time = time()
+
+        def check():
+            self.stats.add("element wait round trips")
+            self.round_trips += 1
+            try:
+                met = self.check_element(element, condition, value)
+            except StaleElementReferenceException:
+                return None
+            if not met:
+                raise NoSuchElementException
+            return element
+        element = self.wait(check, error, limit)
+        if element is not None:
+            self.waited(limit, start_time)
+        return element
+
+    def forget_element(self, by, target):
+        """Discard a cached element whose handle has gone stale"""
+        self.stats.add("element cache stale")
+        self.elements.pop((by, target, self.frame), None)
+
+    def on_element(self, by, target, func, condition="present", value=None):
+        """Return func(element), finding the element again if its handle has
+        gone stale"""
+        element = self.wait_for_element(by, target, condition, value)
+        try:
+            return func(element)
+        except StaleElementReferenceException:
+            self.forget_element(by, target)
+            return func(self.wait_for_element(by, target, condition, value))
+
+    def wait_on_element(self, by, target, func, error, condition="present",
+                        value=None):
+        """Wait until func(element) succeeds, finding the element again if
+        its handle goes stale"""
+        elements = [self.wait_for_element(by, target, condition, value)]
+
+        def attempt():
+            try:
+                return func(elements[0])
+            except StaleElementReferenceException:
+                self.forget_element(by, target)
+                elements[0] = self.wait_for_element(
+                    by, target, condition, value)
+                raise
+        return self.wait(attempt, error)
+
+    def resolve_element(self, by, target, condition, value):
+        """Wait for an element condition in the browser, in a single round
+        trip if the webdriver supports asynchronous scripts, otherwise by
+        polling"""
+        error = "cannot find element: %s" % target
+        self.stats.add("element waits")
+        limit = self.wait_limit(target)
+        start_time = time()
+        element = None
+        if getattr(self.webdriver, "harness_async_waits", True):
+            element = self.wait_in_browser(
+                by, target, condition, value, error, limit)
+
+        def find_element():
+            self.stats.add("element wait round trips")
+            self.round_trips += 1
+            element = self.webdriver.find_element(by, target)
+            if not self.check_element(element, condition, value):
+                raise NoSuchElementException
+            return element
+
+        if element is None:
+            element = self.wait(find_element, error, limit)
+        self.waited(limit, start_time)
+        return element
+
+    def wait_in_browser(self, by, target, condition, value, error, limit):
+        """Wait for an element condition using an asynchronous script,
+        returning the element, or None if the webdriver cannot run the script
+        and the caller should poll instead. The script resolves at once if
+        the page is in an error state."""
+        stop_time = time() + limit[0]
+        if not hasattr(self.webdriver, "harness_async_waits"):
+            # allow the script to outlive its own (longest) timeout
+            self.webdriver.set_script_timeout(settings.wait_timeout + 5)
+        while time() < stop_time:
+            try:
+                self.stats.add("element wait round trips")
+                self.round_trips += 1
+                element = self.webdriver.execute_async_script(
+                    scripts.wait_for_element, by, target, condition, value,
+                    settings.error_banners, settings.error_titles,
+                    int((stop_time - time()) * 1000))
+            except TimeoutException:
+                break
+            except WebDriverException, e:
+                self.check_session(e)
+                if not hasattr(self.webdriver, "harness_async_waits"):
+                    # never succeeded: asynchronous scripts are unsupported
+                    self.webdriver.harness_async_waits = False
+                    return None
+                # e.g. the page navigated mid-wait: try again
+                self.sleep(settings.attempt_delay)
+                continue
+            self.webdriver.harness_async_waits = True
+            if element is None:
+                break
+            if isinstance(element, dict):
+                raise self.error_state(element["harness_error"])
+            return element
+        raise self.timed_out(error, limit)
+
+    def check_element(self, element, condition, value):
+        """Check an element condition from the client (used when polling)"""
+        if condition == "present":
+            return True
+        if condition in ("option_text", "option_value"):
+            options = Select(element).options
+            if condition == "option_text":
+                return value in [option.text for option in options]
+            return value in [option.get_attribute("value")
+                             for option in options]
+        if not element.is_displayed():
+            return False
+        if condition == "clickable":
+            return element.is_enabled()
+        if condition == "text":
+            return value in element.text
+        return True
 
     def wait_for_element_click(self, by, target):
         """Wait until an element is clicked"""
-        element = self.wait_for_element(by, target)
-        self.wait(lambda: element.click(),
-                  "cannot click element: %s" % target)
-        return element
+        return self.wait_on_element(
+            by, target, lambda element: element.click() or element,
+            "cannot click element: %s" % target, "clickable")
@@ -0,0 +1,202 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import Queue
+import threading
+from time import time
+import scripts
+import settings
+
+
+class Session(object):
+    """A pooled webdriver session"""
+    def __init__(self, webdriver):
+        self.webdriver = webdriver
+        self.node = None  # the grid node, if remote
+        self.created = time()
+        self.leased = None
+        self.suites = 0  # number of suites run
+
+    def expired(self):
+        """Check whether the session should be recycled rather than reused"""
+        if self.suites >= settings.session_max_suites:
+            return True
+        if time() - self.created >= settings.session_max_age:
+            return True
+        # only some browsers report their JavaScript heap size
+        heap = self.webdriver.execute_script(scripts.heap_size)
+        return heap is not None and \
+            heap >= settings.session_max_heap * 1024 * 1024
+
+    def reset(self):
+        """Clear cookies, storage and extra windows left by the last suite"""
+        webdriver = self.webdriver
+        handles = webdriver.window_handles
+        for handle in handles[1:]:
+            webdriver.switch_to_window(handle)
+            webdriver.close()
+        webdriver.switch_to_window(handles[0])
+        webdriver.switch_to_default_content()
+        webdriver.delete_all_cookies()
+        webdriver.execute_script(scripts.clear_storage)
+        webdriver.get("about:blank")
+
+    def quit(self):
+        """Close the browser, ignoring errors from crashed sessions"""
+        try:
+            self.webdriver.quit()
+        except:
+            pass
+
+
+class SessionPool(object):
+    """The SessionPool keeps a fixed number of browser sessions alive for the
+    Suite threads to lease. Sessions are launched ahead of demand by a backend
+    (see grid.py), reset between suites and replaced in the background when
+    they are recycled or crash. An autoscaled run grows and shrinks the
+    pool with its threads."""
+    def __init__(self, size, stats, backend):
+        self.size = size
+        self.stats = stats
+        self.backend = backend
+        self.idle = Queue.Queue()
+        self.stopping = threading.Event()  # set on CTL-C
+        self.lock = threading.Lock()
+        self.surplus = 0  # sessions to retire when released or launched
+
+    def start(self):
+        """Warm up the pool, launching every session concurrently"""
+        for i in range(self.size):
+            self.replace()
+
+    def replace(self):
+        """Launch a new session in the background"""
+        t = threading.Thread(target=self.launch_session)
+        t.daemon = True
+        t.start()
+
+    def launch_session(self):
+        """Launch a session and add it to the idle queue, retrying a failed
+        launch after a doubling delay; if every attempt fails, the exception
+        is queued instead, to be raised by the next lease"""
+        attempts = settings.session_launch_attempts
+        for attempt in range(1, attempts + 1):
+            start_time = time()
+            try:
+                session = self.backend.launch()
+                break
+            except Exception, e:
+                self.stats.add("session launch failures")
+                if attempt == attempts or self.stopping.is_set():
+                    self.idle.put(e)
+                    return
+                self.stopping.wait(
+                    settings.session_launch_delay * 2 ** (attempt - 1))
+        self.stats.add("sessions launched")
+        self.stats.add("session launch seconds", time() - start_time)
+        if self.stopping.is_set() or self.take_surplus():
+            self.retire(session)
+        else:
+            self.idle.put(session)
+
+    def lease(self):
+        """Lease an idle session, waiting for one to launch if needed.
+        Returns None if the pool is shutting down."""
+        try:
+            session = self.idle.get_nowait()
+            self.stats.add("session pool hits")
+        except Queue.Empty:
+            self.stats.add("session pool misses")
+            session = None
+            while session is None and not self.stopping.is_set():
+                try:
+                    session = self.idle.get(True, 1)
+                except Queue.Empty:
+                    pass
+        if isinstance(session, Exception):
+            raise session
+        if session is not None:
+            session.leased = time()
+        return session
+
+    def release(self, session):
+        """Return a session to the pool after a suite, resetting it, or
+        recycling it if it has expired"""
+        session.suites += 1
+        self.backend.finished(session, time() - session.leased)
+        if self.take_surplus():
+            self.retire(session)
+            return
+        try:
+            if not session.expired():
+                session.reset()
+                self.idle.put(session)
+                return
+            self.stats.add("sessions recycled")
+        except Exception:
+            # the browser is unresponsive
+            self.stats.add("sessions crashed")
+        self.retire(session)
+        self.replace()
+
+    def grow(self):
+        """Add a session to the pool"""
+        if not self.take_surplus():
+            self.replace()
+
+    def shrink(self):
+        """Remove a session from the pool: an idle session, or else the
+        next session released or launched"""
+        try:
+            session = self.idle.get_nowait()
+        except Queue.Empty:
+            with self.lock:
+                self.surplus += 1
+            return
+        if isinstance(session, Session):
+            self.retire(session)
+
+    def take_surplus(self):
+        """Claim a session to be retired, if the pool has shrunk"""
+        with self.lock:
+            if self.surplus:
+                self.surplus -= 1
+                return True
+            return False
+
+    def discard(self, session):
+        """Replace a crashed session"""
+        self.stats.add("sessions crashed")
+        self.retire(session)
+        self.replace()
+
+    def retire(self, session):
+        """Quit a session for good"""
+        session.quit()
+        self.backend.retire(session)
+
+    def close(self):
+        """Quit every idle session"""
+        self.stopping.set()
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except Queue.Empty:
+                break
+            if isinstance(session, Session):
+                self.retire(session)
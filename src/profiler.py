@@ -0,0 +1,216 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import threading
+from time import time
+import settings
+
+# categories of wall time, in report order; harness time is whatever is
+# not attributed to another category
+categories = ["webdriver", "wait", "sleep", "exec", "harness"]
+
+
+def percentile(samples, p):
+    """Return the p-th percentile (nearest rank) of sorted samples"""
+    if not samples:
+        return 0.0
+    rank = max(int(round(p / 100.0 * len(samples))) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+class Profiler(object):
+    """The Profiler attributes each suite's wall time to a category:
+    WebDriver calls, waits, sleeps, exec actions or harness overhead. A call
+    is attributed to the category of the outermost instrumented call
+    enclosing it, e.g. the WebDriver calls made while waiting for an element
+    count as wait time. It also records latency samples for UI maps,
+    actions, selectors and WebDriver commands. Instrumentation is only
+    installed when profiling, so it costs nothing otherwise."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.samples = {}  # (kind, name): [seconds]
+        self.retries = {}  # (kind, name): retries
+        self.suites = {}  # suite: {category: seconds}
+
+    def context(self):
+        """Return the current thread's profiling context"""
+        ctx = self.local
+        if not hasattr(ctx, "category"):
+            ctx.category = None  # category of the outermost call
+            ctx.totals = {}
+            ctx.requests = 0  # WebDriver requests made by this thread
+        return ctx
+
+    def timed(self, category, func, key=None, retries=False):
+        """Wrap a function, attributing its time to a category (if any). If
+        key is given, key(*args) names a (kind, name) sample to record; if
+        retries is set, WebDriver requests after the first count as
+        retries."""
+        def wrapper(*args, **kwargs):
+            ctx = self.context()
+            outermost = ctx.category is None and category is not None
+            if outermost:
+                ctx.category = category
+            requests = ctx.requests
+            start_time = time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = time() - start_time
+                if outermost:
+                    ctx.category = None
+                    ctx.totals[category] = \
+                        ctx.totals.get(category, 0.0) + seconds
+                if key is not None:
+                    self.sample(key(*args), seconds, max(
+                        ctx.requests - requests - 1, 0) if retries else 0)
+        return wrapper
+
+    def sample(self, key, seconds, retries=0):
+        """Record a latency sample"""
+        with self.lock:
+            self.samples.setdefault(key, []).append(seconds)
+            if retries:
+                self.retries[key] = self.retries.get(key, 0) + retries
+
+    def instrument(self, webdriver):
+        """Time every WebDriver request made by a webdriver (and its
+        elements), which all pass through its command executor"""
+        executor = webdriver.command_executor
+        if getattr(executor, "profiled", False):
+            return
+        execute = executor.execute
+
+        def count(command, params):
+            self.context().requests += 1
+            return execute(command, params)
+        executor.execute = self.timed(
+            "webdriver", count, lambda command, params: ("command", command))
+        executor.profiled = True
+
+    def start_suite(self):
+        """Start attributing the current thread's time to a suite"""
+        ctx = self.context()
+        ctx.totals = {}
+        ctx.suite_start = time()
+
+    def end_suite(self, suite):
+        """Finish a suite, attributing unaccounted time to the harness"""
+        ctx = self.context()
+        elapsed = time() - ctx.suite_start
+        totals = dict(ctx.totals)
+        totals["harness"] = max(elapsed - sum(totals.values()), 0.0)
+        with self.lock:
+            self.suites[suite] = totals
+
+    def data(self):
+        """Return the collected data, e.g. to send from a worker process"""
+        with self.lock:
+            return (self.samples, self.retries, self.suites)
+
+    def merge(self, data):
+        """Merge data collected by another Profiler"""
+        samples, retries, suites = data
+        with self.lock:
+            for key, values in samples.items():
+                self.samples.setdefault(key, []).extend(values)
+            for key, value in retries.items():
+                self.retries[key] = self.retries.get(key, 0) + value
+            self.suites.update(suites)
+
+    def report(self, stats):
+        """Return the report lines: time by category and the element cache's
+        effectiveness, then the slowest UI maps, actions, selectors and
+        WebDriver commands"""
+        totals = dict((category, 0.0) for category in categories)
+        for suite_totals in self.suites.values():
+            for category, seconds in suite_totals.items():
+                totals[category] += seconds
+        overall = sum(totals.values()) or 1.0
+        lines = ["profile: %d suite%s; time by category:" % (
+            len(self.suites), "" if len(self.suites) == 1 else "s")]
+        for category in categories:
+            lines.append("  %-10s %9.1f seconds %5.1f%%" % (
+                category, totals[category], 100 * totals[category] / overall))
+        cache = self.element_cache(stats)
+        if cache["hits"] or cache["misses"]:
+            lines.append(
+                "element cache: %d hits, %d misses (%.0f%% hit rate), %d "
+                "stale; %d webdriver calls saved" % (
+                    cache["hits"], cache["misses"],
+                    100.0 * cache["hits"] / (cache["hits"] + cache["misses"]),
+                    cache["stale"], cache["calls saved"]))
+        for kind, title in (("ui_map", "UI maps"), ("action", "actions"),
+                            ("selector", "selectors"),
+                            ("command", "WebDriver commands")):
+            rows = self.ranked(kind)
+            if not rows:
+                continue
+            lines.append("slowest %s (total, calls, retries, p50/p95/p99):"
+                         % title)
+            for name, samples, retries in rows[:settings.profile_top]:
+                lines.append("  %8.1fs %6d %6d  %.3f/%.3f/%.3f  %s" % (
+                    sum(samples), len(samples), retries,
+                    percentile(samples, 50), percentile(samples, 95),
+                    percentile(samples, 99), name))
+        return lines
+
+    def element_cache(self, stats):
+        """Return the element cache counts from the run statistics"""
+        return {
+            "hits": stats.get("element cache hits"),
+            "misses": stats.get("element cache misses"),
+            "stale": stats.get("element cache stale"),
+            "calls saved": stats.get("element cache calls saved")
+        }
+
+    def ranked(self, kind):
+        """Return (name, sorted samples, retries) for a kind of sample,
+        by total time"""
+        rows = []
+        for (sample_kind, name), samples in self.samples.items():
+            if sample_kind == kind:
+                rows.append((name, sorted(samples),
+                             self.retries.get((kind, name), 0)))
+        rows.sort(key=lambda row: -sum(row[1]))
+        return rows
+
+    def save(self, filename, stats):
+        """Write the per-suite breakdown, the element cache counts and every
+        sample's statistics"""
+        output = {
+            "suites": self.suites,
+            "element cache": self.element_cache(stats),
+            "samples": []
+        }
+        for (kind, name), samples in self.samples.items():
+            samples = sorted(samples)
+            output["samples"].append({
+                "kind": kind,
+                "name": name,
+                "calls": len(samples),
+                "retries": self.retries.get((kind, name), 0),
+                "total": sum(samples),
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "p99": percentile(samples, 99)
+            })
+        with open(filename, "w") as f:
+            json.dump(output, f, indent=1)
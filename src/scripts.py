@@ -0,0 +1,408 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# JavaScript injected into the browser under test
+
+# Reports [document.readyState, pending XHR/fetch requests, milliseconds since
+# the last DOM mutation or completed resource, location.href]. The first call
+# on each document installs counters for XHR and fetch requests and a
+# MutationObserver; requests started before then are not counted as pending,
+# but their completion (a new resource timing entry) counts as activity.
+page_readiness = """
+var h = window.__harness_ready;
+var now = new Date().getTime();
+var p = window.performance;
+var resources = p && p.getEntriesByType ?
+    p.getEntriesByType('resource').length : 0;
+if (!h) {
+    h = window.__harness_ready = {pending: 0, mutated: now, resources: 0};
+    var done = function() { h.pending--; };
+    if (window.XMLHttpRequest) {
+        var send = XMLHttpRequest.prototype.send;
+        XMLHttpRequest.prototype.send = function() {
+            h.pending++;
+            this.addEventListener('loadend', done);
+            return send.apply(this, arguments);
+        };
+    }
+    if (window.fetch) {
+        var fetch = window.fetch;
+        window.fetch = function() {
+            h.pending++;
+            var promise = fetch.apply(this, arguments);
+            promise.then(done, done);
+            return promise;
+        };
+    }
+    if (window.MutationObserver && document.documentElement) {
+        new MutationObserver(function() {
+            h.mutated = new Date().getTime();
+        }).observe(document.documentElement, {
+            childList: true, subtree: true,
+            attributes: true, characterData: true
+        });
+    }
+}
+if (resources != h.resources) {
+    h.resources = resources;
+    h.mutated = now;
+}
+return [document.readyState, h.pending, now - h.mutated, location.href];
+"""
+
+# Defines errorState(banners, titles), which describes the error state a page
+# is in, or returns null: an HTTP error status (where the browser reports
+# it), a title matching one of the title patterns, or a visible element
+# matching one of the error banner selectors.
+error_state_function = """
+var errorState = function(banners, titles) {
+    var p = window.performance;
+    var entries = p && p.getEntriesByType ?
+        p.getEntriesByType('navigation') : [];
+    if (entries.length && entries[0].responseStatus >= 400) {
+        return 'HTTP ' + entries[0].responseStatus;
+    }
+    for (var i = 0; i < titles.length; i++) {
+        if (new RegExp(titles[i], 'i').test(document.title || '')) {
+            return 'error page: ' + document.title;
+        }
+    }
+    for (i = 0; i < banners.length; i++) {
+        var el = document.querySelector(banners[i]);
+        if (el && (el.offsetWidth || el.offsetHeight)) {
+            return 'error banner: ' + banners[i];
+        }
+    }
+    return null;
+};
+"""
+
+# Defines the element helpers shared by the scripts that find elements:
+# find(doc, by, target), which returns the first element of a document
+# matching a locator, or null; visible(el), which tells whether an element is
+# displayed; and normalize(s), which collapses whitespace in option text.
+element_functions = """
+var find = function(doc, by, target) {
+    if (by == 'id') {
+        return doc.getElementById(target);
+    } else if (by == 'css selector') {
+        return doc.querySelector(target);
+    } else if (by == 'xpath') {
+        return doc.evaluate(target, doc, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    return null;
+};
+var visible = function(el) {
+    if (!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)) {
+        return false;
+    }
+    var style = window.getComputedStyle(el);
+    return style.visibility != 'hidden' && style.display != 'none';
+};
+var normalize = function(s) {
+    return (s || '').replace(/\\s+/g, ' ').replace(/^ | $/g, '');
+};
+"""
+
+# Returns the page's error state (see error_state_function), or null.
+# Arguments: error banner selectors, error title patterns.
+error_state = error_state_function + """
+return errorState(arguments[0], arguments[1]);
+"""
+
+# Waits for an element matching a condition, resolving with the element or
+# with null after the timeout. The condition is checked immediately, on every
+# DOM mutation and on a short interval (for changes that do not mutate the DOM,
+# e.g. stylesheet transitions). If the page is in an error state while the
+# condition is unmet, the wait resolves at once with {harness_error: state}.
+# Arguments: By method, target, condition, condition value, error banner
+# selectors, error title patterns, timeout in milliseconds.
+wait_for_element = error_state_function + element_functions + """
+var by = arguments[0], target = arguments[1], condition = arguments[2],
+    value = arguments[3], banners = arguments[4], titles = arguments[5],
+    timeout = arguments[6], callback = arguments[arguments.length - 1];
+var check = function() {
+    var el = find(document, by, target);
+    if (!el || condition == 'present') {
+        return el;
+    }
+    if (condition == 'option_text' || condition == 'option_value') {
+        for (var i = 0; i < (el.options || []).length; i++) {
+            var option = el.options[i];
+            if (condition == 'option_text' ?
+                    normalize(option.text) == normalize(value) :
+                    option.value == value) {
+                return el;
+            }
+        }
+        return null;
+    }
+    if (!visible(el)) {
+        return null;
+    }
+    if (condition == 'clickable') {
+        return el.disabled ? null : el;
+    }
+    if (condition == 'text') {
+        return (el.innerText || el.textContent || '').indexOf(value) >= 0 ?
+            el : null;
+    }
+    return el;
+};
+var finished = false, observer = null, interval = null, timer = null;
+var finish = function(result) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    if (observer) {
+        observer.disconnect();
+    }
+    clearInterval(interval);
+    clearTimeout(timer);
+    callback(result);
+};
+var attempt = function() {
+    try {
+        var el = check();
+        if (el) {
+            finish(el);
+        }
+    } catch (e) {
+        // e.g. an invalid selector: report it as a timeout
+    }
+};
+var watch = function() {
+    attempt();
+    try {
+        var state = finished ? null : errorState(banners, titles);
+        if (state) {
+            finish({harness_error: state});
+        }
+    } catch (e) {
+        // e.g. an invalid banner selector
+    }
+};
+watch();
+if (!finished) {
+    if (window.MutationObserver) {
+        observer = new MutationObserver(attempt);
+        observer.observe(document, {
+            childList: true, subtree: true,
+            attributes: true, characterData: true
+        });
+    }
+    interval = setInterval(watch, 100);
+    timer = setTimeout(function() { finish(null); }, timeout);
+}
+"""
+
+# Performs fused actions in order (see Page.fused), waiting for each action's
+# element as wait_for_element does. Options are selected by setting them and
+# dispatching input and change events, as a script would. Resolves with null
+# once every action is done, or with the index of the action that timed out.
+# Arguments: [command, By method, target, value] for each action, timeout in
+# milliseconds for the whole run.
+fused_actions = element_functions + """
+var steps = arguments[0], timeout = arguments[1],
+    callback = arguments[arguments.length - 1];
+var fire = function(el, type) {
+    var event = document.createEvent('HTMLEvents');
+    event.initEvent(type, true, false);
+    el.dispatchEvent(event);
+};
+// performs a step, returning false if its element is not ready yet
+var perform = function(step) {
+    var command = step[0], el = find(document, step[1], step[2]),
+        value = step[3];
+    if (!el) {
+        return false;
+    }
+    if (command == 'select' || command == 'select_by_value') {
+        for (var i = 0; i < (el.options || []).length; i++) {
+            var option = el.options[i];
+            if (command == 'select' ?
+                    normalize(option.text) == normalize(value) :
+                    option.value == value) {
+                option.selected = true;
+                fire(el, 'input');
+                fire(el, 'change');
+                return true;
+            }
+        }
+        return false;
+    }
+    if (command == 'verify_text') {
+        return visible(el) &&
+            (el.innerText || el.textContent || '').indexOf(value) >= 0;
+    }
+    return false;
+};
+var index = 0, finished = false, interval = null, timer = null;
+var finish = function(result) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    clearInterval(interval);
+    clearTimeout(timer);
+    callback(result);
+};
+var attempt = function() {
+    try {
+        while (index < steps.length && perform(steps[index])) {
+            index++;
+        }
+    } catch (e) {
+        // e.g. an invalid selector: report it as a timeout
+    }
+    if (index == steps.length) {
+        finish(null);
+    }
+};
+attempt();
+if (!finished) {
+    interval = setInterval(attempt, 50);
+    timer = setTimeout(function() { finish(index); }, timeout);
+}
+"""
+
+# Searches the current document and its same-origin frames, depth first, for
+# an element, returning [path, cross-origin paths]: path lists the
+# window.frames indexes leading to the frame containing the element (empty if
+# the element is in the current document), or is null if the element was not
+# found; the cross-origin paths lead to frames the script cannot see into.
+# Arguments: By method, target.
+find_frame = element_functions + """
+var by = arguments[0], target = arguments[1];
+var crossOrigin = [];
+var search = function(win, path) {
+    for (var i = 0; i < win.frames.length; i++) {
+        var child = win.frames[i], doc = null;
+        try {
+            doc = child.document;
+        } catch (e) {
+            // a cross-origin frame
+        }
+        if (!doc) {
+            crossOrigin.push(path.concat([i]));
+            continue;
+        }
+        var found = find(doc, by, target) ? path.concat([i]) :
+            search(child, path.concat([i]));
+        if (found) {
+            return found;
+        }
+    }
+    return null;
+};
+return [find(document, by, target) ? [] : search(window, []),
+        crossOrigin];
+"""
+
+# Returns the JavaScript heap size in bytes, or null if the browser does not
+# report it
+heap_size = """
+return window.performance && window.performance.memory ?
+    window.performance.memory.usedJSHeapSize : null;
+"""
+
+# Clears the current origin's local and session storage
+clear_storage = """
+try {
+    window.localStorage.clear();
+    window.sessionStorage.clear();
+} catch (e) {
+    // storage is unavailable, e.g. on about:blank
+}
+"""
+
+# Returns the current origin's [local storage, session storage] items
+save_storage = """
+var items = function(storage) {
+    var result = {};
+    for (var i = 0; i < storage.length; i++) {
+        result[storage.key(i)] = storage.getItem(storage.key(i));
+    }
+    return result;
+};
+try {
+    return [items(window.localStorage), items(window.sessionStorage)];
+} catch (e) {
+    return [{}, {}];
+}
+"""
+
+# Restores [local storage, session storage] items saved by save_storage
+restore_storage = """
+var restore = function(storage, items) {
+    storage.clear();
+    for (var key in items) {
+        storage.setItem(key, items[key]);
+    }
+};
+try {
+    restore(window.localStorage, arguments[0][0]);
+    restore(window.sessionStorage, arguments[0][1]);
+} catch (e) {
+    // storage is unavailable
+}
+"""
+
+# Returns the current document's Navigation Timing, paint and Resource Timing
+# metrics (milliseconds since the navigation started, and the resources'
+# count and bytes), or null until the document has loaded. The navigation's
+# start time identifies the document.
+page_metrics = """
+var p = window.performance;
+if (!p || !p.timing || document.readyState != 'complete') {
+    return null;
+}
+var t = p.timing, start = t.navigationStart;
+var since = function(time) {
+    return time > 0 ? time - start : null;
+};
+var m = {
+    origin: start,
+    path: window.location.pathname,
+    ttfb: since(t.responseStart),
+    dom_content_loaded: since(t.domContentLoadedEventEnd),
+    load: since(t.loadEventEnd),
+    first_paint: null,
+    first_contentful_paint: null,
+    resources: 0,
+    resource_bytes: 0,
+    slowest_resource: 0
+};
+if (p.getEntriesByType) {
+    var paints = p.getEntriesByType('paint');
+    for (var i = 0; i < paints.length; i++) {
+        m[paints[i].name.replace(/-/g, '_')] = Math.round(
+            paints[i].startTime);
+    }
+    var resources = p.getEntriesByType('resource');
+    m.resources = resources.length;
+    for (i = 0; i < resources.length; i++) {
+        m.resource_bytes += resources[i].transferSize || 0;
+        m.slowest_resource = Math.max(
+            m.slowest_resource, Math.round(resources[i].duration));
+    }
+}
+return m;
+"""
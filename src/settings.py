@@ -2,7 +2,61 @@ ui_map_directory_name = "ui-maps"
 delimeter = "|"
 thread_count = 8
 log_filename = "selenium.log"
+log_records_filename = "selenium.jsonl"  # structured log records
+log_buffer_size = 100  # records buffered by each thread before writing
+log_flush_interval = 1  # seconds a record may stay buffered
+log_queue_size = 64  # blocks of records waiting to be written
 attempt_delay = 0.05  # delay between webdriver attempts
 action_delay = 0.1  # delay between actions (seconds)
 page_delay = 0.1  # delay between UI maps (seconds)
-wait_timeout = 35  # seconds before timing out
+wait_timeout = 35  # seconds before timing out (the hard timeout)
+wait_margin = 3  # a learned timeout is the slowest recent wait times this
+wait_min_timeout = 5  # shortest learned timeout (seconds)
+wait_min_samples = 5  # successful waits needed to learn a timeout
+wait_samples = 20  # recent successful waits kept for each wait
+error_check_interval = 1  # seconds between error state checks when polling
+error_banners = []  # CSS selectors of error banners that fail waits at once
+error_titles = []  # error page title patterns (JavaScript, ignoring case)
+wait_mode = "ready"  # wait for page readiness (ready) or sleep (fixed)
+ready_timeout = 10  # maximum seconds to wait for page readiness
+ready_quiet_period = 0.1  # seconds without DOM changes before page is ready
+ui_map_cache_filename = ".ui-map-cache"  # compiled UI maps (with --cache)
+session_max_suites = 50  # suites run by a browser session before recycling
+session_max_age = 1800  # seconds before a browser session is recycled
+session_max_heap = 512  # JavaScript heap (MB) before recycling, if reported
+session_launch_attempts = 3  # attempts to launch a browser session
+session_launch_delay = 1  # seconds before retrying a launch (doubling)
+grid_capabilities = {"browserName": "firefox"}  # default node capabilities
+node_max_failures = 2  # failed session creations before draining a node
+node_retry_delay = 1  # seconds before retrying a node (doubling)
+node_probe_interval = 30  # seconds between probes of a drained node
+node_probe_timeout = 5  # seconds to wait for a node's status
+wire_timeout = 120  # seconds to wait for a response, with --wire
+history_filename = "selenium.db"  # suite durations and outcomes
+snapshot_min_suites = 2  # suites sharing a prefix of UI maps to snapshot it
+snapshot_max_age = 900  # seconds before a prefix's snapshot is taken again
+checkpoint_filename = "selenium.checkpoint"  # journal of the current run
+stream_queue_size = 500  # suites loaded ahead of the threads, with --stream
+data_chunk_size = 20  # rows of a data suite run in one browser session
+data_failed_rows = 10  # failed rows of a data suite listed in the summary
+profile_filename = "selenium-profile.json"  # with --profile
+profile_top = 10  # rows in each ranking of the profile report
+load_duration = 60  # seconds a load test runs, unless --duration is given
+load_report_interval = 10  # seconds in each window of the load time series
+load_filename = "selenium-load.json"  # with --load
+metrics_filename = "selenium-metrics.db"  # page metrics, with --metrics
+metrics_baseline_runs = 10  # previous runs in a page's rolling baseline
+metrics_min_runs = 3  # previous runs needed before comparing a page
+metrics_threshold = 0.2  # slowdown over the baseline that is flagged
+metrics_min_slowdown = 50  # milliseconds a flagged slowdown must exceed
+autoscale_min_threads = 2  # threads an autoscaled run starts with
+autoscale_max_threads = 16  # most threads an autoscaled run may grow to
+autoscale_interval = 5  # seconds between autoscaling decisions
+autoscale_max_cpu = 0.85  # host CPU use above which threads are drained
+autoscale_min_memory = 0.15  # available memory below which they are drained
+autoscale_latency_factor = 2.0  # action latency, over its best, that drains
+autoscale_filename = "selenium-autoscale.json"  # with --autoscale
+artifact_directory = "selenium-artifacts"  # failure artifacts (--artifacts)
+artifact_budget = 200  # megabytes of artifacts kept; the oldest are evicted
+artifact_queue_size = 32  # captured failures waiting to be written
+artifact_captures = 5  # failures captured at each UI map line in a run
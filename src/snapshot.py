@@ -0,0 +1,148 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import threading
+from time import time
+from selenium.common.exceptions import WebDriverException
+import scripts
+import settings
+from store import isolate
+
+
+def shared_prefixes(suites):
+    """Find each suite's longest leading run of UI maps that is shared with
+    other suites (see settings.snapshot_min_suites) and leaves at least one
+    UI map of its own, using a trie of the suites' UI maps. Returns a
+    dictionary of suite: prefix (a tuple of UI map names)."""
+    trie = {}  # ui_map: [suites, children]
+    for suite in suites.values():
+        node = trie
+        for ui_map, actions in suite[:-1]:
+            entry = node.setdefault(ui_map, [0, {}])
+            entry[0] += 1
+            node = entry[1]
+    prefixes = {}
+    for name, suite in suites.items():
+        node = trie
+        depth = 0
+        for index, (ui_map, actions) in enumerate(suite[:-1]):
+            entry = node[ui_map]
+            if entry[0] < settings.snapshot_min_suites:
+                break
+            depth = index + 1
+            node = entry[1]
+        if depth:
+            prefixes[name] = tuple(ui_map for ui_map, actions in suite[:depth])
+    return prefixes
+
+
+class Snapshot(object):
+    """The browser state left by a prefix of UI maps: the current URL, its
+    cookies and storage, and a copy of the variables the prefix set (or
+    read, and may have changed in place) in the suite's store"""
+    def __init__(self, url, cookies, storage, store, seconds):
+        self.url = url
+        self.cookies = cookies
+        self.storage = storage
+        self.store = store
+        self.seconds = seconds  # time taken to run the prefix
+        self.created = time()
+
+    def expired(self):
+        """Check whether the snapshot is too old, or a cookie has expired"""
+        if time() - self.created >= settings.snapshot_max_age:
+            return True
+        return any(cookie.get("expiry") and cookie["expiry"] <= time()
+                   for cookie in self.cookies)
+
+
+class Snapshots(object):
+    """Snapshots lets suites that start with the same UI maps run them once
+    per process: the first suite to run a shared prefix snapshots the
+    browser state it leaves, and later suites restore the snapshot instead
+    of running the prefix. Only cookies of the current domain can be
+    restored, and the browser is restored to the top frame."""
+    def __init__(self, prefixes, stats):
+        self.prefixes = prefixes  # suite: prefix
+        self.stats = stats
+        self.snapshots = {}  # prefix: Snapshot
+        self.lock = threading.Lock()
+
+    def take(self, webdriver, prefix, store, seconds):
+        """Snapshot the browser state after running a prefix"""
+        try:
+            snapshot = Snapshot(
+                webdriver.current_url, webdriver.get_cookies(),
+                webdriver.execute_script(scripts.save_storage),
+                dict((key, isolate(value))
+                     for key, value in store.changes().items()), seconds)
+        except WebDriverException:
+            return
+        with self.lock:
+            self.snapshots[prefix] = snapshot
+        self.stats.add("snapshot %s taken" % name(prefix))
+
+    def restore(self, webdriver, prefix, store):
+        """Restore the snapshot of a prefix, returning False if it has none
+        (or it has expired) or it cannot be restored"""
+        with self.lock:
+            snapshot = self.snapshots.get(prefix)
+            if snapshot is not None and snapshot.expired():
+                del self.snapshots[prefix]
+                snapshot = None
+                self.stats.add("snapshot %s expired" % name(prefix))
+        if snapshot is None:
+            return False
+        start_time = time()
+        try:
+            # cookies can only be set on a page of their domain
+            webdriver.get(snapshot.url)
+            for cookie in snapshot.cookies:
+                webdriver.add_cookie(cookie)
+            webdriver.execute_script(scripts.restore_storage, snapshot.storage)
+            webdriver.get(snapshot.url)
+        except WebDriverException:
+            self.clear(webdriver)
+            return False
+        for key, value in snapshot.store.items():
+            store[key] = isolate(value)
+        self.stats.add("snapshot %s restores" % name(prefix))
+        self.stats.add("snapshot %s seconds saved" % name(prefix),
+                       snapshot.seconds - (time() - start_time))
+        return True
+
+    def invalidate(self, prefix):
+        """Discard a prefix's snapshot, e.g. because a suite failed right
+        after restoring it"""
+        with self.lock:
+            self.snapshots.pop(prefix, None)
+        self.stats.add("snapshot %s invalidated" % name(prefix))
+
+    def clear(self, webdriver):
+        """Clear the state left by a failed restore"""
+        try:
+            webdriver.delete_all_cookies()
+            webdriver.execute_script(scripts.clear_storage)
+        except WebDriverException:
+            pass
+
+
+def name(prefix):
+    """Return a prefix's name, for statistics and logging"""
+    return " > ".join(prefix)
@@ -0,0 +1,137 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from collections import MutableMapping
+import copy
+import types
+
+# marks a variable deleted from a layer, hiding the parent's value
+deleted = object()
+
+# values that cannot be changed in place, so layers can share them
+immutable_types = (basestring, int, long, float, complex, bool,
+                   type(None), frozenset, type, types.ClassType,
+                   types.FunctionType, types.BuiltinFunctionType,
+                   types.ModuleType)
+
+
+def isolate(value):
+    """Return a deep copy of a mutable value, or the value itself if it is
+    immutable or cannot be copied"""
+    if isinstance(value, immutable_types):
+        return value
+    try:
+        return copy.deepcopy(value)
+    except (TypeError, copy.Error):
+        return value
+
+
+def code_names(code):
+    """Return the global names compiled code, and any code nested in it
+    (e.g. function bodies), loads, stores or deletes"""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names.update(code_names(const))
+    return names
+
+
+class Store(MutableMapping):
+    """A Store is a copy-on-write layer of variables over a parent mapping:
+    the run's base store, which every thread shares and none changes, or
+    another layer. Each suite (and each row of a data suite) runs in a new
+    layer, created in constant time however large the base is. Reads fall
+    through to the parent; writes and deletions only change the layer, so
+    suites cannot see each other's variables. The first read of a mutable
+    value from the parent keeps a deep copy in the layer, so changing it in
+    place (e.g. popping an item off a list of fixtures) only changes the
+    layer; a suite only pays to copy the values it reads."""
+    def __init__(self, parent, values=None):
+        self.parent = parent
+        self.values = dict(values or {})  # this layer's variables
+        self.globals = None  # the namespace exec actions run in
+        self.names = set()  # the names exec actions have used
+
+    def execute(self, code):
+        """Execute compiled code, then write the variables it set or deleted
+        back to the layer. The code runs in a namespace kept for the layer's
+        life, since functions defined in exec code keep it as their
+        globals. Only the variables named by this or an earlier exec action
+        are copied in and compared afterwards, so the cost does not grow
+        with the size of the store (a variable set through globals() is not
+        seen)."""
+        if self.globals is None:
+            self.globals = {}
+        self.names.update(code_names(code))
+        before = {}
+        for name in self.names:
+            value = self.get(name, deleted)
+            before[name] = value
+            if value is deleted:
+                self.globals.pop(name, None)
+            else:
+                self.globals[name] = value
+        exec code in self.globals
+        for name, value in before.items():
+            after = self.globals.get(name, deleted)
+            if after is not value:
+                self.values[name] = after
+
+    def changes(self):
+        """Return the variables set in this layer"""
+        return dict((key, value) for key, value in self.values.items()
+                    if value is not deleted)
+
+    def __getitem__(self, key):
+        if key in self.values:
+            value = self.values[key]
+            if value is deleted:
+                raise KeyError(key)
+            return value
+        value = self.parent[key]
+        if not isinstance(value, immutable_types):
+            value = self.values[key] = isolate(value)
+        return value
+
+    def __contains__(self, key):
+        if key in self.values:
+            return self.values[key] is not deleted
+        return key in self.parent
+
+    def __setitem__(self, key, value):
+        self.values[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.values[key] = deleted
+
+    def __iter__(self):
+        for key, value in self.values.items():
+            if value is not deleted:
+                yield key
+        for key in self.parent:
+            if key not in self.values:
+                yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __repr__(self):
+        return "Store(%r)" % dict(self.items())
@@ -17,10 +17,15 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import Queue
+import socket
 import threading
-from copy import deepcopy
-from selenium import webdriver as selenium_webdriver
-from page import Page
+from time import time
+from collections import namedtuple
+from page import Page, SessionLost
+from store import Store
+from logger import LogBuffer
+from snapshot import name as snapshot_name
+import data
 # exceptions
 from httplib import BadStatusLine
 from urllib2 import URLError
@@ -29,71 +34,258 @@ from traceback import print_exc
 
 # a global lock shared by all threads (for prettier printing)
 lock = threading.Lock()
+# suites (and rows) that have already been requeued after a browser crash
+requeued = set()
+
+# exceptions raised when the connection to a browser is lost
+connection_errors = (URLError, BadStatusLine, socket.error, SessionLost)
+
+# the outcome of a suite, or of one row of a data suite; a failed suite's UI
+# map and line, if known
+Result = namedtuple('Result', [
+    'name', 'passed', 'seconds', 'ui_map', 'line', 'row'])
+
+
+def label(suite_name, row):
+    """Name a suite, or a row of a data suite, in the log"""
+    if row is None:
+        return suite_name
+    return "%s [row %d]" % (suite_name, row)
 
 
 class Suite(threading.Thread):
-    """The Suite class runs a webdriver test suite as a separate thread."""
-    def __init__(self, q, store, log):
+    """The Suite class runs webdriver test suites from a queue as a separate
+    thread, leasing a browser session from the pool for each suite. A data
+    suite is queued as chunks of its data file's rows; each chunk is run in
+    one leased session. Each suite, and each row, runs in its own layer of
+    the run's store (see store.py)."""
+    def __init__(self, q, store, writer, record, stats, pool, profiler=None,
+                 snapshots=None, metrics=None, scaler=None, timeouts=None,
+                 artifacts=None):
         global lock
         super(Suite, self).__init__()
         self.q = q  # queue of test suites
-        self.store = deepcopy(store)
-        self.log = log
+        self.store = store  # the run's base store, shared by every thread
+        self.log = LogBuffer(writer)
+        self.record = record  # records each suite's Result
+        self.stats = stats
+        self.pool = pool
+        self.profiler = profiler
+        self.snapshots = snapshots  # snapshots of shared prefixes, if any
+        self.metrics = metrics  # page metrics, if collected
+        self.scaler = scaler  # the Autoscaler, with --autoscale
+        self.timeouts = timeouts  # learned Timeouts, if used
+        self.artifacts = artifacts  # the ArtifactWriter, with --artifacts
         self.lock = lock
 
     def run(self):
+        with self.lock:
+            print "Starting", self.name
+        drained = False
         try:
-            webdriver = selenium_webdriver.Firefox()
-            with self.lock:
-                print "Starting", self.name
-            while True:
+            while not self.pool.stopping.is_set():
+                if self.scaler is not None and self.scaler.drain():
+                    # the autoscaler is removing threads
+                    drained = True
+                    self.pool.shrink()
+                    break
                 try:
-                    suite_name, suite = self.q.get_nowait()
-                    log = lambda message: self.log(suite_name, message)
-                    for ui_map, actions in suite:
-                        # log the UI map name if in debug mode
-                        if self.store['debug']:
-                            log(ui_map)
-                        # create the page and test it
-                        page = Page(
-                            suite_name,
-                            actions,
-                            webdriver,
-                            self.store,
-                            self.log
-                        )
-                        page.test()
-                    # suite is complete: success!
-                    log("Suite Passed")
+                    suite_name, suite, chunk = self.q.get_nowait()
                 except Queue.Empty:
                     # nothing left to consume
                     break
-                except WebDriverException, e:
-                    # Houston, we have a problem
-                    try:
-                        log("X Page Failed: %s" % ui_map)
-                        log("X %s" % e)
-                        log("X Suite Failed: %s" % suite_name)
-                    except:
-                        # these variables (log, ui_map, suite_name)
-                        # may not be assigned yet on CTL-C
-                        pass
-        # the following exceptions occur on CTL-C
+                try:
+                    session = self.pool.lease()
+                except Exception, e:
+                    # no browser can be launched, even after retrying: leave
+                    # the suite for the other threads
+                    self.q.put((suite_name, suite, chunk))
+                    with self.lock:
+                        print "Cannot launch browser:", e
+                    break
+                if session is None:
+                    break
+                start_time = time()
+                try:
+                    if self.profiler is not None:
+                        self.profiler.instrument(session.webdriver)
+                    if chunk is None:
+                        connected = self.run_suite(
+                            session.webdriver, suite_name, suite)
+                    else:
+                        chunk = self.run_rows(
+                            session, suite_name, suite, chunk)
+                        connected = chunk is None
+                except Exception, e:
+                    # e.g. an unreadable data file: fail the suite, and
+                    # replace the session, whose state is unknown
+                    row = chunk.first if chunk is not None else None
+                    self.log.message(label(suite_name, row), "X %s: %s" % (
+                        e.__class__.__name__, e))
+                    self.finish(Result(
+                        suite_name, False, time() - start_time, None, None,
+                        row))
+                    self.pool.retire(session)
+                    self.pool.replace()
+                    continue
+                except BaseException:
+                    # CTL-C: never leave the browser running
+                    self.pool.retire(session)
+                    raise
+                if connected:
+                    self.pool.release(session)
+                elif self.pool.stopping.is_set():
+                    self.pool.retire(session)
+                else:
+                    # the browser crashed: replace it and try the suite again
+                    self.pool.discard(session)
+                    self.requeue(suite_name, suite, chunk,
+                                 time() - start_time)
+        # the following exception occurs on CTL-C
         except KeyboardInterrupt:
             pass
-        except URLError:
-            pass
-        except BadStatusLine:
-            pass
         except Exception, e:
             print "Exception:", e
             print e.__class__
             print_exc()
 
+        if self.scaler is not None and not drained:
+            self.scaler.leave()
+        self.log.flush()
         with self.lock:
-            print "Exiting", self.name
-        # close webdriver
+            print "Draining" if drained else "Exiting", self.name
+
+    def run_rows(self, session, suite_name, suite, chunk):
+        """Run a data suite once for each row of a Chunk, with the row's
+        values in its store, resetting the session between rows. If the
+        browser connection is lost, returns the Chunk of the rows not run."""
+        for number, offset, values in data.read_chunk(chunk):
+            rest = data.Chunk(chunk.filename, number, offset,
+                              chunk.first + chunk.count - number)
+            if self.pool.stopping.is_set():
+                return rest
+            if number > chunk.first:
+                try:
+                    session.reset()
+                except connection_errors:
+                    return rest
+            if not self.run_suite(session.webdriver, suite_name, suite,
+                                  row=number, values=values):
+                return rest
+        return None
+
+    def run_suite(self, webdriver, suite_name, suite, restore=True, row=None,
+                  values=None):
+        """Run a single suite, or a row of a data suite with its values,
+        returning False if the browser connection was lost. If the suite
+        starts with a shared prefix of UI maps, the prefix's snapshot is
+        restored instead of running it, if allowed."""
+        name = label(suite_name, row)
+        log = lambda message: self.log.message(name, message)
+        # the suite's variables, over the run's store (so each suite starts
+        # in the run's wait mode)
+        store = Store(self.store, values)
+        ui_map = None
+        start_time = time()
+        if self.profiler is not None:
+            self.profiler.start_suite()
+        prefix = None
+        if self.snapshots is not None:
+            prefix = self.snapshots.prefixes.get(suite_name)
+        restored = 0  # UI maps restored from a snapshot
         try:
-            webdriver.quit()
-        except:
-            pass
+            if prefix and restore and \
+                    self.snapshots.restore(webdriver, prefix, store):
+                log("Restored the snapshot of %s" % snapshot_name(prefix))
+                restored = len(prefix)
+            for index, (ui_map, actions) in enumerate(suite):
+                if index < restored:
+                    continue
+                # log the UI map name if in debug mode
+                if store['debug']:
+                    log(ui_map)
+                # create the page and test it
+                page = Page(
+                    name,
+                    ui_map,
+                    actions,
+                    webdriver,
+                    store,
+                    self.log,
+                    self.stats,
+                    self.profiler,
+                    self.metrics,
+                    self.timeouts
+                )
+                if self.profiler is None:
+                    page.test()
+                else:
+                    self.profiler.timed(
+                        None, page.test, lambda: ("ui_map", ui_map))()
+                if prefix and not restored and index == len(prefix) - 1:
+                    self.snapshots.take(webdriver, prefix, store,
+                                        time() - start_time)
+            # suite is complete: success!
+            log("Suite Passed")
+            self.finish(Result(
+                suite_name, True, time() - start_time, None, None, row))
+        except connection_errors:
+            return False
+        except Exception, e:
+            # a WebDriverException, or an error in exec code or the harness
+            action = getattr(e, "action", None)
+            if restored and index == restored and action is not None and \
+                    isinstance(e, WebDriverException) and \
+                    action.line_number == actions[0].line_number:
+                # the restored state did not work: run the whole suite
+                log("Snapshot of %s failed on its first step: %s" % (
+                    snapshot_name(prefix), e))
+                self.snapshots.invalidate(prefix)
+                self.snapshots.clear(webdriver)
+                return self.run_suite(
+                    webdriver, suite_name, suite, False, row, values)
+            # Houston, we have a problem
+            line = action.line_number if action is not None else None
+            log("X Page Failed: %s" % ui_map)
+            if isinstance(e, WebDriverException):
+                log("X %s" % e)
+            else:
+                log("X %s: %s" % (e.__class__.__name__, e))
+            log("X Suite Failed: %s" % name)
+            if self.artifacts is not None:
+                self.artifacts.capture(webdriver, name, ui_map, line)
+            self.finish(Result(
+                suite_name, False, time() - start_time, ui_map, line, row))
+        return True
+
+    def finish(self, result):
+        """Log and record the outcome of a suite"""
+        name = label(result.name, result.row)
+        if self.profiler is not None:
+            self.profiler.end_suite(name)
+        self.log.suite(name, "passed" if result.passed else "failed",
+                       result.seconds)
+        self.record(result)
+
+    def requeue(self, suite_name, suite, chunk, seconds):
+        """Requeue a suite, or the rest of a data chunk, interrupted by a
+        browser crash, once. A row that crashes the browser again fails,
+        and the rest of its chunk is requeued."""
+        row = chunk.first if chunk is not None else None
+        name = label(suite_name, row)
+        log = lambda message: self.log.message(name, message)
+        with self.lock:
+            retry = (suite_name, row) not in requeued
+            requeued.add((suite_name, row))
+        if retry:
+            log("Browser crashed, requeuing suite")
+            self.stats.add("suites requeued")
+            self.log.flush()
+            self.q.put((suite_name, suite, chunk))
+        else:
+            log("X Browser crashed again: %s" % name)
+            log("X Suite Failed: %s" % name)
+            self.finish(Result(suite_name, False, seconds, None, None, row))
+            rest = data.after(chunk) if chunk is not None else None
+            if rest is not None:
+                self.q.put((suite_name, suite, rest))
@@ -0,0 +1,105 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import json
+import sqlite3
+import threading
+import settings
+
+
+class Timeouts(object):
+    """Timeouts learns how long each element wait normally takes, keyed by
+    UI map, line and selector, from the durations of its recent successful
+    waits. A wait with enough history times out after its slowest recent
+    duration times a safety margin, within settings.wait_min_timeout and
+    the hard settings.wait_timeout. A learned timeout that is hit still
+    applies for the rest of the run, so a broken page fails fast in every
+    suite, but is then forgotten: the next run waits the hard timeout and
+    learns again."""
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS waits ("
+            "ui_map TEXT, "
+            "line INTEGER, "
+            "selector TEXT, "
+            "samples TEXT, "  # JSON seconds of the recent successful waits
+            "PRIMARY KEY (ui_map, line, selector))")
+        self.lock = threading.Lock()
+        self.history = {}  # (ui_map, line, selector): [seconds]
+        for ui_map, line, selector, samples in self.connection.execute(
+                "SELECT ui_map, line, selector, samples FROM waits"):
+            self.history[(ui_map, line, selector)] = json.loads(samples)
+        self.samples = {}  # this run's successful waits
+        self.forgotten = set()  # keys whose learned timeout was hit
+
+    def timeout(self, key):
+        """Return the learned timeout of a wait, or None if it has too few
+        successful waits"""
+        with self.lock:
+            samples = self.history.get(key)
+        if samples is None or len(samples) < settings.wait_min_samples:
+            return None
+        return min(settings.wait_timeout,
+                   max(settings.wait_min_timeout,
+                       max(samples) * settings.wait_margin))
+
+    def record(self, key, seconds):
+        """Record the duration of a successful wait"""
+        with self.lock:
+            self.samples.setdefault(key, []).append(round(seconds, 3))
+
+    def forget(self, key):
+        """Forget a wait's history, when saved, after its learned timeout
+        was hit"""
+        with self.lock:
+            self.forgotten.add(key)
+
+    def data(self):
+        """Return this run's samples and forgotten waits, e.g. to send from
+        a worker process"""
+        with self.lock:
+            return (dict(self.samples), set(self.forgotten))
+
+    def merge(self, data):
+        """Merge data collected by another Timeouts"""
+        samples, forgotten = data
+        with self.lock:
+            self.forgotten.update(forgotten)
+            for key, values in samples.items():
+                self.samples.setdefault(key, []).extend(values)
+
+    def save(self):
+        """Save the run's samples, keeping the most recent
+        settings.wait_samples of each wait. Only this run's samples are
+        kept of a forgotten wait."""
+        with self.lock:
+            for key in self.forgotten:
+                self.history.pop(key, None)
+                self.connection.execute(
+                    "DELETE FROM waits WHERE ui_map = ? AND line = ? AND "
+                    "selector = ?", key)
+            for key, values in self.samples.items():
+                samples = (self.history.get(key, []) + values)[
+                    -settings.wait_samples:]
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO waits VALUES (?, ?, ?, ?)",
+                    key + (json.dumps(samples),))
+        self.connection.commit()
+        self.connection.close()
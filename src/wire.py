@@ -0,0 +1,375 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import json
+import Queue
+import select
+import socket
+import httplib
+from urlparse import urlparse
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    NoSuchFrameException,
+    NoSuchWindowException,
+    StaleElementReferenceException,
+    TimeoutException,
+    WebDriverException
+)
+import settings
+
+# the W3C element reference key
+element_key = "element-6066-11e4-a52e-4f735466cecf"
+
+# (method, path) of each command; path variables are filled in from the
+# command's parameters
+commands = {
+    "newSession": ("POST", "/session"),
+    "quit": ("DELETE", "/session/$sessionId"),
+    "get": ("POST", "/session/$sessionId/url"),
+    "getCurrentUrl": ("GET", "/session/$sessionId/url"),
+    "getPageSource": ("GET", "/session/$sessionId/source"),
+    "screenshot": ("GET", "/session/$sessionId/screenshot"),
+    "findElement": ("POST", "/session/$sessionId/element"),
+    "findElements": ("POST", "/session/$sessionId/elements"),
+    "findChildElements": ("POST", "/session/$sessionId/element/$id/elements"),
+    "executeScript": ("POST", "/session/$sessionId/execute/sync"),
+    "executeAsyncScript": ("POST", "/session/$sessionId/execute/async"),
+    "setTimeouts": ("POST", "/session/$sessionId/timeouts"),
+    "setWindowRect": ("POST", "/session/$sessionId/window/rect"),
+    "getWindowHandles": ("GET", "/session/$sessionId/window/handles"),
+    "switchToWindow": ("POST", "/session/$sessionId/window"),
+    "closeWindow": ("DELETE", "/session/$sessionId/window"),
+    "switchToFrame": ("POST", "/session/$sessionId/frame"),
+    "getCookies": ("GET", "/session/$sessionId/cookie"),
+    "addCookie": ("POST", "/session/$sessionId/cookie"),
+    "deleteAllCookies": ("DELETE", "/session/$sessionId/cookie"),
+    "clickElement": ("POST", "/session/$sessionId/element/$id/click"),
+    "clearElement": ("POST", "/session/$sessionId/element/$id/clear"),
+    "sendKeysToElement": ("POST", "/session/$sessionId/element/$id/value"),
+    "getElementText": ("GET", "/session/$sessionId/element/$id/text"),
+    "getElementTagName": ("GET", "/session/$sessionId/element/$id/name"),
+    "getElementProperty":
+        ("GET", "/session/$sessionId/element/$id/property/$name"),
+    "getElementAttribute":
+        ("GET", "/session/$sessionId/element/$id/attribute/$name"),
+    "isElementDisplayed":
+        ("GET", "/session/$sessionId/element/$id/displayed"),
+    "isElementEnabled": ("GET", "/session/$sessionId/element/$id/enabled"),
+    "isElementSelected": ("GET", "/session/$sessionId/element/$id/selected"),
+}
+
+# exceptions raised for W3C error codes; others raise WebDriverException
+errors = {
+    "no such element": NoSuchElementException,
+    "no such frame": NoSuchFrameException,
+    "no such window": NoSuchWindowException,
+    "stale element reference": StaleElementReferenceException,
+    "timeout": TimeoutException,
+    "script timeout": TimeoutException
+}
+
+
+class ConnectionPool(object):
+    """Keep-alive HTTP connections to a WebDriver endpoint, shared by every
+    session on it. A connection is used by one request at a time and
+    returned to the pool once its response has been read."""
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.prefix = parsed.path.rstrip("/")
+        self.idle = Queue.Queue()
+
+    def request(self, method, path, body=None):
+        """Send a request, returning (status, data). A request that fails on
+        a reused connection, which the server may have closed, is sent again
+        on a new connection if it was never written, or is a GET or DELETE;
+        a POST (e.g. a click) may already have been performed."""
+        headers = {"Content-Type": "application/json;charset=UTF-8",
+                   "Accept": "application/json"}
+        while True:
+            connection = self.take()
+            reused = connection is not None
+            written = False
+            try:
+                if connection is None:
+                    connection = self.connect()
+                connection.request(method, self.prefix + path, body, headers)
+                written = True
+                response = connection.getresponse()
+                data = response.read()
+            except (httplib.BadStatusLine, socket.error):
+                if connection is not None:
+                    connection.close()
+                if reused and (not written or method != "POST"):
+                    continue
+                raise
+            if response.getheader("connection", "").lower() == "close":
+                connection.close()
+            else:
+                self.idle.put(connection)
+            return response.status, data
+
+    def take(self):
+        """Return an idle connection, or None; connections that the server
+        has closed since they were used are discarded"""
+        while True:
+            try:
+                connection = self.idle.get_nowait()
+            except Queue.Empty:
+                return None
+            # an idle connection only becomes readable when it is closed
+            if not select.select([connection.sock], [], [], 0)[0]:
+                return connection
+            connection.close()
+
+    def connect(self):
+        """Open a new connection"""
+        connection = httplib.HTTPConnection(
+            self.host, self.port, timeout=settings.wire_timeout)
+        connection.connect()
+        # send small requests immediately, rather than waiting for the
+        # acknowledgement of the last one
+        connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection
+
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Queue.Empty:
+                break
+
+
+class WireExecutor(object):
+    """Executes WebDriver commands for a WireWebDriver over a
+    ConnectionPool"""
+    def __init__(self, pool):
+        self.pool = pool
+
+    def execute(self, command, params):
+        """Execute a named command, returning its value"""
+        if command not in commands:
+            raise WebDriverException(
+                "%s is not supported by the wire client" % command)
+        method, path = commands[command]
+        params = dict(params)
+        for name in ("sessionId", "id", "name"):
+            if "$" + name in path:
+                path = path.replace("$" + name, params.pop(name))
+        body = json.dumps(params) if method == "POST" else None
+        status, data = self.pool.request(method, path, body)
+        try:
+            value = json.loads(data)["value"] if data else None
+        except (ValueError, KeyError, TypeError):
+            raise WebDriverException(
+                "invalid response to %s (%d): %s" % (command, status, data))
+        if status >= 400 or isinstance(value, dict) and "error" in value:
+            error = value.get("error") if isinstance(value, dict) else None
+            message = value.get("message") if isinstance(value, dict) \
+                else value
+            raise errors.get(error, WebDriverException)(
+                "%s: %s" % (error, message))
+        return value
+
+
+class WireWebDriver(object):
+    """A WebDriver client that speaks the W3C wire protocol directly over
+    pooled keep-alive connections, for the subset of WebDriver the harness
+    uses. Action chains are not supported."""
+    w3c = True
+
+    def __init__(self, command_executor, desired_capabilities, pool=None):
+        self.pool = pool or ConnectionPool(command_executor)
+        self.command_executor = WireExecutor(self.pool)
+        value = self.command_executor.execute("newSession", {
+            "capabilities": {"alwaysMatch": desired_capabilities},
+            "desiredCapabilities": desired_capabilities
+        })
+        self.session_id = value.get("sessionId")
+        self.capabilities = value.get("capabilities")
+
+    def execute(self, command, params=None):
+        """Execute a command in the session, unwrapping element references"""
+        params = dict(params or {})
+        params["sessionId"] = self.session_id
+        return self.unwrap(self.command_executor.execute(command, params))
+
+    def unwrap(self, value):
+        """Replace element references in a value with WireElements"""
+        if isinstance(value, list):
+            return [self.unwrap(item) for item in value]
+        if isinstance(value, dict):
+            if element_key in value:
+                return WireElement(self, value[element_key])
+            return dict((key, self.unwrap(item))
+                        for key, item in value.items())
+        return value
+
+    def wrap(self, value):
+        """Replace WireElements in script arguments with element
+        references"""
+        if isinstance(value, (list, tuple)):
+            return [self.wrap(item) for item in value]
+        if isinstance(value, WireElement):
+            return {element_key: value.id}
+        return value
+
+    """WebDriver methods"""
+
+    def get(self, url):
+        self.execute("get", {"url": url})
+
+    @property
+    def current_url(self):
+        return self.execute("getCurrentUrl")
+
+    @property
+    def page_source(self):
+        return self.execute("getPageSource")
+
+    def get_screenshot_as_base64(self):
+        return self.execute("screenshot")
+
+    def find_element(self, by, value):
+        return self.execute("findElement", locator(by, value))
+
+    def find_elements(self, by, value):
+        return self.execute("findElements", locator(by, value))
+
+    def find_elements_by_tag_name(self, name):
+        return self.find_elements(By.TAG_NAME, name)
+
+    def execute_script(self, script, *args):
+        return self.execute(
+            "executeScript", {"script": script, "args": self.wrap(args)})
+
+    def execute_async_script(self, script, *args):
+        return self.execute(
+            "executeAsyncScript", {"script": script, "args": self.wrap(args)})
+
+    def set_script_timeout(self, seconds):
+        self.execute("setTimeouts", {"script": int(seconds * 1000)})
+
+    def set_window_size(self, width, height):
+        self.execute("setWindowRect", {"width": width, "height": height})
+
+    @property
+    def window_handles(self):
+        return self.execute("getWindowHandles")
+
+    def switch_to_window(self, handle):
+        self.execute("switchToWindow", {"handle": handle})
+
+    def switch_to_default_content(self):
+        self.execute("switchToFrame", {"id": None})
+
+    def switch_to_frame(self, frame):
+        """Switch to a frame by index, element, or name or id"""
+        if isinstance(frame, basestring):
+            elements = self.find_elements(By.ID, frame) or \
+                self.find_elements(By.NAME, frame)
+            if not elements:
+                raise NoSuchFrameException(frame)
+            frame = elements[0]
+        self.execute("switchToFrame", {"id": self.wrap(frame)})
+
+    def close(self):
+        self.execute("closeWindow")
+
+    def get_cookies(self):
+        return self.execute("getCookies") or []
+
+    def add_cookie(self, cookie):
+        self.execute("addCookie", {"cookie": cookie})
+
+    def delete_all_cookies(self):
+        self.execute("deleteAllCookies")
+
+    def quit(self):
+        self.execute("quit")
+
+
+class WireElement(object):
+    """An element of a WireWebDriver session"""
+    def __init__(self, webdriver, id):
+        self.webdriver = webdriver
+        self.id = id
+
+    def __eq__(self, other):
+        return isinstance(other, WireElement) and self.id == other.id
+
+    def __ne__(self, other):
+        return not self == other
+
+    def execute(self, command, params=None):
+        params = dict(params or {})
+        params["id"] = self.id
+        return self.webdriver.execute(command, params)
+
+    def click(self):
+        self.execute("clickElement")
+
+    def clear(self):
+        self.execute("clearElement")
+
+    def send_keys(self, value):
+        self.execute("sendKeysToElement",
+                     {"text": value, "value": list(value)})
+
+    @property
+    def text(self):
+        return self.execute("getElementText")
+
+    @property
+    def tag_name(self):
+        return self.execute("getElementTagName")
+
+    def get_attribute(self, name):
+        """Return a property (e.g. the current value) or, failing that, an
+        attribute"""
+        value = self.execute("getElementProperty", {"name": name})
+        if value is None:
+            value = self.execute("getElementAttribute", {"name": name})
+        return value
+
+    def is_displayed(self):
+        return self.execute("isElementDisplayed")
+
+    def is_enabled(self):
+        return self.execute("isElementEnabled")
+
+    def is_selected(self):
+        return self.execute("isElementSelected")
+
+    def find_elements(self, by, value):
+        return self.execute("findChildElements", locator(by, value))
+
+
+def locator(by, value):
+    """Return the W3C locator for a By method, which only supports CSS
+    selectors, link text, tag names and XPath"""
+    if by in (By.ID, By.NAME):
+        return {"using": By.CSS_SELECTOR, "value": '[%s="%s"]' % (
+            by, value.replace("\\", "\\\\").replace('"', '\\"'))}
+    if by == By.CLASS_NAME:
+        return {"using": By.CSS_SELECTOR, "value": ".%s" % value}
+    return {"using": by, "value": value}
@@ -0,0 +1,77 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from src.checkpoint import Checkpoint
+from src.suite import Result
+
+
+class CheckpointTest(unittest.TestCase):
+    """Journals a run, then reads it back as a resumed run would"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "test.checkpoint")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def journal(self):
+        checkpoint = Checkpoint(self.filename)
+        checkpoint.start(["a", "b", "c"])
+        checkpoint.record(Result("a", True, 1.0, None, None, None))
+        checkpoint.record(Result("b", False, 2.0, "login", 3, None))
+        checkpoint.record(Result("c", True, 0.5, None, None, 1))
+        checkpoint.close()
+
+    def test_resume(self):
+        self.journal()
+        checkpoint = Checkpoint(self.filename)
+        # a row's record does not finish its data suite
+        self.assertEqual(checkpoint.pending(), ["c"])
+        self.assertEqual(checkpoint.failed(), ["b"])
+
+    def test_torn_record(self):
+        self.journal()
+        with open(self.filename, "a") as f:
+            f.write('{"type": "suite", "run": "1", "sui')
+        checkpoint = Checkpoint(self.filename)
+        self.assertEqual(checkpoint.pending(), ["c"])
+        # the next record starts on its own line
+        checkpoint.resume()
+        checkpoint.record(Result("c", True, 0.5, None, None, None))
+        checkpoint.close()
+        checkpoint = Checkpoint(self.filename)
+        self.assertEqual(checkpoint.pending(), [])
+        self.assertEqual(checkpoint.failed(), ["b"])
+
+    def test_new_run_replaces_journal(self):
+        self.journal()
+        checkpoint = Checkpoint(self.filename)
+        checkpoint.start(["d"])
+        checkpoint.add("e")
+        checkpoint.close()
+        checkpoint = Checkpoint(self.filename)
+        self.assertEqual(checkpoint.pending(), ["d", "e"])
+        self.assertEqual(checkpoint.failed(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from src import settings
+from src.compiler import Compiler, CompileError
+
+
+class CompilerTest(unittest.TestCase):
+    """Compiles UI map source without reading any files"""
+    def setUp(self):
+        self.compiler = Compiler()
+
+    def compile(self, *lines):
+        return self.compiler.compile("test", "\n".join(lines))
+
+    def test_parameters(self):
+        instructions = self.compile(
+            "# a comment", "", "click|id|submit", "delay|0.5",
+            "set_window_size|800|600")
+        self.assertEqual(instructions, (
+            ("click", ("id", "submit"), 3, "click|id|submit"),
+            ("delay", (0.5,), 4, "delay|0.5"),
+            ("set_window_size", (800, 600), 5, "set_window_size|800|600")))
+
+    def test_last_parameter_keeps_delimiter(self):
+        (cmd, params, line_number, line), = self.compile(
+            "verify_text|css|#total|a | b")
+        self.assertEqual(params, ("css selector", "#total", "a | b"))
+        (cmd, params, line_number, line), = self.compile("exec|x = 1 | 2")
+        namespace = {}
+        exec params[0] in namespace
+        self.assertEqual(namespace["x"], 3)
+
+    def test_configured_delimiter(self):
+        delimeter = settings.delimeter
+        settings.delimeter = "\t"
+        try:
+            (cmd, params, line_number, line), = self.compile(
+                "type\tid\tq\ta|b")
+        finally:
+            settings.delimeter = delimeter
+        self.assertEqual(params, ("id", "q", "a|b"))
+
+    def check_error(self, line, message):
+        try:
+            self.compile("open|/", line)
+        except CompileError, e:
+            self.assertEqual(str(e), "test, line 2: %s" % message)
+        else:
+            self.fail("compiled %r" % line)
+
+    def test_errors(self):
+        self.check_error("frobnicate|id|x", "unknown action: frobnicate")
+        self.check_error("click|id", "click takes 2 parameters, got 1")
+        self.check_error("click", "click takes 2 parameters, got 0")
+        self.check_error("delay|1|2", "invalid number: 1|2")
+        self.check_error("action_click|x", "action_click takes no parameters")
+        self.check_error("click|name|x", "unknown By method: name")
+        self.check_error("set_window_size|wide|600",
+                         "invalid integer: wide")
+        self.assertRaises(CompileError, self.compile, "exec|x = (")
+
+    def test_compile_error_is_value_error(self):
+        self.assertTrue(issubclass(CompileError, ValueError))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from src import data
+
+
+class DataTest(unittest.TestCase):
+    """Splits data files into chunks of rows and reads them back"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        filename = os.path.join(self.directory, name)
+        with open(filename, "wb") as f:
+            f.write(content)
+        return filename
+
+    def check_chunks(self, filename):
+        chunks = list(data.chunks(filename, 2))
+        self.assertEqual([(chunk.first, chunk.count) for chunk in chunks],
+                         [(1, 2), (3, 2), (5, 1)])
+        rows = [row for chunk in chunks for row in data.read_chunk(chunk)]
+        self.assertEqual([(number, values["user"])
+                          for number, offset, values in rows],
+                         [(i, "user%d" % i) for i in range(1, 6)])
+        return chunks
+
+    def test_csv(self):
+        filename = self.write("rows.csv", "user,pin\r\n" + "".join(
+            "user%d,%d\r\n" % (i, i) for i in range(1, 6)))
+        self.check_chunks(filename)
+
+    def test_json_lines(self):
+        filename = self.write("rows.jsonl", "\n".join(
+            '{"user": "user%d"}' % i for i in range(1, 6)) + "\n\n")
+        self.check_chunks(filename)
+
+    def test_after(self):
+        filename = self.write("rows.csv", "user\nuser1\nuser2\nuser3\n")
+        chunk, = data.chunks(filename, 3)
+        rest = data.after(chunk)
+        self.assertEqual((rest.first, rest.count), (2, 2))
+        self.assertEqual([values["user"] for number, offset, values
+                          in data.read_chunk(rest)], ["user2", "user3"])
+        last = data.after(data.after(rest))
+        self.assertIsNone(last)
+
+    def test_invalid_row(self):
+        filename = self.write("rows.jsonl", '{"user": "user1"}\n[2]\n')
+        try:
+            list(data.chunks(filename, 2))
+        except data.DataError, e:
+            self.assertIn("row 2", str(e))
+        else:
+            self.fail("no DataError")
+
+
+if __name__ == "__main__":
+    unittest.main()
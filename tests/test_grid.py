@@ -0,0 +1,180 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from selenium.common.exceptions import WebDriverException
+from src import settings
+from src.driver import Driver
+from src.grid import Node, GridBackend
+from src.stats import Stats
+from bench.run import Quiet, store
+from bench.stub import StubServer
+from bench.synthetic import generate
+
+
+class GridTest(unittest.TestCase):
+    """Runs the grid against stand-in WebDriver servers: a healthy node and
+    a node that refuses every new session"""
+    def setUp(self):
+        self.healthy = StubServer(("127.0.0.1", 0), slots=2).start()
+        self.refused = StubServer(
+            ("127.0.0.1", 0), slots=2, refuse=True).start()
+        self.delays = (settings.session_launch_delay,
+                       settings.node_retry_delay)
+        settings.session_launch_delay = 0
+        settings.node_retry_delay = 0
+
+    def tearDown(self):
+        settings.session_launch_delay, settings.node_retry_delay = \
+            self.delays
+        for server in (self.healthy, self.refused):
+            server.shutdown()
+            server.server_close()
+
+    def nodes(self, *servers):
+        return [Node(server.url, server.slots,
+                     dict(settings.grid_capabilities))
+                for server in servers]
+
+    def check_drained(self, wire):
+        nodes = self.nodes(self.refused, self.healthy)
+        backend = GridBackend(nodes, Stats(), wire)
+        with Quiet():
+            sessions = [backend.launch() for i in range(2)]
+        self.assertTrue(nodes[0].drained)
+        self.assertFalse(nodes[1].drained)
+        self.assertEqual(nodes[0].active, 0)
+        self.assertEqual(
+            backend.stats.get("node %s launch failures" % self.refused.url),
+            settings.node_max_failures)
+        self.assertTrue(all(session.node is nodes[1]
+                            for session in sessions))
+        self.assertEqual(len(self.healthy.sessions), 2)
+        # the healthy node is full, and the drained node is not tried again
+        self.assertRaises(WebDriverException, backend.launch)
+        self.assertEqual(
+            backend.stats.get("node %s launch failures" % self.refused.url),
+            settings.node_max_failures)
+        for session in sessions:
+            session.quit()
+            backend.retire(session)
+        self.assertEqual(len(self.healthy.sessions), 0)
+        self.assertEqual(nodes[1].active, 0)
+
+    def test_refused_node_is_drained(self):
+        self.check_drained(wire=False)
+
+    def test_refused_node_is_drained_wire(self):
+        self.check_drained(wire=True)
+
+    def test_failed_node_backs_off(self):
+        settings.node_retry_delay = 60
+        nodes = self.nodes(self.refused, self.healthy)
+        backend = GridBackend(nodes, Stats(), wire=True)
+        with Quiet():
+            sessions = [backend.launch() for i in range(2)]
+        # the refused node is not tried again while it backs off
+        self.assertEqual(
+            backend.stats.get("node %s launch failures" % self.refused.url),
+            1)
+        self.assertFalse(nodes[0].drained)
+        self.assertTrue(all(session.node is nodes[1]
+                            for session in sessions))
+        for session in sessions:
+            session.quit()
+            backend.retire(session)
+
+    def test_drained_node_is_restored(self):
+        nodes = self.nodes(self.refused, self.healthy)
+        backend = GridBackend(nodes, Stats(), wire=True)
+        with Quiet():
+            session = backend.launch()
+        self.assertTrue(nodes[0].drained)
+        # a probe before the interval has passed is not made
+        self.refused.refuse = False
+        backend.probe()
+        self.assertTrue(nodes[0].drained)
+        nodes[0].probe_time = 0
+        with Quiet():
+            restored = backend.launch()
+        self.assertFalse(nodes[0].drained)
+        self.assertIs(restored.node, nodes[0])
+        self.assertEqual(
+            backend.stats.get("node %s restored" % self.refused.url), 1)
+        for session in (session, restored):
+            session.quit()
+            backend.retire(session)
+
+    def test_least_loaded_placement(self):
+        small = StubServer(("127.0.0.1", 0), slots=1).start()
+        large = StubServer(("127.0.0.1", 0), slots=3).start()
+        try:
+            nodes = self.nodes(small, large)
+            backend = GridBackend(nodes, Stats(), wire=True)
+            first = backend.launch()
+            self.assertIs(first.node, nodes[1])
+            second = backend.launch()
+            self.assertIs(second.node, nodes[1])
+            # one free slot on each node: the first node listed wins
+            third = backend.launch()
+            self.assertIs(third.node, nodes[0])
+            self.assertEqual(len(small.sessions), 1)
+            self.assertEqual(len(large.sessions), 2)
+            first.quit()
+            backend.retire(first)
+            self.assertIs(backend.launch().node, nodes[1])
+        finally:
+            for server in (small, large):
+                server.shutdown()
+                server.server_close()
+
+    def test_run_avoids_refused_node(self):
+        directory = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        try:
+            os.chdir(directory)
+            suites = generate(directory, suites=10, ui_maps=5, seed=1)
+            grid = os.path.join(directory, "test.grid")
+            with open(grid, "w") as f:
+                f.write("%s|%d\n%s|%d\n" % (
+                    self.refused.url, self.refused.slots,
+                    self.healthy.url, self.healthy.slots))
+            with Quiet():
+                driver = Driver(suites, **store(grid=grid, wire=True))
+                driver.run()
+            self.assertEqual(len(driver.results), 10)
+            self.assertTrue(all(result.passed for result in driver.results))
+            stats = driver.stats
+            self.assertEqual(stats.get("node %s drained" % self.refused.url),
+                             1)
+            self.assertEqual(stats.get("node %s suites" % self.refused.url),
+                             0)
+            self.assertEqual(stats.get("node %s suites" % self.healthy.url),
+                             10)
+            self.assertEqual(len(self.refused.sessions), 0)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from src.history import History, makespan, lower_bound
+from src.suite import Result
+
+
+class HistoryTest(unittest.TestCase):
+    """Orders and selects suites from a recorded run"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "test.db")
+        self.inputs = dict((name, {"suite": name}) for name in "abc")
+        history = History(self.filename)
+        history.record([Result("a", True, 1.0, None, None, None),
+                        Result("b", False, 3.0, None, None, None),
+                        Result("c", True, 2.0, None, None, None)],
+                       self.inputs)
+        history.connection.close()
+        self.history = History(self.filename)
+
+    def tearDown(self):
+        self.history.connection.close()
+        shutil.rmtree(self.directory)
+
+    def test_order(self):
+        self.assertEqual(self.history.order(["a", "b", "c", "new"]),
+                         ["b", "c", "new", "a"])
+        self.assertEqual(self.history.estimate("new"), 2.0)
+
+    def test_order_failed_first(self):
+        self.history.record([Result("a", False, 1.0, None, None, None)],
+                            self.inputs)
+        self.assertEqual(self.history.order(["a", "b", "c"], True),
+                         ["b", "a", "c"])
+
+    def test_durations_are_smoothed(self):
+        self.history.record([Result("a", True, 3.0, None, None, None)],
+                            self.inputs)
+        self.assertEqual(self.history.estimate("a"), 2.0)
+
+    def test_select(self):
+        inputs = dict(self.inputs)
+        inputs["c"] = {"suite": "c", "ui_map": "login"}
+        inputs["new"] = {"suite": "new"}
+        self.assertEqual(
+            self.history.select(["a", "b", "c", "new"], inputs), [
+                ("a", False, "unchanged, passed last time"),
+                ("b", True, "failed last time"),
+                ("c", True, "changed: ui_map"),
+                ("new", True, "new suite")])
+
+    def test_select_samples_within_budget(self):
+        selected = self.history.select(["a", "c"], self.inputs, budget=1.5)
+        self.assertEqual(sum(1 for name, run, reason in selected if run), 1)
+        self.assertIn("unchanged, sampled", [reason for name, run, reason
+                                             in selected])
+
+    def test_makespan(self):
+        self.assertEqual(makespan([3.0, 2.0, 1.0], 2), 3.0)
+        self.assertEqual(makespan([1.0, 2.0, 3.0], 2), 4.0)
+        self.assertEqual(lower_bound([3.0, 2.0, 1.0], 2), 3.0)
+        self.assertEqual(lower_bound([], 2), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Selenium WebDriver Harness
+Copyright (C) 2013 J. Daniel Lewis <jdanlewis@gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from src.store import Store
+
+
+class StoreTest(unittest.TestCase):
+    """Layers suites' variables over a shared base store"""
+    def setUp(self):
+        self.base = {"tier": "qa", "fixtures": [1, 2, 3]}
+
+    def test_writes_stay_in_layer(self):
+        store = Store(self.base)
+        store["user"] = "alice"
+        store["tier"] = "prod"
+        del store["fixtures"]
+        self.assertEqual(dict(store), {"user": "alice", "tier": "prod"})
+        self.assertNotIn("fixtures", store)
+        self.assertRaises(KeyError, store.__getitem__, "fixtures")
+        self.assertEqual(self.base, {"tier": "qa", "fixtures": [1, 2, 3]})
+        self.assertEqual(dict(Store(self.base)), self.base)
+
+    def test_nested_layers(self):
+        suite = Store(self.base, {"user": "alice"})
+        row = Store(suite, {"user": "bob"})
+        self.assertEqual(row["user"], "bob")
+        self.assertEqual(row["tier"], "qa")
+        self.assertEqual(suite["user"], "alice")
+        self.assertEqual(len(row), 3)
+
+    def test_mutable_values_are_copied(self):
+        store = Store(self.base)
+        store["fixtures"].pop()
+        self.assertEqual(store["fixtures"], [1, 2])
+        self.assertEqual(self.base["fixtures"], [1, 2, 3])
+
+    def test_exec(self):
+        store = Store(self.base)
+        store.execute(compile("fixtures.append(4)\nuser = tier.upper()",
+                              "<test>", "exec"))
+        self.assertEqual(store["user"], "QA")
+        self.assertEqual(store["fixtures"], [1, 2, 3, 4])
+        self.assertEqual(self.base["fixtures"], [1, 2, 3])
+        self.assertEqual(store.changes(),
+                         {"user": "QA", "fixtures": [1, 2, 3, 4]})
+
+    def test_exec_functions_see_later_changes(self):
+        store = Store(self.base)
+        store.execute(compile("def greet():\n    return 'hi ' + user\n"
+                              "user = 'alice'", "<test>", "exec"))
+        store["user"] = "bob"
+        store.execute(compile("greeting = greet()\ndel tier", "<test>",
+                              "exec"))
+        self.assertEqual(store["greeting"], "hi bob")
+        self.assertNotIn("tier", store)
+        self.assertEqual(self.base["tier"], "qa")
+
+
+if __name__ == "__main__":
+    unittest.main()